@@ -29,6 +29,8 @@ if not PYPY:
     cythonize("thriftpy2/transport/cybase.pyx")
     cythonize("thriftpy2/transport/**/*.pyx")
     cythonize("thriftpy2/protocol/cybin/cybin.pyx")
+    cythonize("thriftpy2/protocol/cycompact/cycompact.pyx")
+    cythonize("thriftpy2/protocol/cyjson/cyjson.pyx")
 
     libraries = []
     if WINDOWS:
@@ -45,9 +47,17 @@ if not PYPY:
                                  libraries=libraries))
     ext_modules.append(Extension("thriftpy2.transport.sasl.cysasl",
                                  ["thriftpy2/transport/sasl/cysasl.c"]))
+    ext_modules.append(Extension(
+        "thriftpy2.transport.compressed.cycompressed",
+        ["thriftpy2/transport/compressed/cycompressed.c"]))
     ext_modules.append(Extension("thriftpy2.protocol.cybin.cybin",
                                  ["thriftpy2/protocol/cybin/cybin.c"],
                                  libraries=libraries))
+    ext_modules.append(Extension("thriftpy2.protocol.cycompact.cycompact",
+                                 ["thriftpy2/protocol/cycompact/cycompact.c"],
+                                 libraries=libraries))
+    ext_modules.append(Extension("thriftpy2.protocol.cyjson.cyjson",
+                                 ["thriftpy2/protocol/cyjson/cyjson.c"]))
 
 setup(
       packages=find_packages(exclude=['benchmark', 'docs', 'tests']),
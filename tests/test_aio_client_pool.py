@@ -0,0 +1,218 @@
+import asyncio
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.contrib.aio.rpc import AsyncClientPool
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.rpc import make_aio_server
+from thriftpy2.thrift import TDecodeException, TType
+from thriftpy2.transport import TTransportException
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    async def hello(self, name):
+        return "hello " + name
+
+    async def remove(self, name):
+        raise addressbook.PersonNotExistsError("not exists")
+
+    async def sleep(self, ms):
+        await asyncio.sleep(ms / 1000.0)
+        return True
+
+
+@pytest.fixture(scope="module")
+def port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    # connections are closed by the server after 500ms
+    loop = asyncio.new_event_loop()
+    server = make_aio_server(addressbook.AddressBookService, Dispatcher(),
+                             host="127.0.0.1", port=port, client_timeout=500,
+                             loop=loop)
+    threading.Thread(target=server.serve, daemon=True).start()
+    time.sleep(0.1)
+
+    yield port
+
+    # let the handlers of the last requests finish
+    time.sleep(0.5)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def run(port, test, **kwargs):
+    async def main():
+        pool = AsyncClientPool(addressbook.AddressBookService, "127.0.0.1",
+                               port, max_size=2, wait_timeout=1, **kwargs)
+        try:
+            await test(pool)
+        finally:
+            pool.close()
+
+    asyncio.run(main())
+
+
+def test_concurrent_calls(port):
+    async def test(pool):
+        await pool.warm()
+        assert 2 == pool.stats()["idle"] == pool.stats()["connects"]
+
+        results = await asyncio.gather(*[pool.sleep(100) for _ in range(6)])
+        assert [True] * 6 == results
+        # thrift exceptions don't spoil the connection
+        with pytest.raises(addressbook.PersonNotExistsError):
+            await pool.remove("bob")
+
+        stats = pool.stats()
+        assert 2 == stats["connects"] == stats["size"] == stats["idle"]
+        assert 7 == stats["checkouts"]
+        assert 0 == stats["discarded"] == stats["in_use"]
+        assert stats["wait_time_max"] > 0.05
+        assert stats["connect_time_max"] > 0
+
+    run(port, test, min_size=2)
+
+
+def test_warm_capped(port):
+    async def test(pool):
+        async def hold():
+            async with pool.connection():
+                await asyncio.sleep(0.1)
+
+        # the clients opened by warm() don't fit with the ones in use
+        await asyncio.gather(pool.warm(), hold(), hold())
+        stats = pool.stats()
+        assert 4 == stats["connects"]
+        assert 2 == stats["size"] == stats["idle"]
+
+    run(port, test, min_size=2)
+
+
+def test_warm_failed(port):
+    async def test(pool):
+        create, creates = pool._create, []
+
+        async def flaky_create():
+            creates.append(True)
+            if len(creates) == 2:
+                raise TTransportException(TTransportException.NOT_OPEN)
+            return await create()
+
+        pool._create = flaky_create
+        with pytest.raises(TTransportException):
+            await pool.warm()
+        # the client opened is kept
+        assert 1 == pool.stats()["idle"]
+
+    run(port, test, min_size=2)
+
+
+def test_made_outside_loop(port):
+    pool = AsyncClientPool(addressbook.AddressBookService, "127.0.0.1",
+                           port, max_size=1)
+
+    async def main():
+        try:
+            # the calls wait for each other on the semaphore of the pool
+            results = await asyncio.gather(
+                *[pool.sleep(10) for _ in range(3)])
+            assert [True] * 3 == results
+        finally:
+            pool.close()
+
+    asyncio.run(main())
+
+
+def test_wait_timeout(port):
+    async def test(pool):
+        pool.wait_timeout = 0.1
+        async with pool.connection(), pool.connection():
+            with pytest.raises(TTransportException) as exc:
+                await pool.hello("bob")
+            assert TTransportException.TIMED_OUT == exc.value.type
+        assert "hello bob" == await pool.hello("bob")
+
+    run(port, test)
+
+
+def test_evict_broken(port):
+    async def test(pool):
+        with pytest.raises(TTransportException):
+            async with pool.connection() as client:
+                assert "hello bob" == await client.hello("bob")
+                raise TTransportException(TTransportException.END_OF_FILE)
+        assert 1 == pool.stats()["discarded"]
+        assert 0 == pool.stats()["size"]
+
+        # the server closes the connection
+        assert "hello bob" == await pool.hello("bob")
+        await asyncio.sleep(0.7)
+        assert "hello bob" == await pool.hello("bob")
+        assert 2 == pool.stats()["discarded"]
+
+        async def health_check(client):
+            return await client.hello("check") == "nope"
+
+        pool.health_check = health_check
+        assert "hello bob" == await pool.hello("bob")
+        assert 3 == pool.stats()["discarded"]
+        assert 4 == pool.stats()["connects"]
+
+    run(port, test)
+
+
+@pytest.mark.parametrize("exc", [
+    TProtocolException(TProtocolException.BAD_VERSION),
+    TDecodeException("Person", 1, "name", 1, TType.STRING),
+])
+def test_discard_desynchronized(port, exc):
+    async def test(pool):
+        # the reply may have been read in part
+        with pytest.raises(type(exc)):
+            async with pool.connection():
+                raise exc
+        assert 1 == pool.stats()["discarded"]
+        assert 0 == pool.stats()["size"]
+
+    run(port, test)
+
+
+def test_cancelled(port):
+    async def test(pool):
+        task = asyncio.ensure_future(pool.sleep(300))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # the connection waiting for the reply is not reused
+        stats = pool.stats()
+        assert 1 == stats["discarded"]
+        assert 0 == stats["size"]
+        assert "hello bob" == await pool.hello("bob")
+
+    run(port, test)
+
+
+def test_closed(port):
+    async def test(pool):
+        async with pool.connection() as client:
+            pool.close()
+            assert "hello bob" == await client.hello("bob")
+        assert 0 == pool.stats()["size"]
+
+        with pytest.raises(TTransportException) as exc:
+            await pool.hello("bob")
+        assert TTransportException.NOT_OPEN == exc.value.type
+
+    run(port, test)
@@ -0,0 +1,120 @@
+import asyncio
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.contrib.aio.protocol import (TAsyncCompactProtocolFactory,
+                                            TAsyncFramedProtocol,
+                                            TAsyncFramedProtocolFactory)
+from thriftpy2.contrib.aio.rpc import make_client as make_aio_client
+from thriftpy2.contrib.aio.transport import TAsyncFramedTransportFactory
+from thriftpy2.protocol import TCompactProtocolFactory
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.protocol.compact import (
+    TCompactProtocolFactory as TPyCompactProtocolFactory)
+from thriftpy2.rpc import make_aio_server, make_client
+from thriftpy2.transport import TTransportException
+from thriftpy2.transport.framed import TFramedTransportFactory
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    async def add(self, person):
+        return len(person.phones) == 100
+
+    async def get(self, name):
+        return addressbook.Person(name=name, phones=[
+            addressbook.PhoneNumber(type=addressbook.PhoneType.MOBILE,
+                                    number=str(i)) for i in range(100)])
+
+
+def serve(proto_factory):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    loop = asyncio.new_event_loop()
+    server = make_aio_server(addressbook.AddressBookService, Dispatcher(),
+                             host="127.0.0.1", port=port,
+                             proto_factory=proto_factory, loop=loop)
+    threading.Thread(target=server.serve, daemon=True).start()
+    time.sleep(0.1)
+    return port, loop
+
+
+@pytest.fixture(params=[None, TCompactProtocolFactory()])
+def server(request):
+    port, loop = serve(TAsyncFramedProtocolFactory(request.param))
+    yield port, request.param
+    time.sleep(0.1)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def test_aio_client(server):
+    port, proto_factory = server
+
+    async def main():
+        client = await make_aio_client(
+            addressbook.AddressBookService, "127.0.0.1", port,
+            proto_factory=TAsyncFramedProtocolFactory(proto_factory))
+        person = await client.get("Alice")
+        assert "Alice" == person.name
+        assert "99" == person.phones[-1].number
+        assert await client.add(person)
+        client.close()
+
+    asyncio.run(main())
+
+
+def test_framed_peers(server):
+    port, proto_factory = server
+    if proto_factory is None:
+        sync_proto_factory = TBinaryProtocolFactory()
+        aio_proto_factory = None
+    else:
+        sync_proto_factory = TPyCompactProtocolFactory()
+        aio_proto_factory = TAsyncCompactProtocolFactory()
+
+    client = make_client(addressbook.AddressBookService, "127.0.0.1", port,
+                         proto_factory=sync_proto_factory,
+                         trans_factory=TFramedTransportFactory())
+    assert "Bob" == client.get("Bob").name
+    client.close()
+
+    async def main():
+        kwargs = {"trans_factory": TAsyncFramedTransportFactory()}
+        if aio_proto_factory is not None:
+            kwargs["proto_factory"] = aio_proto_factory
+        client = await make_aio_client(
+            addressbook.AddressBookService, "127.0.0.1", port, **kwargs)
+        assert "Bob" == (await client.get("Bob")).name
+        client.close()
+
+    asyncio.run(main())
+
+
+class TAsyncMemoryBuffer(object):
+    def __init__(self, value):
+        self._value = value
+
+    async def read(self, sz):
+        ret, self._value = self._value[:sz], self._value[sz:]
+        return ret
+
+
+@pytest.mark.parametrize("frame, code", [
+    (b"\xff\xff\xff\xff", TTransportException.NEGATIVE_SIZE),
+    (b"\x00\x00\x04\x01", TTransportException.SIZE_LIMIT),
+])
+def test_frame_size(frame, code):
+    proto = TAsyncFramedProtocol(TAsyncMemoryBuffer(frame),
+                                 max_frame_size=1024)
+    with pytest.raises(TTransportException) as exc:
+        asyncio.run(proto.read_message_begin())
+    assert code == exc.value.type
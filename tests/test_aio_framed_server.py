@@ -0,0 +1,230 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.contrib.aio.protocol import (TAsyncCompactProtocolFactory,
+                                            TAsyncFramedProtocolFactory)
+from thriftpy2.contrib.aio.rpc import make_client as make_aio_client
+from thriftpy2.contrib.aio.server import BUFFER_SIZE, TAsyncFramedServer
+from thriftpy2.contrib.aio.transport import TAsyncFramedTransportFactory
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.protocol.compact import TCompactProtocolFactory
+from thriftpy2.rpc import make_aio_server, make_client
+from thriftpy2.thrift import TMessageType
+from thriftpy2.transport import TMemoryBuffer
+from thriftpy2.transport.framed import TFramedTransportFactory
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    async def hello(self, name):
+        return "hello " + name
+
+    async def add(self, person):
+        return len(person.phones) == 10000
+
+    async def get(self, name):
+        return addressbook.Person(name=name, phones=[
+            addressbook.PhoneNumber(type=addressbook.PhoneType.MOBILE,
+                                    number=str(i)) for i in range(10000)])
+
+    async def remove(self, name):
+        raise addressbook.PersonNotExistsError("not exists")
+
+    async def sleep(self, ms):
+        await asyncio.sleep(ms / 1000.0)
+        return True
+
+
+def serve(**kwargs):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    loop = asyncio.new_event_loop()
+    server = make_aio_server(addressbook.AddressBookService, Dispatcher(),
+                             host="127.0.0.1", port=port, loop=loop,
+                             server_class=TAsyncFramedServer, **kwargs)
+    threading.Thread(target=server.serve, daemon=True).start()
+    time.sleep(0.1)
+    return port, server
+
+
+@pytest.fixture(params=["binary", "compact"])
+def server(request):
+    if request.param == "binary":
+        port, server = serve()
+    else:
+        port, server = serve(proto_factory=TAsyncCompactProtocolFactory())
+    yield port, request.param
+    time.sleep(0.1)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_sync_client(server):
+    port, proto = server
+    proto_factory = (TBinaryProtocolFactory() if proto == "binary"
+                     else TCompactProtocolFactory())
+    client = make_client(addressbook.AddressBookService, "127.0.0.1", port,
+                         proto_factory=proto_factory,
+                         trans_factory=TFramedTransportFactory())
+    assert "hello bob" == client.hello("bob")
+
+    # frames larger than the buffer of the connection
+    person = client.get("alice")
+    assert "9999" == person.phones[-1].number
+    assert client.add(person)
+
+    with pytest.raises(addressbook.PersonNotExistsError):
+        client.remove("bob")
+    assert "hello bob" == client.hello("bob")
+    client.close()
+
+
+def test_aio_clients(server):
+    port, proto = server
+    if proto == "binary":
+        factories = [
+            {"trans_factory": TAsyncFramedTransportFactory()},
+            {"proto_factory": TAsyncFramedProtocolFactory()},
+        ]
+    else:
+        factories = [
+            {"trans_factory": TAsyncFramedTransportFactory(),
+             "proto_factory": TAsyncCompactProtocolFactory()},
+            {"proto_factory": TAsyncFramedProtocolFactory(
+                TCompactProtocolFactory())},
+        ]
+
+    async def main():
+        for kwargs in factories:
+            client = await make_aio_client(
+                addressbook.AddressBookService, "127.0.0.1", port, **kwargs)
+            assert "hello bob" == await client.hello("bob")
+            assert await client.sleep(10)
+            client.close()
+
+    asyncio.run(main())
+
+
+def call(api, seqid, **kwargs):
+    args = getattr(addressbook.AddressBookService, api + "_args")(**kwargs)
+    buf = TMemoryBuffer()
+    proto = TBinaryProtocolFactory().get_protocol(buf)
+    proto.write_message_begin(api, TMessageType.CALL, seqid)
+    proto.write_struct(args)
+    proto.write_message_end()
+    payload = buf.getvalue()
+    return struct.pack("!i", len(payload)) + payload
+
+
+def recv_frame(rfile):
+    sz, = struct.unpack("!i", rfile.read(4))
+    buf = TMemoryBuffer(rfile.read(sz))
+    return TBinaryProtocolFactory().get_protocol(buf).read_message_begin()
+
+
+def test_buffer_shrinks():
+    port, server = serve()
+    client = make_client(addressbook.AddressBookService, "127.0.0.1", port,
+                         proto_factory=TBinaryProtocolFactory(),
+                         trans_factory=TFramedTransportFactory())
+    person = addressbook.Person(name="alice", phones=[
+        addressbook.PhoneNumber(number=str(i)) for i in range(10000)])
+    assert client.add(person)
+    conn, = server.connections
+    assert len(conn._buf) > BUFFER_SIZE
+
+    # back to its size once the large frame is handled
+    assert "hello bob" == client.hello("bob")
+    assert BUFFER_SIZE == len(conn._buf)
+    client.close()
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_pipelined_frames():
+    port, server = serve()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        # several requests in a single segment, split in the middle of one,
+        # replied in order though the first ones are the slowest
+        data = b"".join(call("sleep", i, ms=50 - 10 * i) for i in range(5))
+        rfile = sock.makefile("rb")
+        sock.sendall(data[:-3])
+        time.sleep(0.05)
+        sock.sendall(data[-3:])
+        assert [("sleep", TMessageType.REPLY, i) for i in range(5)] == \
+            [recv_frame(rfile) for _ in range(5)]
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_out_of_order():
+    port, server = serve(concurrency=2)
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        rfile = sock.makefile("rb")
+        start = time.time()
+        sock.sendall(call("sleep", 1, ms=300) + call("hello", 2, name="bob")
+                     + call("sleep", 3, ms=100) + call("sleep", 4, ms=250))
+        # no more than 2 requests at once, 4 starts when 3 is done
+        assert [("hello", TMessageType.REPLY, 2),
+                ("sleep", TMessageType.REPLY, 3),
+                ("sleep", TMessageType.REPLY, 1),
+                ("sleep", TMessageType.REPLY, 4)] == \
+            [recv_frame(rfile) for _ in range(4)]
+        assert 0.3 < time.time() - start < 0.5
+
+        # reading is paused while too many requests are waiting
+        sock.sendall(b"".join(call("sleep", i, ms=50) for i in range(10)))
+        time.sleep(0.1)
+        conn, = server.connections
+        assert conn._reading_paused
+        assert sorted(range(10)) == sorted(
+            recv_frame(rfile)[-1] for _ in range(10))
+        assert not conn._reading_paused
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_invalid_frame():
+    port, server = serve()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.settimeout(1)
+        sock.sendall(b"\xff\xff\xff\xff")
+        assert b"" == sock.recv(1)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_idle_timeout():
+    port, server = serve(client_timeout=200)
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        rfile = sock.makefile("rb")
+        # the connection is not idle while a request is processed
+        sock.sendall(call("sleep", 1, ms=300))
+        assert ("sleep", TMessageType.REPLY, 1) == recv_frame(rfile)
+        assert 1 == len(server.connections)
+
+        time.sleep(0.3)
+        assert 0 == len(server.connections)
+        sock.settimeout(1)
+        assert b"" == sock.recv(1)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_close():
+    port, server = serve()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        rfile = sock.makefile("rb")
+        sock.sendall(call("hello", 1, name="bob"))
+        assert ("hello", TMessageType.REPLY, 1) == recv_frame(rfile)
+
+        server.loop.call_soon_threadsafe(server.loop.stop)
+        time.sleep(0.1)
+        sock.settimeout(1)
+        assert b"" == sock.recv(1)
+    assert server.closed
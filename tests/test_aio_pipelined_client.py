@@ -0,0 +1,186 @@
+import asyncio
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.contrib.aio.rpc import make_pipelined_client
+from thriftpy2.contrib.aio.server import TAsyncFramedServer
+from thriftpy2.contrib.aio.transport import TAsyncFramedTransportFactory
+from thriftpy2.rpc import make_aio_server
+from thriftpy2.transport import TTransportException
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    async def hello(self, name):
+        return "hello " + name
+
+    async def remove(self, name):
+        raise addressbook.PersonNotExistsError("not exists")
+
+    async def sleep(self, ms):
+        await asyncio.sleep(ms / 1000.0)
+        return True
+
+    async def get_phonenumbers(self, name, count):
+        await asyncio.sleep(count / 1000.0)
+        return [addressbook.PhoneNumber(number=name)] * count
+
+
+def serve(**kwargs):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    loop = asyncio.new_event_loop()
+    server = make_aio_server(addressbook.AddressBookService, Dispatcher(),
+                             host="127.0.0.1", port=port, loop=loop,
+                             **kwargs)
+    threading.Thread(target=server.serve, daemon=True).start()
+    time.sleep(0.1)
+    return port, server
+
+
+@pytest.fixture(scope="module")
+def port():
+    port, server = serve(server_class=TAsyncFramedServer, concurrency=100)
+    yield port
+    time.sleep(0.5)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def run(port, test, **kwargs):
+    async def main():
+        client = await make_pipelined_client(
+            addressbook.AddressBookService, "127.0.0.1", port, **kwargs)
+        try:
+            await test(client)
+        finally:
+            client.close()
+
+    asyncio.run(main())
+
+
+def test_concurrent_calls(port):
+    async def test(client):
+        write, seqids = client._write_message, []
+
+        def recorded_write(api, seqid, kwargs):
+            seqids.append(seqid)
+            write(api, seqid, kwargs)
+
+        client._write_message = recorded_write
+        start = time.time()
+        results = await asyncio.gather(*[
+            client.get_phonenumbers(str(i), 100 - i) for i in range(100)])
+        assert 0.1 < time.time() - start < 1
+        assert 100 == len(set(seqids))
+        for i, phones in enumerate(results):
+            assert 100 - i == len(phones)
+            assert str(i) == phones[0].number
+
+        with pytest.raises(addressbook.PersonNotExistsError):
+            await client.remove("bob")
+        assert not client._calls
+
+    run(port, test)
+
+
+def test_large_calls(port):
+    async def test(client):
+        trans = client._oprot.trans
+        flush, flushing = trans.flush, []
+
+        async def checked_flush():
+            # the stream can't be drained by several calls at once
+            assert not flushing
+            flushing.append(True)
+            try:
+                await flush()
+            finally:
+                flushing.pop()
+
+        trans.flush = checked_flush
+        names = [str(i) * 1000000 for i in range(20)]
+        results = await asyncio.gather(*[
+            client.hello(name) for name in names])
+        assert ["hello " + name for name in names] == results
+
+    run(port, test)
+
+
+def test_out_of_order(port):
+    async def test(client):
+        done = []
+
+        async def call(api, *args):
+            done.append((api, await getattr(client, api)(*args)))
+
+        await asyncio.gather(call("sleep", 200), call("hello", "bob"))
+        assert [("hello", "hello bob"), ("sleep", True)] == done
+
+    run(port, test)
+
+
+def test_timeout(port):
+    async def test(client):
+        with pytest.raises(TTransportException) as exc:
+            await client.sleep(300)
+        assert TTransportException.TIMED_OUT == exc.value.type
+
+        # the late reply is skipped
+        assert "hello bob" == await client.hello("bob")
+        await asyncio.sleep(0.3)
+        assert "hello bob" == await client.hello("bob")
+
+    run(port, test, timeout=100)
+
+
+def test_cancelled(port):
+    async def test(client):
+        task = asyncio.ensure_future(client.sleep(200))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not client._calls
+
+        await asyncio.sleep(0.2)
+        assert "hello bob" == await client.hello("bob")
+
+    run(port, test)
+
+
+def test_in_order_server():
+    port, server = serve(trans_factory=TAsyncFramedTransportFactory())
+
+    async def test(client):
+        results = await asyncio.gather(*[
+            client.hello(str(i)) for i in range(10)])
+        assert ["hello %d" % i for i in range(10)] == results
+
+    run(port, test)
+    server.loop.call_soon_threadsafe(server.loop.stop)
+
+
+def test_connection_lost():
+    port, server = serve(server_class=TAsyncFramedServer, concurrency=10)
+
+    async def test(client):
+        calls = asyncio.gather(*[client.sleep(1000) for _ in range(3)],
+                               return_exceptions=True)
+        await asyncio.sleep(0.1)
+        server.loop.call_soon_threadsafe(server.loop.stop)
+
+        for exc in await calls:
+            assert isinstance(exc, TTransportException)
+        with pytest.raises(TTransportException):
+            await client.hello("bob")
+
+    run(port, test)
@@ -15,8 +15,9 @@ from thriftpy2.protocol.apache_json import TApacheJSONProtocol
 from thriftpy2.rpc import make_server as make_rpc_server, \
     make_client as make_rpc_client
 from thriftpy2.thrift import TProcessor, TType
-from thriftpy2.transport import TMemoryBuffer
-from thriftpy2.transport.buffered import TBufferedTransportFactory
+from thriftpy2.transport import TMemoryBuffer, TTransportException
+from thriftpy2.transport.buffered import (TBufferedTransport,
+                                          TBufferedTransportFactory)
 
 TEST_DIR = Path(__file__).parent
 
@@ -133,12 +134,12 @@ def test_streaming_parse_backslash_string():
     the old byte-by-byte scanner because it treated the closing quote of
     ``"\\"`` as escaped, leaving in_string=True and never closing the array.
 
-    The streaming path (no getvalue) must parse this correctly via ijson.
+    The streaming path (no getvalue) must parse this correctly.
     """
     inner = chr(0x5C)  # single backslash
     doc = [1, "x", 1, 0, {"1": {"rec": {"7": {"str": inner}}}}]
     payload = json.dumps(doc, separators=(",", ":")).encode("utf8")
-    # TFileObjectTransport has no getvalue(), so we hit the ijson path.
+    # TFileObjectTransport has no getvalue(), so we hit the streaming path.
     trans = TFileObjectTransport(BytesIO(payload))
     assert not hasattr(trans, "getvalue")
     proto = TApacheJSONProtocol(trans)
@@ -147,6 +148,52 @@ def test_streaming_parse_backslash_string():
     assert proto._req[4]["1"]["rec"]["7"]["str"] == inner
 
 
+def test_streaming_split_messages():
+    """Messages are found whatever the chunks they are read in."""
+    docs = [[1, "a", 1, 0, {"1": {"rec": {"7": {"str": 'x\\"]}[{'}}}}],
+            [1, "b", 1, 1, {"1": {"lst": ["i32", 2, 1, 2]}}]]
+    stream = b"".join(json.dumps(doc, separators=(",", ":")).encode("utf8")
+                      for doc in docs) + b"\n"
+
+    class ChunkTransport(object):
+        def __init__(self, size):
+            self.data = BytesIO(stream)
+            self.size = size
+            self.reads = 0
+
+        def read_some(self, sz):
+            self.reads += 1
+            return self.data.read(min(sz, self.size))
+
+    for size in range(1, len(stream) + 1):
+        trans = ChunkTransport(size)
+        proto = TApacheJSONProtocol(trans)
+        for doc in docs:
+            assert doc[1:4] == proto.read_message_begin()
+            assert doc[4] == proto._req[4]
+            proto.read_message_end()
+        assert trans.reads <= len(stream) // size + 2
+        assert b"" == proto._read_message()
+
+
+def test_streaming_read_some():
+    docs = [[1, "ping%d" % i, 1, i, {"1": {"str": "x" * 5000}}]
+            for i in range(3)]
+    stream = b"".join(json.dumps(doc).encode("utf8") for doc in docs)
+
+    trans = TBufferedTransport(TFileObjectTransport(BytesIO(stream)))
+    proto = TApacheJSONProtocol(trans)
+    for doc in docs:
+        assert doc[1:4] == proto.read_message_begin()
+        proto.read_message_end()
+
+
+def test_streaming_truncated():
+    trans = TFileObjectTransport(BytesIO(b'[1,"ping",1,0,{"1":{"str":"'))
+    with pytest.raises(TTransportException):
+        TApacheJSONProtocol(trans).read_message_begin()
+
+
 @pytest.mark.skipif(sys.platform == "win32", reason="this test requires fork")
 @pytest.mark.parametrize('server_func', [(make_rpc_server, make_rpc_client),
                                          (make_http_server, make_http_client)])
@@ -0,0 +1,150 @@
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.rpc import ClientPool, make_server
+from thriftpy2.thrift import TDecodeException, TType
+from thriftpy2.transport import TTransportException
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    def hello(self, name):
+        return "hello " + name
+
+    def remove(self, name):
+        raise addressbook.PersonNotExistsError("not exists")
+
+    def sleep(self, ms):
+        time.sleep(ms / 1000.0)
+        return True
+
+
+@pytest.fixture(scope="module")
+def port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    # idle connections are closed by the server after 300ms
+    server = make_server(addressbook.AddressBookService, Dispatcher(),
+                         host="127.0.0.1", port=port, client_timeout=300)
+    server.daemon = True
+    server_thread = threading.Thread(target=server.serve, daemon=True)
+    server_thread.start()
+    time.sleep(0.1)
+
+    yield port
+
+    server.close()
+    server.trans.close()
+
+
+@pytest.fixture
+def pool(port):
+    pool = ClientPool(addressbook.AddressBookService, "127.0.0.1", port,
+                      max_size=2, wait_timeout=1)
+    yield pool
+    pool.close()
+
+
+def test_reuse(pool):
+    for _ in range(10):
+        assert "hello bob" == pool.hello("bob")
+
+    # thrift exceptions don't spoil the connection
+    with pytest.raises(addressbook.PersonNotExistsError):
+        pool.remove("bob")
+
+    stats = pool.stats()
+    assert 11 == stats["checkouts"]
+    assert 1 == stats["created"] == stats["size"] == stats["idle"]
+    assert 0 == stats["discarded"] == stats["in_use"]
+
+
+def test_max_size(pool):
+    threads = [threading.Thread(target=pool.sleep, args=(100, ))
+               for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = pool.stats()
+    assert 2 == stats["created"]
+    assert 6 == stats["checkouts"]
+    assert stats["wait_time_max"] > 0.05
+    assert stats["wait_time_total"] >= stats["wait_time_max"]
+
+
+def test_wait_timeout(pool):
+    pool.wait_timeout = 0.1
+    with pool.connection(), pool.connection():
+        with pytest.raises(TTransportException) as exc:
+            pool.hello("bob")
+    assert TTransportException.TIMED_OUT == exc.value.type
+    assert "hello bob" == pool.hello("bob")
+
+
+def test_replace_broken(pool):
+    with pytest.raises(TTransportException):
+        with pool.connection() as client:
+            assert "hello bob" == client.hello("bob")
+            raise TTransportException(TTransportException.END_OF_FILE)
+    assert 1 == pool.stats()["discarded"]
+    assert 0 == pool.stats()["size"]
+
+    assert "hello bob" == pool.hello("bob")
+    assert 2 == pool.stats()["created"]
+
+
+@pytest.mark.parametrize("exc", [
+    TProtocolException(TProtocolException.BAD_VERSION),
+    TDecodeException("Person", 1, "name", 1, TType.STRING),
+])
+def test_discard_desynchronized(pool, exc):
+    # the reply may have been read in part
+    with pytest.raises(type(exc)):
+        with pool.connection():
+            raise exc
+    assert 1 == pool.stats()["discarded"]
+    assert 0 == pool.stats()["size"]
+
+
+def test_health_check(pool):
+    assert "hello bob" == pool.hello("bob")
+    # the server closed the connection
+    time.sleep(0.5)
+    assert "hello bob" == pool.hello("bob")
+    assert 1 == pool.stats()["discarded"]
+
+    pool.health_check = lambda client: client.hello("check") == "nope"
+    assert "hello bob" == pool.hello("bob")
+    assert 2 == pool.stats()["discarded"]
+    assert 3 == pool.stats()["created"]
+
+
+def test_idle_timeout(pool):
+    pool.idle_timeout = 0.05
+    assert "hello bob" == pool.hello("bob")
+    time.sleep(0.1)
+    assert "hello bob" == pool.hello("bob")
+    assert 2 == pool.stats()["created"]
+
+
+def test_closed(pool):
+    with pool.connection() as client:
+        pool.close()
+        assert "hello bob" == client.hello("bob")
+    assert 0 == pool.stats()["size"]
+
+    with pytest.raises(TTransportException) as exc:
+        pool.hello("bob")
+    assert TTransportException.NOT_OPEN == exc.value.type
@@ -0,0 +1,151 @@
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from thriftpy2 import load
+from thriftpy2.protocol import binary as proto
+from thriftpy2.thrift import TPayload, TType
+
+TEST_DIR = Path(__file__).parent
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.LIST, "phones", (TType.STRING), False),
+    }
+    default_spec = [("id", None), ("phones", None)]
+
+
+class TMixed(TPayload):
+    thrift_spec = {
+        1: (TType.BOOL, "flag", False),
+        2: (TType.BYTE, "byte", False),
+        3: (TType.I16, "short", False),
+        20: (TType.I64, "long", False),
+        4: (TType.DOUBLE, "double", False),
+        -1: (TType.STRING, "name", False),
+        40: (TType.BINARY, "blob", False),
+        41: (TType.MAP, "scores", (TType.STRING, TType.DOUBLE), False),
+        42: (TType.SET, "tags", TType.I32, False),
+        43: (TType.LIST, "bools", TType.BOOL, False),
+        44: (TType.STRUCT, "item", TItem, False),
+        45: (TType.LIST, "items", (TType.STRUCT, TItem), False),
+    }
+    default_spec = [("flag", None), ("byte", None), ("short", None),
+                    ("long", None), ("double", None), ("name", None),
+                    ("blob", None), ("scores", None), ("tags", None),
+                    ("bools", None), ("item", None), ("items", None)]
+
+
+def mixed():
+    return TMixed(flag=False, byte=-7, short=-12345, long=-(2 ** 62),
+                  double=-1.5, name=u"你好", blob=b"\x00\xff" * 10,
+                  scores={"a": 1.0}, tags=[-1, 0, 1], bools=[True, False],
+                  item=TItem(id=1, phones=["x"]),
+                  items=[TItem(id=2), TItem(phones=[])])
+
+
+def encode(obj):
+    b = BytesIO()
+    proto.write_val(b, TType.STRUCT, obj)
+    return b.getvalue()
+
+
+def decode(cls, data, **kwargs):
+    obj = cls()
+    proto.read_struct(BytesIO(data), obj, **kwargs)
+    return obj
+
+
+@pytest.fixture
+def codec():
+    for cls in (TItem, TMixed):
+        proto.gen_codec(cls)
+    yield
+    for cls in (TItem, TMixed):
+        del cls.__thrift_binary_codec__
+
+
+def test_same_encoding_as_generic():
+    data = encode(mixed())
+
+    read_struct, write_struct = proto.struct_codec_generator(TMixed)
+    b = BytesIO()
+    write_struct(b, mixed())
+    assert data == b.getvalue()
+
+    obj = TMixed()
+    read_struct(BytesIO(data), obj)
+    assert mixed() == obj
+
+
+def test_codec_used_by_protocol(codec):
+    data = encode(mixed())
+    assert mixed() == decode(TMixed, data)
+
+    obj = TMixed()
+    proto.TBinaryProtocol(BytesIO(data)).read_struct(obj)
+    assert mixed() == obj
+
+
+def test_skip_unknown_fields(codec):
+    assert TItem() == decode(TItem, encode(mixed()))
+
+
+def test_mismatched_field_type(codec):
+    data = encode(TMixed(short=1, tags=[1]))
+
+    class TOther(TPayload):
+        thrift_spec = {
+            3: (TType.I32, "short", False),
+            42: (TType.SET, "tags", TType.I64, False),
+        }
+        default_spec = [("short", None), ("tags", None)]
+
+    proto.gen_codec(TOther)
+    assert TOther(tags=[]) == decode(TOther, data)
+
+
+def test_decode_response(codec):
+    data = encode(TMixed(name=u"你好"))
+    assert u"你好".encode("utf-8") == decode(
+        TMixed, data, decode_response=False).name
+
+    data = encode(TMixed(name=b"\xff"))
+    assert b"\xff" == decode(TMixed, data).name
+    with pytest.raises(UnicodeDecodeError):
+        decode(TMixed, data, strict_decode=True)
+
+
+def test_traceback_source():
+    import linecache
+
+    proto.struct_codec_generator(TItem)
+    source = "".join(linecache.getlines("<generated TItem.read_struct>"))
+    assert "obj.phones = v" in source
+
+
+def test_load_gen_codec():
+    ab = load(str(TEST_DIR / "addressbook.thrift"),
+              module_name="addressbook_codec_thrift", gen_codec=True)
+    assert "__thrift_binary_codec__" in ab.Person.__dict__
+    assert "__thrift_binary_codec__" in ab.PersonNotExistsError.__dict__
+    assert "__thrift_binary_codec__" in \
+        ab.AddressBookService.get_result.__dict__
+    # included modules get their codecs too
+    assert "__thrift_binary_codec__" in ab.container.MixItem.__dict__
+
+    person = ab.Person(name="Alice", created_at=1,
+                       phones=[ab.PhoneNumber(number="123")])
+    data = encode(person)
+    assert person == decode(ab.Person, data)
+
+
+def test_load_gen_codec_forward_reference():
+    thrift = load(str(TEST_DIR / "recursive_definition.thrift"),
+                  module_name="recursive_definition_codec_thrift",
+                  gen_codec=True)
+    foo = thrift.Foo(test=thrift.Bar(test=thrift.Foo(some_int=[1, 2])))
+    assert foo == decode(thrift.Foo, encode(foo))
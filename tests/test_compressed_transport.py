@@ -0,0 +1,229 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import zlib
+from io import BytesIO
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.rpc import client_context, make_server
+from thriftpy2.contrib.aio.transport import TAsyncCompressedTransport
+from thriftpy2.transport import TMemoryBuffer, TTransportException
+from thriftpy2.transport.compressed import (
+    TCodec,
+    TCompressedTransport,
+    TCompressionCounters,
+    TZlibTransportFactory,
+    ZstdCodec,
+    register_codec,
+)
+
+TRANSPORTS = [TCompressedTransport]
+FACTORIES = [(TZlibTransportFactory, TBinaryProtocolFactory)]
+if CYTHON:
+    from thriftpy2.protocol import TCyBinaryProtocolFactory
+    from thriftpy2.transport.compressed import (
+        TCyCompressedTransport, TCyZlibTransportFactory)
+    TRANSPORTS.append(TCyCompressedTransport)
+    FACTORIES.append((TCyZlibTransportFactory, TCyBinaryProtocolFactory))
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+SMALL = b"ping"
+LARGE = b"hello world " * 1000
+
+
+def roundtrip(writer_cls, reader_cls, messages, **kwargs):
+    counters = TCompressionCounters()
+    buf = TMemoryBuffer()
+    writer = writer_cls(buf, counters=counters, **kwargs)
+    for msg in messages:
+        writer.write(msg)
+        writer.flush()
+
+    reader = reader_cls(TMemoryBuffer(buf.getvalue()), counters=counters)
+    for msg in messages:
+        assert msg == reader.read(len(msg))
+    return buf.getvalue(), counters
+
+
+@pytest.mark.parametrize("writer_cls", TRANSPORTS)
+@pytest.mark.parametrize("reader_cls", TRANSPORTS)
+def test_roundtrip(writer_cls, reader_cls):
+    data, counters = roundtrip(writer_cls, reader_cls, [SMALL, LARGE, SMALL])
+
+    # only the large frame is compressed
+    assert len(data) < len(LARGE)
+    assert 3 == counters.frames_written == counters.frames_read
+    assert 1 == counters.frames_compressed == counters.frames_decompressed
+    assert counters.write_ratio > 10
+    assert counters.write_ratio == counters.read_ratio
+    assert len(data) == counters.wire_bytes_written + 3 * 5
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_threshold(trans_cls):
+    data, counters = roundtrip(trans_cls, trans_cls, [LARGE],
+                               threshold=len(LARGE) + 1)
+    assert len(LARGE) + 5 == len(data)
+    assert 0 == counters.frames_compressed
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_incompressible(trans_cls):
+    msg = os.urandom(512)
+    data, counters = roundtrip(trans_cls, trans_cls, [msg], threshold=1)
+    assert msg == data[5:]
+    assert 0 == counters.frames_compressed
+
+
+@register_codec
+class TReversedZlibCodec(TCodec):
+    codec_id = 200
+    name = "reversed-zlib"
+
+    def compress(self, data):
+        return zlib.compress(data)[::-1]
+
+    def decompress(self, data, max_size):
+        return zlib.decompress(bytes(data)[::-1])
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_custom_codec(trans_cls):
+    # the reader finds the codec by its id
+    data, _ = roundtrip(trans_cls, trans_cls, [LARGE],
+                        codec=TReversedZlibCodec())
+    assert 200 == data[4]
+
+    with pytest.raises(ValueError):
+        register_codec(type("TCodec", (TCodec, ), {"codec_id": 1}))
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_unknown_codec(trans_cls):
+    t = trans_cls(TMemoryBuffer(b"\x00\x00\x00\x02\x63x"))
+    with pytest.raises(TTransportException) as exc:
+        t.read(1)
+    assert "Unknown compression codec 99" in str(exc.value)
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_max_frame_size(trans_cls):
+    data, _ = roundtrip(trans_cls, trans_cls, [LARGE])
+    # a small frame can't decompress to more than the limit
+    assert len(data) < 1000
+    reader = trans_cls(TMemoryBuffer(data), max_frame_size=len(LARGE) - 1)
+    with pytest.raises(TTransportException) as exc:
+        reader.read(1)
+    assert TTransportException.SIZE_LIMIT == exc.value.type
+
+    reader = trans_cls(TMemoryBuffer(data), max_frame_size=len(LARGE))
+    assert LARGE == reader.read(len(LARGE))
+
+
+def test_zstd():
+    try:
+        codec = ZstdCodec()
+    except ImportError:
+        pytest.skip("zstd not available.")
+
+    data, _ = roundtrip(TCompressedTransport, TCompressedTransport, [LARGE],
+                        codec=codec)
+    assert 2 == data[4]
+
+
+class TAsyncMemoryBuffer(object):
+    def __init__(self, value=b""):
+        self._buf = BytesIO(value)
+
+    async def read(self, sz):
+        return self._buf.read(sz)
+
+    def write(self, data):
+        self._buf.write(data)
+
+    async def flush(self):
+        pass
+
+    def getvalue(self):
+        return self._buf.getvalue()
+
+
+@pytest.mark.parametrize("trans_cls", TRANSPORTS)
+def test_async(trans_cls):
+    async def main():
+        buf = TAsyncMemoryBuffer()
+        t = TAsyncCompressedTransport(buf)
+        for msg in [SMALL, LARGE]:
+            t.write(msg)
+            await t.flush()
+        data = buf.getvalue()
+
+        reader = trans_cls(TMemoryBuffer(data))
+        assert SMALL == reader.read(len(SMALL))
+        assert LARGE == reader.read(len(LARGE))
+
+        t = TAsyncCompressedTransport(TAsyncMemoryBuffer(data))
+        assert SMALL == await t.read(len(SMALL))
+        assert LARGE[:10] == await t.read(10)
+
+        t = TAsyncCompressedTransport(TAsyncMemoryBuffer(data),
+                                      max_frame_size=len(LARGE) - 1)
+        assert SMALL == await t.read(len(SMALL))
+        with pytest.raises(TTransportException) as exc:
+            await t.read(1)
+        assert TTransportException.SIZE_LIMIT == exc.value.type
+
+    asyncio.run(main())
+
+
+class Dispatcher(object):
+    def __init__(self):
+        self.registry = {}
+
+    def add(self, person):
+        self.registry[person.name] = person
+        return True
+
+    def get(self, name):
+        return self.registry[name]
+
+
+@pytest.mark.parametrize("factory_cls, proto_factory_cls", FACTORIES)
+def test_rpc(factory_cls, proto_factory_cls):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    counters = TCompressionCounters()
+    server = make_server(addressbook.AddressBookService, Dispatcher(),
+                         host="127.0.0.1", port=port,
+                         proto_factory=proto_factory_cls(),
+                         trans_factory=factory_cls(counters=counters))
+    server_thread = threading.Thread(target=server.serve, daemon=True)
+    server_thread.start()
+    time.sleep(0.1)
+
+    try:
+        with client_context(addressbook.AddressBookService, "127.0.0.1", port,
+                            proto_factory=proto_factory_cls(),
+                            trans_factory=factory_cls()) as client:
+            name = "Dennis Ritchie" * 1000
+            assert client.add(addressbook.Person(name=name))
+            assert name == client.get(name).name
+    finally:
+        server.close()
+        server.trans.close()
+        server_thread.join(timeout=1)
+
+    # the person was compressed both ways
+    assert counters.frames_decompressed >= 1
+    assert counters.frames_compressed >= 1
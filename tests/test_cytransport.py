@@ -7,6 +7,8 @@ if CYTHON:
     from thriftpy2.transport.framed import TCyFramedTransport
     from thriftpy2.transport.buffered import TCyBufferedTransport
     from thriftpy2.transport import TMemoryBuffer, TTransportException
+    from thriftpy2.transport.cybase import (
+        buffer_pool_stats, configure_buffer_pool, trim_buffer_pool)
 else:
     pytest.skip("cython not enabled.", allow_module_level=True)
 
@@ -51,3 +53,163 @@ def test_transport_handle():
     assert TCyMemoryBuffer().sock is None
     assert TCyBufferedTransport(TCyFramedTransport(s)).sock == 'the sock'
     assert TCyBufferedTransport(TCyMemoryBuffer()).sock is None
+
+
+def test_read_some():
+    s = TMemoryBuffer()
+    t = TCyFramedTransport(s)
+    t.write(b"ping")
+    t.flush()
+    t.write(b"hello world")
+    t.flush()
+
+    # reads stop at the end of the frame
+    assert t.read_some(3) == b"pin"
+    assert t.read_some(100) == b"g"
+    assert t.read_some(100) == b"hello world"
+
+    s = TMemoryBuffer(b"ping hello world")
+    t = TCyBufferedTransport(s, buf_size=1024)
+    assert t.read_some(4) == b"ping"
+    assert t.read_some(100) == b" hello world"
+    with pytest.raises(TTransportException):
+        t.read_some(100)
+
+
+def test_read_into():
+    import socket
+    from thriftpy2.transport import TSocket
+
+    class TCountingSocket(TSocket):
+        reads = 0
+
+        def read(self, sz):
+            raise AssertionError("read_into should be used")
+
+        def read_into(self, buffer, offset, size):
+            TCountingSocket.reads += 1
+            return super(TCountingSocket, self).read_into(buffer, offset,
+                                                          size)
+
+    big = b"x" * 60000
+    a, b = socket.socketpair()
+    try:
+        writer = TCyFramedTransport(TSocket(sock=a))
+        for data in (b"ping", big, b"pong"):
+            writer.write(data)
+            writer.flush()
+        a.shutdown(socket.SHUT_WR)
+
+        reader = TCyFramedTransport(TCountingSocket(sock=b), buf_size=1024)
+        assert reader.read(4) == b"ping"
+        assert reader.read(len(big)) == big
+        assert reader.read(4) == b"pong"
+        with pytest.raises(TTransportException):
+            reader.read(1)
+    finally:
+        a.close()
+        b.close()
+
+    a, b = socket.socketpair()
+    try:
+        a.sendall(b"hello world" + big)
+        a.shutdown(socket.SHUT_WR)
+
+        reader = TCyBufferedTransport(TCountingSocket(sock=b), buf_size=1024)
+        assert reader.read(5) == b"hello"
+        assert reader.read(6) == b" world"
+        assert reader.read(len(big)) == big
+    finally:
+        a.close()
+        b.close()
+
+
+def test_writev():
+    import socket
+    import threading
+    from thriftpy2.protocol.cybin import TCyBinaryProtocol
+    from thriftpy2.thrift import TPayload, TType
+    from thriftpy2.transport import TSocket
+
+    class TBlob(TPayload):
+        thrift_spec = {
+            1: (TType.I32, "id", False),
+            2: (TType.BINARY, "blob", False),
+            3: (TType.STRING, "name", False),
+        }
+        default_spec = [("id", None), ("blob", None), ("name", None)]
+
+    class TRecordingSocket(TSocket):
+        segments = []
+
+        def writev(self, buffers):
+            self.segments.extend(buffers)
+            super(TRecordingSocket, self).writev(buffers)
+
+    def write(trans):
+        obj.write(TCyBinaryProtocol(trans))
+        trans.flush()
+
+    def recv_all(sock, out):
+        while True:
+            chunk = sock.recv(1 << 16)
+            if not chunk:
+                break
+            out.append(chunk)
+
+    big = b"x" * (1 << 20)
+    obj = TBlob(id=1, blob=big, name="ping")
+
+    for trans_cls in (TCyFramedTransport, TCyBufferedTransport):
+        expected = TMemoryBuffer()
+        write(trans_cls(expected))
+
+        a, b = socket.socketpair()
+        chunks = []
+        reader = threading.Thread(target=recv_all, args=(b, chunks))
+        reader.start()
+        try:
+            TRecordingSocket.segments = []
+            write(trans_cls(TRecordingSocket(sock=a)))
+            a.shutdown(socket.SHUT_WR)
+            reader.join()
+
+            # the blob is sent as it is, without being copied
+            assert any(isinstance(s, memoryview) and s.obj is big
+                       for s in TRecordingSocket.segments)
+            assert expected.getvalue() == b"".join(chunks)
+        finally:
+            a.close()
+            b.close()
+
+
+def test_buffer_pool():
+    configure_buffer_pool(window=2)
+    try:
+        s = TMemoryBuffer()
+        s.write(b"x" * 1000000)
+        in_use = buffer_pool_stats()["in_use_bytes"]
+
+        # shrunk once a window passed without large messages
+        for _ in range(4):
+            s.setvalue(b"ping")
+        stats = buffer_pool_stats()
+        assert stats["shrinks"] >= 1
+        assert stats["in_use_bytes"] <= in_use - 1000000 + 4096
+
+        # too large to be pooled, released as soon as it's emptied
+        s.write(b"x" * (20 * 1024 * 1024))
+        s.setvalue(b"ping")
+        assert buffer_pool_stats()["in_use_bytes"] < in_use
+
+        # the buffers of dropped transports are reused
+        del s
+        hits = buffer_pool_stats()["hits"]
+        t = TCyFramedTransport(TMemoryBuffer())
+        assert buffer_pool_stats()["hits"] >= hits + 2
+
+        del t
+        assert trim_buffer_pool() > 0
+        assert 0 == buffer_pool_stats()["pooled_bytes"]
+    finally:
+        configure_buffer_pool(window=64)
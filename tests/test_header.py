@@ -0,0 +1,215 @@
+import socket
+import struct
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.protocol.compact import TCompactProtocolFactory
+from thriftpy2.protocol.header import (
+    THeaderClientType,
+    THeaderProtocol,
+    THeaderProtocolFactory,
+    THeaderSubprotocolID,
+    THeaderTransformID,
+)
+from thriftpy2.rpc import client_context, make_server
+from thriftpy2.thrift import (
+    TMessageType,
+    get_request_headers,
+    set_response_header,
+)
+from thriftpy2.transport import (
+    TBufferedTransportFactory,
+    TMemoryBuffer,
+    TTransportException,
+)
+from thriftpy2.transport.buffered import (
+    TBufferedTransport,
+    TBufferedTransportFactory as TPyBufferedTransportFactory,
+)
+from thriftpy2.transport.framed import (
+    TFramedTransport,
+    TFramedTransportFactory as TPyFramedTransportFactory,
+)
+from thriftpy2.transport.header import THeaderTransport
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class TDuplexBuffer(object):
+    def __init__(self, value):
+        self.out = TMemoryBuffer()
+        self._in = TMemoryBuffer(value)
+
+    def read(self, sz):
+        return self._in.read(sz)
+
+    def write(self, data):
+        self.out.write(data)
+
+    def flush(self):
+        pass
+
+
+def write_message(proto, name="ping", seqid=3):
+    proto.write_message_begin(name, TMessageType.CALL, seqid)
+    addressbook.Person(name="Alice").write(proto)
+    proto.write_message_end()
+    proto.trans.flush()
+
+
+def read_message(proto):
+    api, _, seqid = proto.read_message_begin()
+    person = addressbook.Person()
+    person.read(proto)
+    proto.read_message_end()
+    return api, seqid, person.name
+
+
+@pytest.mark.parametrize("protocol_id", [THeaderSubprotocolID.BINARY,
+                                         THeaderSubprotocolID.COMPACT])
+@pytest.mark.parametrize("transform", [None, THeaderTransformID.ZLIB])
+def test_header_roundtrip(protocol_id, transform):
+    buf = TMemoryBuffer()
+    proto = THeaderProtocol(buf, default_protocol=protocol_id)
+    proto.set_header("trace-id", "42")
+    proto.set_header("caller", "tést")
+    if transform is not None:
+        proto.add_transform(transform)
+    write_message(proto)
+    # headers are sent with one message only
+    write_message(proto, seqid=4)
+
+    data = buf.getvalue()
+    assert 0x0FFF == struct.unpack_from("!H", data, 4)[0]
+    assert 3 == struct.unpack_from("!i", data, 8)[0]
+
+    reader = THeaderProtocol(TMemoryBuffer(data))
+    assert ("ping", 3, "Alice") == read_message(reader)
+    assert {"trace-id": "42", "caller": "tést"} == reader.get_headers()
+    assert protocol_id == reader.trans.protocol_id
+    assert ("ping", 4, "Alice") == read_message(reader)
+    assert {} == reader.get_headers()
+
+
+def test_max_frame_size():
+    buf = TMemoryBuffer()
+    proto = THeaderProtocol(buf)
+    proto.add_transform(THeaderTransformID.ZLIB)
+    write_message(proto, name="x" * 1024 * 1024)
+    data = buf.getvalue()
+    assert len(data) < 4096
+
+    # the payload can't decompress to more than the limit
+    proto = THeaderProtocol(THeaderTransport(TMemoryBuffer(data),
+                                             max_frame_size=4096))
+    with pytest.raises(TTransportException) as exc:
+        read_message(proto)
+    assert TTransportException.SIZE_LIMIT == exc.value.type
+
+
+def test_read_foreign_header():
+    # compact payload, no transform, one key/value header and an unknown
+    # info header, then padding.
+    payload = TMemoryBuffer()
+    write_message(TCompactProtocolFactory().get_protocol(payload))
+    header = b"\x02\x00" + b"\x01\x01\x01k\x02vv" + b"\x07\x00\x00"
+    frame = struct.pack("!HHiH", 0x0FFF, 0, 9, len(header) // 4) + \
+        header + payload.getvalue()
+
+    frame = struct.pack("!i", len(frame)) + frame
+    proto = THeaderProtocol(TMemoryBuffer(frame))
+    assert ("ping", 3, "Alice") == read_message(proto)
+    assert {"k": "vv"} == proto.get_headers()
+    assert 9 == proto.trans.seqid
+
+
+@pytest.mark.parametrize("trans_cls, proto_factory, client_type", [
+    (TFramedTransport, TBinaryProtocolFactory(),
+     THeaderClientType.FRAMED_BINARY),
+    (TBufferedTransport, TBinaryProtocolFactory(),
+     THeaderClientType.UNFRAMED_BINARY),
+    (TFramedTransport, TCompactProtocolFactory(),
+     THeaderClientType.FRAMED_COMPACT),
+    (TBufferedTransport, TCompactProtocolFactory(),
+     THeaderClientType.UNFRAMED_COMPACT),
+])
+def test_detect(trans_cls, proto_factory, client_type):
+    buf = TMemoryBuffer()
+    write_message(proto_factory.get_protocol(trans_cls(buf)))
+    data = buf.getvalue()
+
+    # the reply is framed as the request was
+    trans = TDuplexBuffer(data * 2)
+    proto = THeaderProtocol(trans)
+    for _ in range(2):
+        assert ("ping", 3, "Alice") == read_message(proto)
+        assert client_type == proto.trans.client_type
+        proto.set_header("dropped", "x")
+        write_message(proto)
+    assert data * 2 == trans.out.getvalue()
+    # the headers which couldn't be sent don't pile up
+    assert {} == proto.trans._write_headers
+
+    proto = THeaderProtocol(TMemoryBuffer(data),
+                            client_types=[THeaderClientType.HEADERS])
+    with pytest.raises(TTransportException) as exc:
+        proto.read_message_begin()
+    assert TTransportException.INVALID_CLIENT_TYPE == exc.value.type
+
+
+class Dispatcher(object):
+    def get(self, name):
+        headers = get_request_headers()
+        set_response_header("echo", headers.get("trace-id", ""))
+        return addressbook.Person(name=name)
+
+
+@pytest.fixture
+def server():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    server = make_server(addressbook.AddressBookService, Dispatcher(),
+                         host="127.0.0.1", port=port,
+                         proto_factory=THeaderProtocolFactory(),
+                         trans_factory=TBufferedTransportFactory())
+    server_thread = threading.Thread(target=server.serve, daemon=True)
+    server_thread.start()
+    time.sleep(0.1)
+
+    yield port
+
+    server.close()
+    server.trans.close()
+    server_thread.join(timeout=1)
+
+
+def test_rpc_headers(server):
+    with client_context(addressbook.AddressBookService, "127.0.0.1", server,
+                        proto_factory=THeaderProtocolFactory(),
+                        trans_factory=TBufferedTransportFactory()) as client:
+        client.set_request_header("trace-id", "abc")
+        assert "Bob" == client.get("Bob").name
+        assert {"echo": "abc"} == client.get_response_headers()
+
+        assert "Bob" == client.get("Bob").name
+        assert {"echo": ""} == client.get_response_headers()
+
+
+@pytest.mark.parametrize("trans_factory, proto_factory", [
+    (TPyFramedTransportFactory(), TBinaryProtocolFactory()),
+    (TPyBufferedTransportFactory(), TBinaryProtocolFactory()),
+    (TPyBufferedTransportFactory(), TCompactProtocolFactory()),
+])
+def test_rpc_legacy_clients(server, trans_factory, proto_factory):
+    with client_context(addressbook.AddressBookService, "127.0.0.1", server,
+                        proto_factory=proto_factory,
+                        trans_factory=trans_factory) as client:
+        assert "Bob" == client.get("Bob").name
@@ -0,0 +1,115 @@
+import pickle
+
+import pytest
+
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import binary, compact
+from thriftpy2.protocol.lazy import TLazyPayload, lazy_class, scan_struct
+from thriftpy2.thrift import TPayload, TType
+from thriftpy2.utils import deserialize, serialize
+
+FACTORIES = [binary.TBinaryProtocolFactory()]
+if CYTHON:
+    from thriftpy2.protocol import cybin
+    FACTORIES.append(cybin.TCyBinaryProtocolFactory())
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.STRING, "name", False),
+    }
+    default_spec = [("id", None), ("name", None)]
+
+
+class TRequest(TPayload):
+    thrift_spec = {
+        1: (TType.STRING, "route", False),
+        2: (TType.LIST, "items", (TType.STRUCT, TItem), False),
+        3: (TType.BINARY, "blob", False),
+        4: (TType.I64, "missing", False),
+        5: (TType.STRING, "default", False),
+    }
+    default_spec = [("route", None), ("items", None), ("blob", None),
+                    ("missing", None), ("default", "x")]
+
+
+def request():
+    return TRequest(route="a", items=[TItem(id=1, name="b")],
+                    blob=b"\x00" * 100, default=None)
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_scan_struct(factory):
+    data = serialize(TItem(id=1, name="abc"), factory) + b"trailing"
+    fields, size = scan_struct(data, TItem.thrift_spec)
+    assert {1: (3, 7), 2: (10, 17)} == fields
+    assert 18 == size
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_decode_on_access(factory):
+    data = serialize(request(), factory)
+    obj = deserialize(TRequest(), data, factory, lazy=True)
+    assert isinstance(obj, TLazyPayload)
+    assert isinstance(obj, TRequest)
+    assert {"missing": None, "default": "x"} == obj.__dict__
+
+    assert "a" == obj.route
+    assert "a" == obj.__dict__["route"]
+    assert "items" not in obj.__dict__
+    assert [TItem(id=1, name="b")] == obj.items
+    assert obj.missing is None
+
+    with pytest.raises(AttributeError):
+        obj.no_such_field
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_untouched_copies_bytes(factory):
+    data = serialize(request(), factory)
+    obj = deserialize(TRequest(), data + b"\xff", factory, lazy=True)
+    obj.route
+    assert data == serialize(obj, factory)
+
+    # mutable fields handed out may be changed in place
+    obj.items.append(TItem(id=2))
+    expected = request()
+    expected.default = "x"
+    expected.items.append(TItem(id=2))
+    assert serialize(expected, factory) == serialize(obj, factory)
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_set_attribute(factory):
+    obj = deserialize(TRequest(), serialize(request(), factory), factory,
+                      lazy=True)
+    obj.route = "z"
+    assert "z" == obj.route
+
+    expected = request()
+    expected.route = "z"
+    expected.default = "x"
+    assert expected == obj
+    assert obj == expected
+    assert hash(expected) == hash(obj)
+    assert repr(expected) == repr(obj)
+    assert serialize(expected, factory) == serialize(obj, factory)
+
+
+def test_pickle():
+    obj = deserialize(TRequest(), serialize(request()), lazy=True)
+    obj = pickle.loads(pickle.dumps(obj))
+    assert type(obj) is TRequest
+    assert "a" == obj.route
+
+
+def test_lazy_class_cached():
+    assert lazy_class(TItem) is lazy_class(TItem)
+    assert "TItem" == lazy_class(TItem).__name__
+
+
+def test_other_protocols():
+    with pytest.raises(TypeError):
+        deserialize(TItem(), b"\x00", compact.TCompactProtocolFactory(),
+                    lazy=True)
@@ -0,0 +1,172 @@
+from io import StringIO
+
+import pytest
+
+import thriftpy2
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import message
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.protocol.compact import TCompactProtocolFactory
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.protocol.message import TCompactMessageParser, TMessageParser
+from thriftpy2.thrift import TMessageType
+
+values_thrift = thriftpy2.load_fp(StringIO("""
+struct Values {
+    1: bool b,
+    2: byte y,
+    3: i16 s,
+    4: i32 i,
+    5: i64 l,
+    6: double d,
+    7: string str,
+    8: binary bin,
+    9: list<bool> bools,
+    10: list<i32> ints,
+    11: map<i64, list<double>> m,
+    12: list<Values> children,
+    13: map<string, string> empty,
+    300: bool far,
+}
+"""), module_name="values_thrift")
+
+VALUES = values_thrift.Values(
+    b=True, y=-3, s=300, i=-70000, l=2 ** 40, d=1.5, str="ünicode",
+    bin=b"\x00\xff", bools=[True, False, True], ints=[1, 2, 3],
+    m={1: [0.5, 1.5], -1: []}, empty={}, far=False,
+    children=[values_thrift.Values(str="child", i=i) for i in range(20)])
+
+BINARY_SCANS = [message._scan_binary_message]
+BINARY_SCANNERS = [message._BinaryScanner]
+if CYTHON:
+    from thriftpy2.protocol.cybin import BinaryScanner, scan_message
+    BINARY_SCANS.append(scan_message)
+    BINARY_SCANNERS.append(BinaryScanner)
+
+PARSERS = [TCompactMessageParser] + [
+    type("TParser", (TMessageParser, ), {"scanner_class": scanner_class})
+    for scanner_class in BINARY_SCANNERS]
+
+
+def messages(parser, count=3):
+    return b"".join(
+        parser.encode("call_%d" % seqid, TMessageType.CALL, seqid, VALUES)
+        for seqid in range(count))
+
+
+@pytest.mark.parametrize("parser_cls", PARSERS)
+@pytest.mark.parametrize("framed", [False, True])
+def test_feed(parser_cls, framed):
+    data = messages(parser_cls(framed=framed))
+
+    for chunk_size in [1, 7, len(data)]:
+        parser = parser_cls(framed=framed)
+        received = []
+        for i in range(0, len(data), chunk_size):
+            received.extend(parser.feed(data[i:i + chunk_size]))
+
+        assert 3 == len(received)
+        for seqid, (name, ttype, rseqid, payload) in enumerate(received):
+            assert ("call_%d" % seqid, TMessageType.CALL, seqid) == \
+                (name, ttype, rseqid)
+            assert VALUES == parser.decode(payload, values_thrift.Values())
+        assert not parser._buf
+
+
+def feed_chunks(parser, data, chunk_size=1024):
+    received = []
+    for i in range(0, len(data), chunk_size):
+        received.extend(parser.feed(data[i:i + chunk_size]))
+    (name, ttype, seqid, payload), = received
+    return parser.decode(payload, values_thrift.Values())
+
+
+@pytest.mark.parametrize("parser_cls", PARSERS)
+def test_feed_chunks(parser_cls):
+    values = values_thrift.Values(bin=b"x" * 1024 * 1024)
+    data = parser_cls().encode("call", TMessageType.CALL, 1, values)
+
+    scans = []
+
+    class Scanner(parser_cls.scanner_class):
+        def scan(self, data, pos=0):
+            scans.append(len(data) - pos)
+            return super(Scanner, self).scan(data, pos)
+
+    parser = type("Parser", (parser_cls, ), {"scanner_class": Scanner})()
+    assert values == feed_chunks(parser, data)
+    # not scanned again until the whole value is received
+    assert 3 >= len(scans)
+
+
+def test_feed_chunks_values(monkeypatch):
+    values = values_thrift.Values(ints=list(range(100000)))
+    data = TCompactMessageParser().encode("call", TMessageType.CALL, 1, values)
+
+    calls = []
+    scan_varint = message._scan_varint
+
+    def counted(data, pos):
+        calls.append(pos)
+        return scan_varint(data, pos)
+
+    monkeypatch.setattr(message, "_scan_varint", counted)
+    assert values == feed_chunks(TCompactMessageParser(), data)
+    # the values already scanned are not scanned again
+    assert len(calls) < 2 * len(values.ints)
+
+
+@pytest.mark.parametrize("parser_cls, proto_factory", [
+    (TMessageParser, TBinaryProtocolFactory(strict_write=False)),
+    (TMessageParser, TBinaryProtocolFactory()),
+    (TCompactMessageParser, TCompactProtocolFactory()),
+])
+def test_pure_protocols(parser_cls, proto_factory):
+    writer = parser_cls(proto_factory)
+    data = writer.encode("ping", TMessageType.ONEWAY, 9, VALUES)
+
+    parser = parser_cls()
+    assert [] == parser.feed(data[:-1])
+    (name, ttype, seqid, payload), = parser.feed(data[-1:])
+    assert ("ping", TMessageType.ONEWAY, 9) == (name, ttype, seqid)
+    assert VALUES == writer.decode(payload, values_thrift.Values())
+
+
+@pytest.mark.parametrize("scan", BINARY_SCANS)
+def test_truncated(scan):
+    data = TMessageParser().encode("call", TMessageType.CALL, 1, VALUES)
+    for i in range(len(data)):
+        assert scan(data[:i]) is None
+    assert len(data) == scan(data + b"extra")[-1]
+
+
+@pytest.mark.parametrize("parser_cls, data, code", [
+    (TMessageParser, b"\x80\x02\x00\x01", TProtocolException.BAD_VERSION),
+    (TCompactMessageParser, b"\x83\x21", TProtocolException.BAD_VERSION),
+    (TMessageParser, b"\x80\x01\x00\x01\xff\xff\xff\xff",
+     TProtocolException.NEGATIVE_SIZE),
+])
+def test_invalid(parser_cls, data, code):
+    with pytest.raises(TProtocolException) as exc:
+        parser_cls().feed(data)
+    assert code == exc.value.type
+
+
+@pytest.mark.parametrize("framed", [False, True])
+def test_max_message_size(framed):
+    data = messages(TMessageParser(framed=framed), count=1)
+    parser = TMessageParser(framed=framed, max_message_size=len(data) // 2)
+    with pytest.raises(TProtocolException) as exc:
+        parser.feed(data[:-1])
+    assert TProtocolException.SIZE_LIMIT == exc.value.type
+
+
+@pytest.mark.parametrize("parser_cls", PARSERS)
+def test_max_message_size_declared(parser_cls):
+    # raised as soon as a value declares a size over the limit
+    values = values_thrift.Values(bin=b"x" * 100000)
+    data = parser_cls().encode("call", TMessageType.CALL, 1, values)
+    parser = parser_cls(max_message_size=1000)
+    with pytest.raises(TProtocolException) as exc:
+        parser.feed(data[:100])
+    assert TProtocolException.SIZE_LIMIT == exc.value.type
@@ -0,0 +1,137 @@
+import socket
+import struct
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.rpc import make_client, make_server
+from thriftpy2.server import TNonblockingServer
+from thriftpy2.thrift import TMessageType
+from thriftpy2.transport.framed import TFramedTransportFactory
+from thriftpy2.transport.memory import TMemoryBuffer
+
+FACTORIES = [(TFramedTransportFactory, TBinaryProtocolFactory)]
+if CYTHON:
+    from thriftpy2.protocol import TCyBinaryProtocolFactory
+    from thriftpy2.transport import TCyFramedTransportFactory
+    FACTORIES.append((TCyFramedTransportFactory, TCyBinaryProtocolFactory))
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    def get(self, name):
+        return addressbook.Person(name=name)
+
+    def sleep(self, ms):
+        time.sleep(ms / 1000.0)
+        return True
+
+
+@pytest.fixture(params=FACTORIES)
+def server(request):
+    trans_factory_cls, proto_factory_cls = request.param
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    server = make_server(addressbook.AddressBookService, Dispatcher(),
+                         host="127.0.0.1", port=port,
+                         proto_factory=proto_factory_cls(),
+                         server_class=TNonblockingServer, threads=4,
+                         max_frame_size=1024 * 1024, daemon=True)
+    server_thread = threading.Thread(target=server.serve, daemon=True)
+    server_thread.start()
+    time.sleep(0.1)
+
+    def client():
+        return make_client(addressbook.AddressBookService, "127.0.0.1", port,
+                           proto_factory=proto_factory_cls(),
+                           trans_factory=trans_factory_cls())
+
+    yield server, port, client
+
+    server.close()
+    server_thread.join(timeout=1)
+    server.trans.close()
+
+
+def test_idle_connections(server):
+    server, port, client = server
+    idle = [client() for _ in range(200)]
+    c = client()
+    name = "Alice" * 10000
+    assert name == c.get(name).name
+    assert "Bob" == idle[-1].get("Bob").name
+    assert 201 == len(server.connections)
+
+    for i in idle:
+        i.close()
+    c.close()
+    time.sleep(0.1)
+    assert 0 == len(server.connections)
+
+
+def test_concurrent_requests(server):
+    _, _, client = server
+    clients = [client() for _ in range(4)]
+    threads = [threading.Thread(target=c.sleep, args=(300, ))
+               for c in clients]
+
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the workers sleep in parallel
+    assert time.monotonic() - start < 1.0
+
+    for c in clients:
+        c.close()
+
+
+def test_pipelined_requests(server):
+    _, port, _ = server
+    frames = []
+    for seqid in range(3):
+        buf = TMemoryBuffer()
+        proto = TBinaryProtocolFactory().get_protocol(buf)
+        proto.write_message_begin("get", TMessageType.CALL, seqid)
+        addressbook.AddressBookService.get_args(name="Bob").write(proto)
+        data = buf.getvalue()
+        frames.append(struct.pack("!i", len(data)) + data)
+
+    with socket.create_connection(("127.0.0.1", port), timeout=3) as sock:
+        sock.sendall(b"".join(frames))
+        data = b""
+        while data.count(b"Bob") < 3:
+            chunk = sock.recv(4096)
+            assert chunk
+            data += chunk
+
+    # the replies come back in order
+    seqids = []
+    while data:
+        size, = struct.unpack_from("!i", data)
+        proto = TBinaryProtocolFactory().get_protocol(
+            TMemoryBuffer(data[4:4 + size]))
+        seqids.append(proto.read_message_begin()[2])
+        data = data[4 + size:]
+    assert [0, 1, 2] == seqids
+
+
+def test_frame_too_large(server):
+    server, port, client = server
+    with socket.create_connection(("127.0.0.1", port), timeout=3) as sock:
+        sock.sendall(struct.pack("!i", 2 * 1024 * 1024))
+        assert b"" == sock.recv(4)
+
+    c = client()
+    assert "Bob" == c.get("Bob").name
+    c.close()
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import signal
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.rpc import make_aio_server, make_client, make_server
+from thriftpy2.server import TProcessPoolServer
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    def hello(self, name):
+        return str(os.getpid())
+
+    def sleep(self, ms):
+        time.sleep(ms / 1000.0)
+        return True
+
+
+class AsyncDispatcher(object):
+    async def hello(self, name):
+        return str(os.getpid())
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[-1]
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def call_hello(port):
+    client = make_client(addressbook.AddressBookService, "127.0.0.1", port)
+    try:
+        return int(client.hello("pid"))
+    finally:
+        client.close()
+
+
+@pytest.fixture
+def pool(request):
+    port = free_port()
+    if request.param == "async":
+        server = make_aio_server(addressbook.AddressBookService,
+                                 AsyncDispatcher(), host="127.0.0.1",
+                                 port=port, loop=asyncio.new_event_loop())
+        pool = TProcessPoolServer(server, workers=2, reuse_port=True,
+                                  graceful_timeout=2)
+    else:
+        server = make_server(addressbook.AddressBookService, Dispatcher(),
+                             host="127.0.0.1", port=port)
+        pool = TProcessPoolServer(server, workers=2, graceful_timeout=2)
+
+    pool_thread = threading.Thread(target=pool.serve, daemon=True)
+    pool_thread.start()
+    wait_for(lambda: len(pool.pids) == 2)
+    time.sleep(0.3)
+
+    yield pool, port
+
+    pids = set(pool.pids)
+    pool.close()
+    pool_thread.join(timeout=5)
+    for pid in pids:
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+@pytest.mark.parametrize("pool", ["sync", "async"], indirect=True)
+def test_workers(pool):
+    pool, port = pool
+    pids = {call_hello(port) for _ in range(20)}
+    assert pids <= pool.pids
+    assert os.getpid() not in pids
+
+
+@pytest.mark.parametrize("pool", ["sync"], indirect=True)
+def test_restart_dead_worker(pool):
+    pool, port = pool
+    dead = next(iter(pool.pids))
+    os.kill(dead, signal.SIGKILL)
+
+    wait_for(lambda: dead not in pool.pids and len(pool.pids) == 2)
+    for _ in range(10):
+        assert dead != call_hello(port)
+
+
+@pytest.mark.parametrize("pool", ["sync"], indirect=True)
+def test_rolling_restart(pool):
+    pool, port = pool
+    old = set(pool.pids)
+
+    # a request in flight is served by the stopped worker
+    client = make_client(addressbook.AddressBookService, "127.0.0.1", port)
+    results = []
+    t = threading.Thread(target=lambda: results.append(client.sleep(500)))
+    t.start()
+    time.sleep(0.1)
+
+    pool.restart()
+    t.join()
+    client.close()
+    assert [True] == results
+
+    wait_for(lambda: len(pool.pids) == 2 and not pool.pids & old)
+    assert call_hello(port) in pool.pids
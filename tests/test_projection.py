@@ -0,0 +1,81 @@
+import pytest
+
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import binary, compact
+from thriftpy2.protocol.base import normalize_fields
+from thriftpy2.thrift import TPayload, TType
+from thriftpy2.utils import deserialize, serialize
+
+FACTORIES = [binary.TBinaryProtocolFactory(),
+             compact.TCompactProtocolFactory()]
+if CYTHON:
+    from thriftpy2.protocol import cybin, cycompact
+    FACTORIES += [cybin.TCyBinaryProtocolFactory(),
+                  cycompact.TCyCompactProtocolFactory()]
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.STRING, "name", False),
+        3: (TType.LIST, "phones", (TType.STRING), False),
+    }
+    default_spec = [("id", None), ("name", "unset"), ("phones", None)]
+
+
+class TPkg(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.BINARY, "blob", False),
+        3: (TType.STRUCT, "item", TItem, False),
+        4: (TType.LIST, "items", (TType.STRUCT, TItem), False),
+        5: (TType.MAP, "index", (TType.STRING, (TType.STRUCT, TItem)), False),
+        6: (TType.BOOL, "flag", False),
+    }
+    default_spec = [("id", None), ("blob", None), ("item", None),
+                    ("items", None), ("index", None), ("flag", None)]
+
+
+def item(i):
+    return TItem(id=i, name="item%d" % i, phones=["1" * i])
+
+
+def pkg():
+    return TPkg(id=1, blob=b"\x00" * 10000, item=item(1),
+                items=[item(2), item(3)], index={"a": item(4)}, flag=True)
+
+
+def test_normalize_fields():
+    assert {1: None, 4: None} == normalize_fields([1, 4])
+    assert {1: None, 4: {2: None}} == normalize_fields({1: None, 4: {2}})
+    assert {3: {1: {}}} == normalize_fields({3: {1: []}})
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_top_level_fields(factory):
+    data = serialize(pkg(), factory)
+    obj = deserialize(TPkg(), data, factory, fields={1, 6})
+    assert TPkg(id=1, flag=True) == obj
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_nested_fields(factory):
+    data = serialize(pkg(), factory)
+    obj = deserialize(TPkg(), data, factory,
+                      fields={3: {2}, 4: {1}, 5: {3}})
+    assert TPkg(item=TItem(name="item1"),
+                items=[TItem(id=2, name="unset"), TItem(id=3, name="unset")],
+                index={"a": TItem(name="unset", phones=["1111"])}) == obj
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_whole_nested_field(factory):
+    data = serialize(pkg(), factory)
+    obj = deserialize(TPkg(), data, factory, fields={3: None})
+    assert TPkg(item=item(1)) == obj
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_no_projection(factory):
+    data = serialize(pkg(), factory)
+    assert pkg() == deserialize(TPkg(), data, factory)
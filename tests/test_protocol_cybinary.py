@@ -13,6 +13,7 @@ from thriftpy2.utils import hexlify
 if CYTHON:
     from thriftpy2.protocol import cybin as proto
     from thriftpy2.transport.buffered import TCyBufferedTransport
+    from thriftpy2.transport.framed import TCyFramedTransport
     from thriftpy2.transport.memory import TCyMemoryBuffer
 else:
     pytest.skip("cython not enabled.", allow_module_level=True)
@@ -504,3 +505,170 @@ def test_type_tolerance():
 
     for obj in cases:
         p.write_struct(obj)
+
+
+class TBlob(TPayload):
+    thrift_spec = {
+        1: (TType.BINARY, "blob", False),
+        2: (TType.LIST, "blobs", TType.BINARY, False),
+        3: (TType.STRING, "name", False),
+    }
+    default_spec = [("blob", None), ("blobs", None), ("name", None)]
+
+
+def test_binary_view_memory_buffer():
+    obj = TBlob(blob=b"\x01" * 10000, blobs=[b"a", b""], name="n")
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(obj)
+    data = b.getvalue()
+
+    result = TBlob()
+    proto.TCyBinaryProtocol(TCyMemoryBuffer(data),
+                            binary_view=True).read_struct(result)
+    assert isinstance(result.blob, memoryview)
+    assert result.blob.obj is data
+    assert obj.blob == result.blob
+    assert [b"a", b""] == [bytes(v) for v in result.blobs]
+    assert "n" == result.name
+
+    # written back as is
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(result)
+    assert data == b.getvalue()
+
+
+def test_binary_view_after_write():
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(TBlob(blob=b"a"))
+
+    # the buffer isn't backed by a retained bytes object, fall back to copy
+    result = TBlob()
+    proto.TCyBinaryProtocol(b, binary_view=True).read_struct(result)
+    assert isinstance(result.blob, bytes)
+    assert b"a" == result.blob
+
+
+def test_binary_view_framed():
+    obj = TBlob(blob=b"\x02" * 10000)
+    b = TCyMemoryBuffer()
+    ft = TCyFramedTransport(b)
+    proto.TCyBinaryProtocol(ft).write_struct(obj)
+    proto.TCyBinaryProtocol(ft).write_struct(TBlob(blob=b"x"))
+    ft.flush()
+    ft.flush()
+
+    ft = TCyFramedTransport(TCyMemoryBuffer(b.getvalue()))
+    p = proto.TCyBinaryProtocol(ft, binary_view=True)
+    result, other = TBlob(), TBlob()
+    p.read_struct(result)
+    p.read_struct(other)
+
+    assert isinstance(result.blob, memoryview)
+    assert obj.blob == result.blob
+    assert b"x" == other.blob
+
+    factory = proto.TCyBinaryProtocolFactory(binary_view=True)
+    assert factory.get_protocol(ft).binary_view
+
+
+class TVector(TPayload):
+    thrift_spec = {
+        1: (TType.LIST, "i32s", TType.I32, False),
+        2: (TType.LIST, "i64s", TType.I64, False),
+        3: (TType.LIST, "doubles", TType.DOUBLE, False),
+        4: (TType.SET, "tags", TType.I32, False),
+    }
+    default_spec = [("i32s", None), ("i64s", None), ("doubles", None),
+                    ("tags", None)]
+
+
+def vector():
+    return TVector(i32s=[-2 ** 31, 0, 2 ** 31 - 1],
+                   i64s=[-2 ** 63, 1, 2 ** 63 - 1],
+                   doubles=[-1.5, 0.0, 1e300], tags={1})
+
+
+def test_numeric_list_array():
+    import array
+
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(vector())
+    data = b.getvalue()
+
+    result = TVector()
+    proto.TCyBinaryProtocol(TCyMemoryBuffer(data),
+                            numeric_list="array").read_struct(result)
+    assert array.array("i", vector().i32s) == result.i32s
+    assert array.array("q", vector().i64s) == result.i64s
+    assert array.array("d", vector().doubles) == result.doubles
+    assert [1] == result.tags
+
+    # arrays are written in bulk, with the same encoding as lists
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(result)
+    assert data == b.getvalue()
+
+    result = TVector()
+    proto.TCyBinaryProtocol(TCyMemoryBuffer(b"\x0f\x00\x01\x08\x00\x00\x00"
+                                            b"\x00\x00"),
+                            numeric_list="array").read_struct(result)
+    assert array.array("i") == result.i32s
+
+    # large lists are read in chunks through other transports
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(TVector(i32s=range(100000)))
+    result = TVector()
+    proto.TCyBinaryProtocol(TCyBufferedTransport(TCyMemoryBuffer(
+        b.getvalue())), numeric_list="array").read_struct(result)
+    assert array.array("i", range(100000)) == result.i32s
+
+    # sizes over the data left are rejected before allocating
+    with pytest.raises(proto.ProtocolError):
+        proto.TCyBinaryProtocol(TCyMemoryBuffer(b"\x0f\x00\x01\x08\x10\x00"
+                                                b"\x00\x00" + b"\x00" * 64),
+                                numeric_list="array").read_struct(TVector())
+
+
+def test_numeric_list_numpy():
+    np = pytest.importorskip("numpy")
+
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(vector())
+    data = b.getvalue()
+
+    result = TVector()
+    factory = proto.TCyBinaryProtocolFactory(numeric_list="numpy")
+    factory.get_protocol(TCyMemoryBuffer(data)).read_struct(result)
+    assert isinstance(result.doubles, np.ndarray)
+    assert vector().i64s == result.i64s.tolist()
+    assert vector().doubles == result.doubles.tolist()
+
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(TVector(
+        i32s=np.array(vector().i32s, dtype=np.int32),
+        i64s=np.array(vector().i64s, dtype=np.int64),
+        doubles=np.array(vector().doubles), tags={1}))
+    assert data == b.getvalue()
+
+    # mismatched item types fall back to writing element by element
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(
+        TVector(i64s=np.array([1, 2], dtype=np.int16)))
+    b2 = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b2).write_struct(TVector(i64s=[1, 2]))
+    assert b2.getvalue() == b.getvalue()
+
+    # and so do strided arrays
+    b = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b).write_struct(
+        TVector(doubles=np.arange(4.0)[::2]))
+    b2 = TCyMemoryBuffer()
+    proto.TCyBinaryProtocol(b2).write_struct(TVector(doubles=[0.0, 2.0]))
+    assert b2.getvalue() == b.getvalue()
+
+
+def test_numeric_list_option():
+    p = proto.TCyBinaryProtocol(TCyMemoryBuffer(), numeric_list="array")
+    assert "array" == p.numeric_list
+    with pytest.raises(ValueError):
+        proto.TCyBinaryProtocol(TCyMemoryBuffer(), numeric_list="tuple")
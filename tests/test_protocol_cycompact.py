@@ -0,0 +1,164 @@
+from io import BytesIO
+
+import pytest
+
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import compact
+from thriftpy2.thrift import TDecodeException, TPayload, TType
+from thriftpy2.utils import hexlify
+if CYTHON:
+    from thriftpy2.protocol import cycompact as proto
+    from thriftpy2.transport.memory import TCyMemoryBuffer
+else:
+    pytest.skip("cython not enabled.", allow_module_level=True)
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.LIST, "phones", (TType.STRING), False),
+    }
+    default_spec = [("id", None), ("phones", None)]
+
+
+class TPkg(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.LIST, "items", (TType.STRUCT, TItem), False),
+    }
+    default_spec = [("id", None), ("items", None)]
+
+
+class TMixed(TPayload):
+    thrift_spec = {
+        1: (TType.BOOL, "flag", False),
+        2: (TType.BYTE, "byte", False),
+        3: (TType.I16, "short", False),
+        20: (TType.I64, "long", False),
+        4: (TType.DOUBLE, "double", False),
+        -1: (TType.BOOL, "negative", False),
+        40: (TType.BINARY, "blob", False),
+        41: (TType.MAP, "scores", (TType.STRING, TType.DOUBLE), False),
+        42: (TType.SET, "tags", TType.I32, False),
+        43: (TType.MAP, "empty", (TType.I32, TType.I32), False),
+        44: (TType.STRUCT, "item", TItem, False),
+        45: (TType.LIST, "bools", TType.BOOL, False),
+    }
+    default_spec = [("flag", None), ("byte", None), ("short", None),
+                    ("long", None), ("double", None), ("negative", None),
+                    ("blob", None), ("scores", None), ("tags", None),
+                    ("empty", None), ("item", None), ("bools", None)]
+
+
+def py_encode(obj):
+    b = BytesIO()
+    compact.TCompactProtocol(b).write_struct(obj)
+    return b.getvalue()
+
+
+def cy_encode(obj):
+    b = TCyMemoryBuffer()
+    proto.TCyCompactProtocol(b).write_struct(obj)
+    return b.getvalue()
+
+
+def cy_decode(cls, data, **kwargs):
+    obj = cls()
+    proto.TCyCompactProtocol(TCyMemoryBuffer(data), **kwargs).read_struct(obj)
+    return obj
+
+
+def mixed():
+    return TMixed(flag=True, byte=-7, short=-12345, long=-(2 ** 62),
+                  double=-1.5, negative=False, blob=b"\x00\xff" * 3000,
+                  scores={"a": 1.0, "b": 2.5}, tags=list(range(-20, 20)),
+                  empty={}, item=TItem(id=1, phones=["x" * 20]),
+                  bools=[True, False] * 10)
+
+
+def test_write_i16():
+    b = TCyMemoryBuffer()
+    proto.write_val(b, TType.I16, 12345)
+    assert "f2 c0 01" == hexlify(b.getvalue())
+
+
+def test_read_i64():
+    b = TCyMemoryBuffer(b"\xaa\x84\xcc\xde\x8f\xbd\x88\xa2\x22")
+    assert 1234567890123456789 == proto.read_val(b, TType.I64)
+
+
+def test_write_double():
+    b = TCyMemoryBuffer()
+    proto.write_val(b, TType.DOUBLE, 1234567890.1234567890)
+    assert "b7 e6 87 b4 80 65 d2 41" == hexlify(b.getvalue())
+
+
+def test_container_bool():
+    b = TCyMemoryBuffer()
+    proto.write_val(b, TType.MAP, {"a": [True, False]},
+                    (TType.STRING, (TType.LIST, TType.BOOL)))
+    assert "01 89 01 61 21 01 02" == hexlify(b.getvalue())
+
+    b = TCyMemoryBuffer(b"\x01\x89\x01\x61\x21\x01\x02")
+    assert {"a": [True, False]} == proto.read_val(
+        b, TType.MAP, (TType.STRING, (TType.LIST, TType.BOOL)))
+
+
+def test_message_begin():
+    b = TCyMemoryBuffer()
+    p = proto.TCyCompactProtocol(b)
+    p.write_message_begin("test", 2, 1)
+    assert "82 41 01 04 74 65 73 74" == hexlify(b.getvalue())
+    assert ("test", 2, 1) == p.read_message_begin()
+
+
+def test_write_struct():
+    item = TItem(id=123, phones=["123456", "abcdef"])
+    assert ("15 f6 01 19 28 06 31 32 33 34 "
+            "35 36 06 61 62 63 64 65 66 00" == hexlify(cy_encode(item)))
+
+
+def test_struct_recur():
+    item1 = TItem(id=123, phones=["123456", "abcdef"])
+    item2 = TItem(id=456, phones=["123456", "abcdef"])
+    pkg = TPkg(id=123, items=[item1, item2])
+    data = cy_encode(pkg)
+    assert data == py_encode(pkg)
+    assert pkg == cy_decode(TPkg, data)
+
+
+def test_compatible_with_pure_python():
+    obj = mixed()
+    data = cy_encode(obj)
+    assert data == py_encode(obj)
+
+    assert obj == cy_decode(TMixed, data)
+
+    py_obj = TMixed()
+    compact.TCompactProtocol(BytesIO(data)).read_struct(py_obj)
+    assert obj == py_obj
+
+
+def test_skip_unknown_fields():
+    data = cy_encode(mixed())
+    assert TItem() == cy_decode(TItem, data)
+
+
+def test_decode_response():
+    data = cy_encode(TItem(phones=["你好"]))
+    assert [u"你好"] == cy_decode(TItem, data).phones
+    assert ["你好".encode("utf-8")] == cy_decode(
+        TItem, data, decode_response=False).phones
+
+
+def test_write_wrong_type():
+    with pytest.raises(TDecodeException):
+        cy_encode(TItem(id="123"))
+
+    with pytest.raises(TDecodeException):
+        cy_encode(TMixed(short=2 ** 16))
+
+
+def test_default_factory():
+    from thriftpy2.protocol import TCompactProtocolFactory
+    assert TCompactProtocolFactory is proto.TCyCompactProtocolFactory
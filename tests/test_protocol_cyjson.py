@@ -0,0 +1,129 @@
+import json
+import struct
+
+import pytest
+
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import json as pure
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.thrift import TPayload, TType
+from thriftpy2.transport.memory import TMemoryBuffer
+if CYTHON:
+    from thriftpy2.protocol import cyjson as proto
+else:
+    pytest.skip("cython not enabled.", allow_module_level=True)
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.STRING, "name", False),
+        3: (TType.DOUBLE, "ratio", False),
+    }
+    default_spec = [("id", None), ("name", None), ("ratio", None)]
+
+
+class TPkg(TPayload):
+    thrift_spec = {
+        1: (TType.I64, "id", False),
+        2: (TType.BINARY, "blob", False),
+        3: (TType.BOOL, "flag", False),
+        4: (TType.STRUCT, "item", TItem, False),
+        5: (TType.LIST, "items", (TType.STRUCT, TItem), False),
+        6: (TType.MAP, "index", (TType.STRING, (TType.LIST, TType.I16)),
+            False),
+        7: (TType.SET, "tags", TType.STRING, False),
+    }
+    default_spec = [("id", None), ("blob", None), ("flag", None),
+                    ("item", None), ("items", None), ("index", None),
+                    ("tags", None)]
+
+
+PKGS = [
+    TPkg(),
+    TPkg(id=2 ** 63 - 1, blob=b"\x00\xff" * 10, flag=True,
+         item=TItem(id=-1, name='a"b\\c\n\x01\x7f', ratio=0.1 + 0.2),
+         items=[TItem(name="pão \U0001f600", ratio=float("inf")),
+                TItem(ratio=-0.0)],
+         index={"a": [1, -2], "": []}, tags={"vip"}),
+    TPkg(id=2 ** 70, flag=False, item=TItem(ratio=1e-320)),
+]
+
+
+def write(proto_cls, obj):
+    trans = TMemoryBuffer()
+    p = proto_cls(trans)
+    p.write_message_begin("ping", 1, 7)
+    p.write_struct(obj)
+    return trans.getvalue()
+
+
+@pytest.mark.parametrize("pkg", PKGS)
+def test_same_output(pkg):
+    assert write(pure.TJSONProtocol, pkg) == \
+        write(proto.TCyJSONProtocol, pkg)
+
+
+@pytest.mark.parametrize("pkg", PKGS)
+def test_read(pkg):
+    data = write(pure.TJSONProtocol, pkg)
+
+    p = proto.TCyJSONProtocol(TMemoryBuffer(data))
+    assert ("ping", 1, 7) == p.read_message_begin()
+    obj = p.read_struct(TPkg())
+
+    expected = pure.TJSONProtocol(TMemoryBuffer(data)).read_struct(TPkg())
+    assert expected == obj
+
+
+def test_read_nan():
+    data = write(pure.TJSONProtocol, TItem(ratio=float("nan")))
+    obj = proto.TCyJSONProtocol(TMemoryBuffer(data)).read_struct(TItem())
+    assert obj.ratio != obj.ratio
+
+
+def test_read_loose_json():
+    # any member order and whitespace, unknown members are skipped.
+    data = json.dumps({
+        "payload": {
+            "unknown": {"a": [1, {"b": "]}\""}], "c": None},
+            "id": 3,
+            "index": [{"value": [5], "key": "qé"}],
+            "item": {"name": "x\\ny", "ratio": 2},
+        },
+        "metadata": {"version": 1, "name": "n", "ttype": 2, "seqid": 3},
+    }, indent=2).encode("utf-8")
+    trans = TMemoryBuffer(struct.pack("!I", len(data)) + data)
+
+    p = proto.TCyJSONProtocol(trans)
+    assert ("n", 2, 3) == p.read_message_begin()
+    assert TPkg(id=3, index={"qé": [5]},
+                item=TItem(name="x\\ny", ratio=2.0)) == p.read_struct(TPkg())
+
+
+def test_read_conversions():
+    assert 5 == proto.read_val(b'"5"', TType.I32)
+    assert 1 == proto.read_val(b'1.7', TType.I32)
+    assert 2.0 == proto.read_val(b'2', TType.DOUBLE)
+    assert "3" == proto.read_val(b'3', TType.STRING)
+    assert proto.read_val(b'1', TType.BOOL) is True
+
+
+def test_bad_version():
+    trans = TMemoryBuffer()
+    p = proto.TCyJSONProtocol(trans)
+    p.write_message_begin("ping", 1, 7)
+    p.write_struct(TItem())
+    data = trans.getvalue().replace(b'"version": 1', b'"version": 2')
+
+    with pytest.raises(TProtocolException) as exc:
+        proto.TCyJSONProtocol(TMemoryBuffer(data)).read_message_begin()
+    assert TProtocolException.BAD_VERSION == exc.value.type
+
+
+def test_truncated():
+    data = write(proto.TCyJSONProtocol, PKGS[1])
+    data = struct.pack("!I", len(data) - 24) + data[4:-20]
+
+    with pytest.raises(TProtocolException):
+        proto.TCyJSONProtocol(TMemoryBuffer(data)).read_struct(TPkg())
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+from thriftpy2._compat import CYTHON
+from thriftpy2.protocol import binary, compact
+from thriftpy2.records import TRecordFileReader, TRecordFileWriter, build_index
+from thriftpy2.thrift import TPayload, TType
+from thriftpy2.transport import TTransportException
+from thriftpy2.utils import serialize, serialize_many
+
+FACTORIES = [binary.TBinaryProtocolFactory(),
+             compact.TCompactProtocolFactory()]
+if CYTHON:
+    from thriftpy2.protocol import cybin
+    FACTORIES.append(cybin.TCyBinaryProtocolFactory())
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.LIST, "phones", (TType.STRING), False),
+    }
+    default_spec = [("id", None), ("phones", None)]
+
+
+ITEMS = [TItem(id=i, phones=["%d" % i] * i) for i in range(10)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "items.rec")
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_write_read(path, factory):
+    with TRecordFileWriter(path, factory) as writer:
+        writer.write_many(ITEMS)
+
+    with open(path, "rb") as f:
+        assert serialize_many(ITEMS, factory, length_prefixed=True) == \
+            f.read()
+
+    with TRecordFileReader(path, TItem, factory) as reader:
+        assert ITEMS == list(reader)
+        assert len(ITEMS) == len(reader)
+        assert ITEMS[3] == reader[3]
+        assert ITEMS[-1] == reader[-1]
+        assert ITEMS[4:] == list(reader.iter_objects(4))
+        with reader.raw(5) as view:
+            assert serialize(ITEMS[5], factory) == view
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_index(path, factory):
+    with TRecordFileWriter(path, factory, index=True) as writer:
+        writer.write_many(ITEMS[:5])
+    # appending keeps the index up to date
+    with TRecordFileWriter(path, factory, index=True) as writer:
+        writer.write_many(ITEMS[5:])
+
+    with TRecordFileReader(path, TItem, factory) as reader:
+        offsets = list(reader.offsets)
+        assert len(ITEMS) == len(offsets)
+        assert ITEMS[7] == reader[7]
+
+    with TRecordFileReader(path, TItem, factory, use_index=False) as reader:
+        assert offsets == list(reader.offsets)
+
+
+def test_build_index(path):
+    with TRecordFileWriter(path) as writer:
+        writer.write_many(ITEMS[:3])
+    assert not os.path.exists(path + ".idx")
+
+    # the index is built for the records written without it
+    with TRecordFileWriter(path, index=True) as writer:
+        writer.write(ITEMS[3])
+
+    with TRecordFileReader(path, TItem) as reader:
+        assert ITEMS[:4] == [reader[i] for i in range(4)]
+
+    os.remove(path + ".idx")
+    assert 4 == build_index(path)
+    with TRecordFileReader(path, TItem) as reader:
+        assert ITEMS[2] == reader[2]
+
+
+def test_empty_file(path):
+    open(path, "wb").close()
+    with TRecordFileReader(path, TItem) as reader:
+        assert 0 == len(reader)
+        assert [] == list(reader)
+
+
+def test_truncated_file(path):
+    with TRecordFileWriter(path) as writer:
+        writer.write_many(ITEMS)
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 1)
+
+    with TRecordFileReader(path, TItem) as reader:
+        with pytest.raises(TTransportException):
+            list(reader)
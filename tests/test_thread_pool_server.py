@@ -0,0 +1,89 @@
+import socket
+import threading
+import time
+from os import path
+
+import pytest
+
+import thriftpy2
+from thriftpy2.rpc import make_client, make_server
+from thriftpy2.server import TThreadPoolServer
+from thriftpy2.thrift import TApplicationException
+
+addressbook = thriftpy2.load(path.join(path.dirname(__file__),
+                                       "addressbook.thrift"))
+
+
+class Dispatcher(object):
+    def get(self, name):
+        return addressbook.Person(name=name)
+
+
+def serve(**kwargs):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[-1]
+
+    server = make_server(addressbook.AddressBookService, Dispatcher(),
+                         host="127.0.0.1", port=port,
+                         server_class=TThreadPoolServer, daemon=True,
+                         **kwargs)
+    threading.Thread(target=server.serve, daemon=True).start()
+    time.sleep(0.1)
+    return server, port
+
+
+@pytest.fixture
+def pool_server(request):
+    server, port = serve(**request.param)
+    yield server, port
+    server.close()
+    server.trans.close()
+
+
+def client(port):
+    return make_client(addressbook.AddressBookService, "127.0.0.1", port)
+
+
+@pytest.mark.parametrize("pool_server", [{"threads": 4}], indirect=True)
+def test_serve(pool_server):
+    server, port = pool_server
+    clients = [client(port) for _ in range(8)]
+    for c in clients:
+        assert "Bob" == c.get("Bob").name
+        c.close()
+
+    time.sleep(0.1)
+    stats = server.stats()
+    assert 8 == stats["accepted"]
+    assert 0 == stats["rejected"]
+    assert 0 == stats["busy_threads"]
+    assert 4 == stats["threads"] == len(server.workers)
+
+
+@pytest.mark.parametrize("pool_server", [
+    {"threads": 1, "queue_timeout": 0.1}], indirect=True)
+def test_queue_timeout(pool_server):
+    server, port = pool_server
+
+    # the only worker serves the first client while the second waits
+    first = client(port)
+    assert "Bob" == first.get("Bob").name
+    second = client(port)
+    time.sleep(0.2)
+    stats = server.stats()
+    assert 1 == stats["busy_threads"]
+    assert 1 == stats["queue_depth"]
+
+    first.close()
+    with pytest.raises(TApplicationException) as exc:
+        second.get("Bob")
+    assert TApplicationException.INTERNAL_ERROR == exc.value.type
+    assert "Server busy" in str(exc.value)
+    second.close()
+
+    # connections that didn't wait are served
+    third = client(port)
+    assert "Bob" == third.get("Bob").name
+    third.close()
+    assert 1 == server.stats()["rejected"]
@@ -0,0 +1,63 @@
+import pytest
+
+from thriftpy2.protocol import TCompactProtocolFactory, TJSONProtocolFactory
+from thriftpy2.protocol.binary import TBinaryProtocolFactory
+from thriftpy2.thrift import TPayload, TType
+from thriftpy2.transport import TTransportException
+from thriftpy2.utils import (deserialize, deserialize_many, iter_deserialize,
+                             iter_records, iter_serialize, serialize,
+                             serialize_many)
+
+
+class TItem(TPayload):
+    thrift_spec = {
+        1: (TType.I32, "id", False),
+        2: (TType.LIST, "phones", (TType.STRING), False),
+    }
+    default_spec = [("id", None), ("phones", None)]
+
+
+ITEMS = [TItem(id=i, phones=["%d" % i] * i) for i in range(10)] + [TItem()]
+
+FACTORIES = [TBinaryProtocolFactory(), TCompactProtocolFactory(),
+             TJSONProtocolFactory()]
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_serialize_many(factory):
+    records = serialize_many(ITEMS, factory)
+    assert [serialize(item, factory) for item in ITEMS] == records
+    assert ITEMS == deserialize_many(TItem, records, factory)
+    assert ITEMS == [deserialize(TItem(), r, factory) for r in records]
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_length_prefixed(factory):
+    stream = serialize_many(ITEMS, factory, length_prefixed=True)
+    assert isinstance(stream, bytes)
+    assert serialize_many(ITEMS, factory) == list(iter_records(stream))
+    assert ITEMS == deserialize_many(TItem, stream, factory,
+                                     length_prefixed=True)
+
+
+def test_iterators_are_lazy():
+    def items():
+        yield TItem(id=1)
+        raise RuntimeError
+
+    records = iter_serialize(items())
+    assert next(records) == serialize(TItem(id=1))
+    with pytest.raises(RuntimeError):
+        next(records)
+
+    objs = iter_deserialize(TItem, iter_serialize(ITEMS))
+    assert ITEMS[0] == next(objs)
+    assert ITEMS[1:] == list(objs)
+
+
+def test_truncated_stream():
+    stream = serialize_many(ITEMS[:2], length_prefixed=True)
+    with pytest.raises(TTransportException):
+        deserialize_many(TItem, stream[:-1], length_prefixed=True)
+    with pytest.raises(TTransportException):
+        deserialize_many(TItem, stream + b"\x00", length_prefixed=True)
@@ -1,6 +1,10 @@
+import asyncio
 import functools
 from thriftpy2.thrift import args_to_kwargs
-from thriftpy2.thrift import TApplicationException, TMessageType
+from thriftpy2.thrift import TApplicationException, TMessageType, TType
+from thriftpy2.transport import TTransportException
+
+MAX_SEQID = 2 ** 31 - 1
 
 
 class TAsyncClient:
@@ -22,15 +26,18 @@ class TAsyncClient:
     def __dir__(self):
         return self._service.thrift_services
 
-    async def _req(self, _api, *args, **kwargs):
+    def _kwargs(self, _api, args, kwargs):
         try:
             service_args = getattr(self._service, _api + "_args")
-            kwargs = args_to_kwargs(service_args.thrift_spec, *args, **kwargs)
+            return args_to_kwargs(service_args.thrift_spec, *args, **kwargs)
         except ValueError as e:
             raise TApplicationException(
                 TApplicationException.UNKNOWN_METHOD,
                 'missing required argument {arg} for {service}.{api}'.format(
                     arg=e.args[0], service=self._service.__name__, api=_api))
+
+    async def _req(self, _api, *args, **kwargs):
+        kwargs = self._kwargs(_api, args, kwargs)
         result_cls = getattr(self._service, _api + "_result")
 
         await self._send(_api, **kwargs)
@@ -39,15 +46,18 @@ class TAsyncClient:
             return await self._recv(_api)
 
     async def _send(self, _api, **kwargs):
+        self._write_message(_api, self._seqid, kwargs)
+        await self._oprot.trans.flush()
+
+    def _write_message(self, _api, seqid, kwargs):
         oneway = getattr(getattr(self._service, _api + "_result"), "oneway")
         msg_type = TMessageType.ONEWAY if oneway else TMessageType.CALL
-        self._oprot.write_message_begin(_api, msg_type, self._seqid)
+        self._oprot.write_message_begin(_api, msg_type, seqid)
         args = getattr(self._service, _api + "_args")()
         for k, v in kwargs.items():
             setattr(args, k, v)
         self._oprot.write_struct(args)
         self._oprot.write_message_end()
-        await self._oprot.trans.flush()
 
     async def _recv(self, _api):
         fname, mtype, rseqid = await self._iprot.read_message_begin()
@@ -59,7 +69,9 @@ class TAsyncClient:
         result = getattr(self._service, _api + "_result")()
         await self._iprot.read_struct(result)
         await self._iprot.read_message_end()
+        return self._result(result)
 
+    def _result(self, result):
         if hasattr(result, "success") and result.success is not None:
             return result.success
 
@@ -80,3 +92,115 @@ class TAsyncClient:
         self._iprot.trans.close()
         if self._iprot != self._oprot:
             self._oprot.trans.close()
+
+
+class TAsyncPipelinedClient(TAsyncClient):
+    """Client making any number of concurrent calls over one connection.
+
+    Each call is sent with a seqid of its own, without waiting for the
+    replies of the previous calls, and a single reader task resolves the
+    calls by the seqids of the replies, in whatever order they come. The
+    server must reply by seqid, and replies out of order only when its
+    connections process requests concurrently, e.g. TAsyncFramedServer
+    with `concurrency` over 1.
+
+    A call waits for its reply for `timeout` seconds at most (forever if
+    None), and raises TTransportException(TIMED_OUT) then. The reply of a
+    call timed out or cancelled is skipped when it comes.
+    """
+
+    def __init__(self, service, iprot, oprot=None, timeout=None):
+        TAsyncClient.__init__(self, service, iprot, oprot)
+        self.timeout = timeout
+        self._calls = {}
+        self._reader = None
+        self._error = None
+        self._send_lock = None
+
+    def _next_seqid(self):
+        seqid = self._seqid
+        while True:
+            seqid = seqid + 1 if seqid < MAX_SEQID else 0
+            if seqid not in self._calls:
+                self._seqid = seqid
+                return seqid
+
+    async def _req(self, _api, *args, **kwargs):
+        kwargs = self._kwargs(_api, args, kwargs)
+        if self._error is not None:
+            raise self._error
+        if self._reader is None:
+            self._reader = asyncio.ensure_future(self._read_replies())
+
+        seqid = self._next_seqid()
+        if getattr(self._service, _api + "_result").oneway:
+            await self._send_call(_api, seqid, kwargs)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[seqid] = (_api, future)
+        try:
+            await self._send_call(_api, seqid, kwargs)
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise TTransportException(
+                TTransportException.TIMED_OUT,
+                'Timed out waiting for the reply of {}'.format(_api))
+        finally:
+            self._calls.pop(seqid, None)
+        return self._result(result)
+
+    async def _send_call(self, _api, seqid, kwargs):
+        if self._send_lock is None:
+            # made here rather than in __init__, a lock is bound to the
+            # loop running when it is made before Python 3.10.
+            self._send_lock = asyncio.Lock()
+        # a single call writes and flushes at once: the stream can't be
+        # drained by several calls, and a frame is whatever was written
+        # since the last flush.
+        async with self._send_lock:
+            self._write_message(_api, seqid, kwargs)
+            await self._oprot.trans.flush()
+
+    async def _read_replies(self):
+        iprot = self._iprot
+        try:
+            while True:
+                _, mtype, rseqid = await iprot.read_message_begin()
+                api, future = self._calls.get(rseqid, (None, None))
+                if future is None:
+                    # the call timed out or was cancelled
+                    await iprot.skip(TType.STRUCT)
+                    await iprot.read_message_end()
+                    continue
+
+                if mtype == TMessageType.EXCEPTION:
+                    result = TApplicationException()
+                else:
+                    result = getattr(self._service, api + "_result")()
+                await iprot.read_struct(result)
+                await iprot.read_message_end()
+                if future.done():
+                    continue
+                if mtype == TMessageType.EXCEPTION:
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        for _, future in self._calls.values():
+            if not future.done():
+                future.set_exception(self._error)
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        self._fail(TTransportException(TTransportException.NOT_OPEN,
+                                       'Client closed'))
+        TAsyncClient.close(self)
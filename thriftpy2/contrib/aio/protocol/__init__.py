@@ -4,8 +4,11 @@ __all__ = [
     'TAsyncBinaryProtocolFactory',
     'TAsyncCompactProtocol',
     'TAsyncCompactProtocolFactory',
+    'TAsyncFramedProtocol',
+    'TAsyncFramedProtocolFactory',
 ]
 
 from .base import TAsyncProtocolBase
 from .binary import TAsyncBinaryProtocol, TAsyncBinaryProtocolFactory
 from .compact import TAsyncCompactProtocol, TAsyncCompactProtocolFactory
+from .framed import TAsyncFramedProtocol, TAsyncFramedProtocolFactory
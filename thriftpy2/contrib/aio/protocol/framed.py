@@ -0,0 +1,82 @@
+import struct
+
+from thriftpy2.protocol import TBinaryProtocolFactory
+from thriftpy2.transport import TMemoryBuffer, TTransportException
+
+from ..transport.base import readall
+from .base import TAsyncProtocolBase
+
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+_frame_size = struct.Struct('!i')
+
+
+class TAsyncFramedProtocol(TAsyncProtocolBase):
+    """Protocol of framed messages, which awaits a whole frame in
+    read_message_begin and then decodes it synchronously, instead of
+    awaiting a read of the transport for each value.
+
+    The messages are decoded and encoded by `proto_factory`'s protocol over
+    memory buffers, the Cython binary protocol by default (the Cython
+    compact one with TCompactProtocolFactory). The protocol frames the
+    messages itself, on the wire it speaks as a framed transport does, so
+    `trans` must not be framed: use TAsyncBufferedTransportFactory on both
+    ends of the connection, with peers using a framed transport.
+    """
+
+    def __init__(self, trans, proto_factory=None,
+                 max_frame_size=MAX_FRAME_SIZE):
+        TAsyncProtocolBase.__init__(self, trans)
+        proto_factory = proto_factory or TBinaryProtocolFactory()
+        self.max_frame_size = max_frame_size
+
+        self._rbuf = TMemoryBuffer()
+        self._rproto = proto_factory.get_protocol(self._rbuf)
+        self._wbuf = TMemoryBuffer()
+        self._wproto = proto_factory.get_protocol(self._wbuf)
+
+    async def read_frame(self):
+        sz, = _frame_size.unpack(await readall(self.trans.read, 4))
+        if sz < 0:
+            raise TTransportException(TTransportException.NEGATIVE_SIZE,
+                                      'Negative frame size {}'.format(sz))
+        if sz > self.max_frame_size:
+            raise TTransportException(TTransportException.SIZE_LIMIT,
+                                      'Frame size {} over the limit'
+                                      .format(sz))
+        self._rbuf.setvalue(await readall(self.trans.read, sz))
+
+    async def skip(self, ttype):
+        self._rproto.skip(ttype)
+
+    async def read_message_begin(self):
+        await self.read_frame()
+        return self._rproto.read_message_begin()
+
+    async def read_message_end(self):
+        self._rproto.read_message_end()
+
+    async def read_struct(self, obj):
+        return self._rproto.read_struct(obj)
+
+    def write_message_begin(self, name, ttype, seqid):
+        self._wproto.write_message_begin(name, ttype, seqid)
+
+    def write_struct(self, obj):
+        self._wproto.write_struct(obj)
+
+    def write_message_end(self):
+        self._wproto.write_message_end()
+        payload = self._wbuf.getvalue()
+        self._wbuf.setvalue(b'')
+        self.trans.write(_frame_size.pack(len(payload)) + payload)
+
+
+class TAsyncFramedProtocolFactory(object):
+    def __init__(self, proto_factory=None, max_frame_size=MAX_FRAME_SIZE):
+        self.proto_factory = proto_factory
+        self.max_frame_size = max_frame_size
+
+    def get_protocol(self, trans):
+        return TAsyncFramedProtocol(trans, self.proto_factory,
+                                    self.max_frame_size)
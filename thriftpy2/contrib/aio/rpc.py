@@ -1,38 +1,38 @@
+import asyncio
+import contextlib
+import functools
+import inspect
 import socket
 import ssl
+import time
 import types
 import urllib.parse
 import warnings
-from typing import Any, Optional
+from collections import deque
+from typing import (Any, AsyncGenerator, Callable, Deque, Dict,  # noqa
+                    Optional, Type)
 
 from thriftpy2.protocol.base import TProtocolFactory
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.thrift import TDecodeException, TException
+from thriftpy2.transport import TTransportException
 from thriftpy2.transport.base import TTransportFactory
 
-from .client import TAsyncClient
+from .client import TAsyncClient, TAsyncPipelinedClient
 from .processor import TAsyncProcessor
 from .protocol.binary import TAsyncBinaryProtocolFactory
 from .server import TAsyncServer
 from .socket import TAsyncServerSocket, TAsyncSocket
 from .transport.buffered import TAsyncBufferedTransportFactory
+from .transport.framed import TAsyncFramedTransportFactory
 
 
-async def make_client(
-        service: types.ModuleType, host: str = 'localhost', port: int = 9090,
-        unix_socket: Optional[str] = None,
-        proto_factory: TProtocolFactory = TAsyncBinaryProtocolFactory(),
-        trans_factory: TTransportFactory = TAsyncBufferedTransportFactory(),
-        timeout: Optional[int] = 3000, connect_timeout: Optional[int] = None,
-        cafile: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None,
-        certfile: Optional[str] = None, keyfile: Optional[str] = None,
-        validate: bool = True, url: str = '', socket_timeout: Optional[int] = None,
-        socket_family: socket.AddressFamily = socket.AF_INET) -> TAsyncClient:
-    if socket_timeout is not None:
-        warnings.warn(
-            "The 'socket_timeout' argument is deprecated. "
-            "Please use 'timeout' instead.",
-            DeprecationWarning,
-        )
-        timeout = socket_timeout
+def _client_socket(
+        host: str, port: int, unix_socket: Optional[str],
+        timeout: Optional[int], connect_timeout: Optional[int],
+        cafile: Optional[str], ssl_context: Optional[ssl.SSLContext],
+        certfile: Optional[str], keyfile: Optional[str], validate: bool,
+        url: str, socket_family: socket.AddressFamily) -> TAsyncSocket:
     if url:
         parsed_url = urllib.parse.urlparse(url)
         host = parsed_url.hostname or host
@@ -62,12 +62,66 @@ async def make_client(
         raise ValueError("Either host/port or unix_socket"
                          " or url must be provided.")
 
+    return client_socket
+
+
+async def make_client(
+        service: types.ModuleType, host: str = 'localhost', port: int = 9090,
+        unix_socket: Optional[str] = None,
+        proto_factory: TProtocolFactory = TAsyncBinaryProtocolFactory(),
+        trans_factory: TTransportFactory = TAsyncBufferedTransportFactory(),
+        timeout: Optional[int] = 3000, connect_timeout: Optional[int] = None,
+        cafile: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None,
+        certfile: Optional[str] = None, keyfile: Optional[str] = None,
+        validate: bool = True, url: str = '', socket_timeout: Optional[int] = None,
+        socket_family: socket.AddressFamily = socket.AF_INET) -> TAsyncClient:
+    if socket_timeout is not None:
+        warnings.warn(
+            "The 'socket_timeout' argument is deprecated. "
+            "Please use 'timeout' instead.",
+            DeprecationWarning,
+        )
+        timeout = socket_timeout
+    client_socket = _client_socket(host, port, unix_socket, timeout,
+                                   connect_timeout, cafile, ssl_context,
+                                   certfile, keyfile, validate, url,
+                                   socket_family)
+
     transport = trans_factory.get_transport(client_socket)
     protocol = proto_factory.get_protocol(transport)
     await transport.open()
     return TAsyncClient(service, protocol)
 
 
+async def make_pipelined_client(
+        service: types.ModuleType, host: str = 'localhost', port: int = 9090,
+        unix_socket: Optional[str] = None,
+        proto_factory: TProtocolFactory = TAsyncBinaryProtocolFactory(),
+        trans_factory: TTransportFactory = TAsyncFramedTransportFactory(),
+        timeout: Optional[int] = 3000, connect_timeout: Optional[int] = None,
+        cafile: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None,
+        certfile: Optional[str] = None, keyfile: Optional[str] = None,
+        validate: bool = True, url: str = '',
+        socket_family: socket.AddressFamily = socket.AF_INET
+) -> TAsyncPipelinedClient:
+    """Make a TAsyncPipelinedClient, framed by default, whose calls time
+    out after `timeout` ms.
+    """
+    client_socket = _client_socket(host, port, unix_socket, timeout,
+                                   connect_timeout, cafile, ssl_context,
+                                   certfile, keyfile, validate, url,
+                                   socket_family)
+
+    transport = trans_factory.get_transport(client_socket)
+    protocol = proto_factory.get_protocol(transport)
+    await transport.open()
+    # the reader of the client waits for replies as long as the connection
+    # lives, the calls time out instead.
+    client_socket.socket_timeout = client_socket.connect_timeout = None
+    return TAsyncPipelinedClient(service, protocol,
+                                 timeout=timeout / 1000 if timeout else None)
+
+
 def make_server(
         service: types.ModuleType, handler: Any, host: str = 'localhost',
         port: int = 9090, unix_socket: Optional[str] = None,
@@ -76,7 +130,12 @@ def make_server(
         client_timeout: Optional[int] = 3000, certfile: Optional[str] = None,
         keyfile: Optional[str] = None, ssl_context: Optional[ssl.SSLContext] = None,
         loop: Optional[Any] = None,
-        socket_family: socket.AddressFamily = socket.AF_INET) -> TAsyncServer:
+        socket_family: socket.AddressFamily = socket.AF_INET,
+        server_class: Type[TAsyncServer] = TAsyncServer,
+        **server_kwargs: Any) -> TAsyncServer:
+    """Make a server of `server_class`, TAsyncFramedServer for framed
+    clients, `server_kwargs` are passed to it.
+    """
     processor = TAsyncProcessor(service, handler)
 
     if unix_socket:
@@ -96,7 +155,254 @@ def make_server(
     else:
         raise ValueError("Either host/port or unix_socket must be provided.")
 
-    server = TAsyncServer(processor, server_socket,
+    server = server_class(processor, server_socket,
                           iprot_factory=proto_factory,
-                          itrans_factory=trans_factory, loop=loop)
+                          itrans_factory=trans_factory, loop=loop,
+                          **server_kwargs)
     return server
+
+
+class _PooledClient(object):
+    __slots__ = ('client', 'sock', 'transport', 'released_at')
+
+    def __init__(self, client: TAsyncClient, sock: TAsyncSocket,
+                 transport: Any) -> None:
+        self.client = client
+        self.sock = sock
+        self.transport = transport
+        self.released_at = time.monotonic()
+
+
+class AsyncClientPool(object):
+    """Pool of at most `max_size` clients of `service` for concurrent
+    tasks, the other arguments up to `socket_family` are the ones of
+    make_client.
+
+    `connection()` checks out a client for one task, waiting for up to
+    `wait_timeout` seconds (forever if None) when all of them are in use.
+    `warm()` opens `min_size` clients ahead of the first calls. A checked
+    out client is reconnected if it has been idle for more than
+    `idle_timeout` seconds, if its server closed the connection, or if
+    `health_check(client)`, a function or a coroutine function, returns
+    False or raises. A client which raises anything but a thrift exception
+    (e.g. a TTransportException, or the task being cancelled) is closed
+    and replaced by a new one on next checkout. The APIs of `service`
+    (but `close`, `connection`, `stats` and `warm`) may also be awaited on
+    the pool directly, each call checks out a client.
+    """
+
+    def __init__(
+            self, service: types.ModuleType, host: str = 'localhost',
+            port: int = 9090, unix_socket: Optional[str] = None,
+            proto_factory: TProtocolFactory = TAsyncBinaryProtocolFactory(),
+            trans_factory: TTransportFactory = TAsyncBufferedTransportFactory(),
+            timeout: Optional[int] = 3000,
+            connect_timeout: Optional[int] = None,
+            cafile: Optional[str] = None,
+            ssl_context: Optional[ssl.SSLContext] = None,
+            certfile: Optional[str] = None, keyfile: Optional[str] = None,
+            validate: bool = True, url: str = '',
+            socket_family: socket.AddressFamily = socket.AF_INET,
+            max_size: int = 10, min_size: int = 0,
+            idle_timeout: Optional[float] = 60.0,
+            wait_timeout: Optional[float] = None,
+            health_check: Optional[Callable[[TAsyncClient], Any]] = None
+    ) -> None:
+        if min_size > max_size:
+            raise ValueError('min_size is larger than max_size.')
+        self.service = service
+        self.proto_factory = proto_factory
+        self.trans_factory = trans_factory
+        self.max_size = max_size
+        self.min_size = min_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check = health_check
+        self._socket_args = (host, port, unix_socket, timeout,
+                             connect_timeout, cafile, ssl_context, certfile,
+                             keyfile, validate, url, socket_family)
+
+        self.closed = False
+        # a task holds the semaphore while it has a client checked out. It
+        # is made on the first checkout, before Python 3.10 a semaphore is
+        # bound to the loop running when it is made.
+        self._slots = None  # type: Optional[asyncio.Semaphore]
+        # most recently released last, to reuse the warmest client first.
+        self._idle = deque()  # type: Deque[_PooledClient]
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._discarded = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._connects = 0
+        self._connect_time = 0.0
+        self._max_connect_time = 0.0
+
+    def __getattr__(self, _api: str) -> functools.partial:
+        if _api in self.service.thrift_services:
+            return functools.partial(self._call, _api)
+        raise AttributeError("{} instance has no attribute '{}'".format(
+            self.__class__.__name__, _api))
+
+    async def _call(self, _api: str, *args: Any, **kwargs: Any) -> Any:
+        async with self.connection() as client:
+            return await getattr(client, _api)(*args, **kwargs)
+
+    async def warm(self) -> None:
+        """Open clients until the pool has `min_size` of them."""
+        missing = self.min_size - len(self._idle) - self._in_use
+        if missing <= 0:
+            return
+        results = await asyncio.gather(
+            *[self._create() for _ in range(missing)], return_exceptions=True)
+        clients = [r for r in results if isinstance(r, _PooledClient)]
+
+        # checkouts and other warm() calls may have opened clients meanwhile
+        room = 0 if self.closed else \
+            self.max_size - len(self._idle) - self._in_use
+        room = max(room, 0)
+        for pooled in clients[room:]:
+            pooled.transport.close()
+        self._idle.extendleft(clients[:room])
+
+        for result in results:
+            if not isinstance(result, _PooledClient):
+                raise result
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> AsyncGenerator[TAsyncClient, None]:
+        pooled = await self._checkout()
+        try:
+            yield pooled.client
+        except (TTransportException, TProtocolException, TDecodeException):
+            # the reply may have been read in part.
+            self._discard(pooled)
+            raise
+        except TException:
+            # declared exceptions and TApplicationException are read whole,
+            # the connection is still usable.
+            self._release(pooled)
+            raise
+        except BaseException:
+            self._discard(pooled)
+            raise
+        self._release(pooled)
+
+    async def _checkout(self) -> _PooledClient:
+        if self.closed:
+            raise TTransportException(TTransportException.NOT_OPEN,
+                                      'Client pool is closed.')
+        start = time.monotonic()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_size)
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            raise TTransportException(
+                TTransportException.TIMED_OUT,
+                'No client available after {}s'.format(self.wait_timeout))
+        finally:
+            self._waiting -= 1
+
+        self._in_use += 1
+        try:
+            while True:
+                if self.closed:
+                    raise TTransportException(TTransportException.NOT_OPEN,
+                                              'Client pool is closed.')
+                if not self._idle:
+                    pooled = await self._create()
+                    break
+                pooled = self._idle.pop()
+                if await self._is_healthy(pooled):
+                    break
+                pooled.transport.close()
+                self._discarded += 1
+        except BaseException:
+            self._in_use -= 1
+            self._slots.release()
+            raise
+
+        wait_time = time.monotonic() - start
+        self._checkouts += 1
+        self._wait_time += wait_time
+        self._max_wait_time = max(self._max_wait_time, wait_time)
+        return pooled
+
+    async def _create(self) -> _PooledClient:
+        start = time.monotonic()
+        sock = _client_socket(*self._socket_args)
+        transport = self.trans_factory.get_transport(sock)
+        protocol = self.proto_factory.get_protocol(transport)
+        await transport.open()
+
+        connect_time = time.monotonic() - start
+        self._connects += 1
+        self._connect_time += connect_time
+        self._max_connect_time = max(self._max_connect_time, connect_time)
+        return _PooledClient(TAsyncClient(self.service, protocol), sock,
+                             transport)
+
+    async def _is_healthy(self, pooled: _PooledClient) -> bool:
+        if self.idle_timeout is not None and \
+                time.monotonic() - pooled.released_at > self.idle_timeout:
+            return False
+        sock = pooled.sock
+        if not sock.is_open() or sock.reader.at_eof() or \
+                sock.writer.is_closing():
+            return False
+        if self.health_check is None:
+            return True
+        try:
+            healthy = self.health_check(pooled.client)
+            if inspect.isawaitable(healthy):
+                healthy = await healthy
+            return bool(healthy)
+        except Exception:
+            return False
+
+    def _release(self, pooled: _PooledClient) -> None:
+        pooled.released_at = time.monotonic()
+        self._in_use -= 1
+        if self.closed:
+            pooled.transport.close()
+        else:
+            self._idle.append(pooled)
+        self._slots.release()
+
+    def _discard(self, pooled: _PooledClient) -> None:
+        pooled.transport.close()
+        self._in_use -= 1
+        self._discarded += 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the metrics of the pool: its clients, idle or in use,
+        the tasks waiting for one, how long checkouts waited and how long
+        connecting took.
+        """
+        return {
+            'max_size': self.max_size,
+            'size': len(self._idle) + self._in_use,
+            'idle': len(self._idle),
+            'in_use': self._in_use,
+            'waiting': self._waiting,
+            'checkouts': self._checkouts,
+            'discarded': self._discarded,
+            'wait_time_total': self._wait_time,
+            'wait_time_max': self._max_wait_time,
+            'connects': self._connects,
+            'connect_time_total': self._connect_time,
+            'connect_time_max': self._max_connect_time,
+        }
+
+    def close(self) -> None:
+        """Close the idle clients, the ones in use are closed when they are
+        released.
+        """
+        self.closed = True
+        idle, self._idle = self._idle, deque()
+        for pooled in idle:
+            pooled.transport.close()
@@ -1,14 +1,22 @@
 import asyncio
 import logging
-from typing import Optional
+from collections import deque
+from typing import Any, Deque, List, Optional, Set  # noqa
 
+from thriftpy2.protocol import TBinaryProtocolFactory, TCompactProtocolFactory
 from thriftpy2.transport import TTransportException
 
 from .protocol.binary import TAsyncBinaryProtocolFactory
+from .protocol.compact import TAsyncCompactProtocolFactory
+from .protocol.framed import (TAsyncFramedProtocol,
+                              TAsyncFramedProtocolFactory, _frame_size)
 from .transport.buffered import TAsyncBufferedTransportFactory
 
 logger = logging.getLogger(__name__)
 
+BUFFER_SIZE = 64 * 1024
+MIN_READ_SIZE = 4096
+
 
 class TAsyncServer:
 
@@ -50,9 +58,10 @@ class TAsyncServer:
             )
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
-        self.server = self.loop.run_until_complete(
-            self.trans.accept(self.handle)
-        )
+        self.server = self.loop.run_until_complete(self.start_server())
+
+    async def start_server(self):
+        return await self.trans.accept(self.handle)
 
     async def handle(self, client):
         itrans = self.itrans_factory.get_transport(client)
@@ -78,3 +87,263 @@ class TAsyncServer:
         await server.wait_closed()
         self.closed = True
         self.server = None
+
+
+def _framed_protocol_factory(factory):
+    if isinstance(factory, TAsyncFramedProtocolFactory):
+        return factory
+    if isinstance(factory, TAsyncBinaryProtocolFactory):
+        return TAsyncFramedProtocolFactory(TBinaryProtocolFactory(
+            strict_read=factory.strict_read,
+            strict_write=factory.strict_write,
+            decode_response=factory.decode_response,
+            strict_decode=factory.strict_decode))
+    if isinstance(factory, TAsyncCompactProtocolFactory):
+        return TAsyncFramedProtocolFactory(TCompactProtocolFactory(
+            decode_response=factory.decode_response,
+            strict_decode=factory.strict_decode))
+    raise TypeError('TAsyncFramedServer cannot speak {!r}'.format(factory))
+
+
+class _TFramedServerProtocol(TAsyncFramedProtocol):
+    """Framed protocol of a connection, reading the frames it received.
+
+    A single protocol serves the concurrent requests of the connection:
+    the processor reads a request and writes a reply without awaiting in
+    between, so they never interleave.
+    """
+
+    def set_frame(self, frame):
+        self._rbuf.setvalue(frame)
+
+    async def read_frame(self):
+        pass
+
+
+class _FramedConnection(asyncio.BufferedProtocol):
+    """A connection of TAsyncFramedServer.
+
+    The data is received into a preallocated buffer, grown when a frame
+    doesn't fit in it, and every complete frame is queued for the
+    processor, which runs as a task for up to `server.concurrency` frames
+    at once. Reading is paused while more frames than that are waiting.
+    Replies written in the same loop iteration are sent by a single write
+    to the transport.
+    """
+
+    def __init__(self, server: 'TAsyncFramedServer') -> None:
+        self.server = server
+        self.loop = server.loop  # type: Any
+        self.transport = None  # type: Any
+        self.frames = deque()  # type: Deque[bytes]
+
+        self._buf = bytearray(BUFFER_SIZE)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+        self._wbuf = []  # type: List[bytes]
+        self._flush_handle = None  # type: Any
+        self._drain_waiter = None  # type: Optional[asyncio.Future]
+        self._tasks = set()  # type: Set[asyncio.Task]
+        self._reading_paused = False
+        self._timeout_handle = None  # type: Any
+        self._last_active = 0.0
+
+        factory = server.iprot_factory
+        self.proto = _TFramedServerProtocol(self, factory.proto_factory,
+                                            factory.max_frame_size)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections.add(self)
+        self._last_active = self.loop.time()
+        self._schedule_timeout()
+
+    def connection_lost(self, exc):
+        self.server.connections.discard(self)
+        self.frames.clear()
+        if self._timeout_handle is not None:
+            self._timeout_handle.cancel()
+        self.cancel()
+        if self._drain_waiter is not None and not self._drain_waiter.done():
+            self._drain_waiter.set_exception(TTransportException(
+                TTransportException.END_OF_FILE, 'Connection closed'))
+
+    def cancel(self):
+        """Cancel the requests being processed, return their tasks."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        return tasks
+
+    def get_buffer(self, sizehint):
+        size = len(self._buf)
+        if self._start == self._end and size > BUFFER_SIZE:
+            # give back the room made for a large frame
+            self._move(BUFFER_SIZE)
+        elif size - self._end < MIN_READ_SIZE:
+            if size - (self._end - self._start) < MIN_READ_SIZE:
+                size *= 2
+            self._move(size)
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        self._end += nbytes
+        self._last_active = self.loop.time()
+
+        buf, start, end = self._buf, self._start, self._end
+        max_frame_size = self.proto.max_frame_size
+        while end - start >= 4:
+            sz, = _frame_size.unpack_from(buf, start)
+            if sz < 0 or sz > max_frame_size:
+                logger.warning('Invalid frame size %d, closing connection',
+                               sz)
+                self.transport.close()
+                return
+            if end - start - 4 < sz:
+                if start + 4 + sz > len(buf):
+                    # make room for the rest of the frame
+                    self._start = start
+                    self._move(max(len(buf), 4 + sz))
+                    start = 0
+                break
+            start += 4 + sz
+            self.frames.append(self._view[start - sz:start].tobytes())
+        if start == self._end:
+            start = self._end = 0
+        self._start = start
+
+        self._dispatch()
+        if len(self.frames) > self.server.concurrency:
+            self.transport.pause_reading()
+            self._reading_paused = True
+
+    def _move(self, size):
+        """Move the pending data to the start of a buffer of `size`."""
+        n = self._end - self._start
+        if size != len(self._buf):
+            # the loop may still hold a view of the old buffer
+            buf = bytearray(size)
+            buf[:n] = self._view[self._start:self._end]
+            self._buf, self._view = buf, memoryview(buf)
+        elif self._start:
+            self._buf[:n] = self._view[self._start:self._end]
+        self._start, self._end = 0, n
+
+    def _dispatch(self):
+        while self.frames and len(self._tasks) < self.server.concurrency:
+            task = self.loop.create_task(self._process(self.frames.popleft()))
+            task.add_done_callback(self._processed)
+            self._tasks.add(task)
+
+    async def _process(self, frame):
+        self.proto.set_frame(frame)
+        try:
+            await self.server.processor.process(self.proto, self.proto)
+        except TTransportException:
+            self.transport.close()
+        except Exception as x:
+            logger.exception(x)
+            self.transport.close()
+
+    def _processed(self, task):
+        self._tasks.discard(task)
+        if self.transport.is_closing():
+            return
+        self._dispatch()
+        if self._reading_paused and \
+                len(self.frames) <= self.server.concurrency:
+            self.transport.resume_reading()
+            self._reading_paused = False
+
+    def _schedule_timeout(self):
+        timeout = self.server.trans.client_timeout
+        if timeout:
+            self._timeout_handle = self.loop.call_at(
+                self._last_active + timeout, self._check_timeout)
+
+    def _check_timeout(self):
+        if (not self._tasks
+                and self.loop.time() - self._last_active
+                >= self.server.trans.client_timeout):
+            self.transport.close()
+            return
+        if self._tasks:
+            self._last_active = self.loop.time()
+        self._schedule_timeout()
+
+    # transport of the protocol
+
+    def write(self, buff):
+        self._wbuf.append(buff)
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        wbuf, self._wbuf = self._wbuf, []
+        if not self.transport.is_closing():
+            self.transport.writelines(wbuf)
+
+    async def flush(self):
+        if self._drain_waiter is not None:
+            await self._drain_waiter
+
+    def pause_writing(self):
+        self._drain_waiter = self.loop.create_future()
+
+    def resume_writing(self):
+        waiter, self._drain_waiter = self._drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+
+class TAsyncFramedServer(TAsyncServer):
+    """Server of framed messages on `asyncio.BufferedProtocol`.
+
+    Instead of awaiting the reads of a stream, each connection receives
+    its data into a buffer and runs the processor once a whole frame is
+    there, decoding it synchronously with the protocol of `iprot_factory`:
+    a TAsyncFramedProtocolFactory, or TAsyncBinaryProtocolFactory and
+    TAsyncCompactProtocolFactory for the matching (Cython) protocol. The
+    transport factories are not used, clients must be framed, by
+    TAsyncFramedTransportFactory or TFramedTransportFactory, or use
+    TAsyncFramedProtocolFactory.
+
+    The requests of a connection are processed one by one and replied in
+    order, unless `concurrency` is over 1: up to that many requests of a
+    connection are then processed at once, each replied as soon as it's
+    done, so slow requests don't hold back the ones behind them. Clients
+    sending requests before the previous replies must match the replies
+    by seqid, as TAsyncPipelinedClient does.
+
+    `client_timeout` of the server socket closes the connections idle for
+    that long.
+    """
+
+    def __init__(self, *args, concurrency=1, **kwargs):
+        TAsyncServer.__init__(self, *args, **kwargs)
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.concurrency = concurrency
+        self.iprot_factory = _framed_protocol_factory(self.iprot_factory)
+        self.connections = set()  # type: Set[_FramedConnection]
+
+    async def start_server(self):
+        trans = self.trans
+        if trans.unix_socket:
+            create_server = self.loop.create_unix_server
+        else:
+            create_server = self.loop.create_server
+        return await create_server(lambda: _FramedConnection(self),
+                                   sock=trans.raw_sock,
+                                   ssl=trans.ssl_context)
+
+    async def close(self):
+        tasks = []
+        for conn in list(self.connections):
+            conn.transport.close()
+            tasks.extend(conn.cancel())
+        await TAsyncServer.close(self)
+        await asyncio.gather(*tasks, return_exceptions=True)
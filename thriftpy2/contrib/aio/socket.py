@@ -268,6 +268,7 @@ class TAsyncServerSocket(object):
             self.ssl_context.load_cert_chain(certfile, keyfile=keyfile)
         else:
             self.ssl_context = None
+        self.raw_sock = None
 
     def _init_sock(self):
         if self.unix_socket:
@@ -296,6 +297,10 @@ class TAsyncServerSocket(object):
         self.raw_sock = _sock
 
     def listen(self):
+        if self.raw_sock is not None:
+            # listening already, e.g. shared by the workers of a
+            # TProcessPoolServer.
+            return
         self._init_sock()
 
         addr = self.unix_socket or (self.host, self.port)
@@ -332,6 +337,7 @@ class TAsyncServerSocket(object):
             self.raw_sock.close()
         except (socket.error, OSError):
             pass
+        self.raw_sock = None
 
 
 class StreamHandler(object):
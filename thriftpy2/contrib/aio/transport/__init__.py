@@ -6,6 +6,10 @@ __all__ = [
     'TAsyncFramedTransportFactory',
     'TAsyncSaslClientTransport',
     'TAsyncSaslClientTransportFactory',
+    'TAsyncCompressedTransport',
+    'TAsyncCompressedTransportFactory',
+    'TAsyncZlibTransport',
+    'TAsyncZlibTransportFactory',
 ]
 
 from .base import TAsyncTransportBase
@@ -15,3 +19,9 @@ from .sasl import (
     TAsyncSaslClientTransport,
     TAsyncSaslClientTransportFactory,
 )
+from .compressed import (
+    TAsyncCompressedTransport,
+    TAsyncCompressedTransportFactory,
+    TAsyncZlibTransport,
+    TAsyncZlibTransportFactory,
+)
@@ -0,0 +1,87 @@
+import struct
+from io import BytesIO
+
+from thriftpy2.transport import TTransportException
+from thriftpy2.transport.compressed.codec import (
+    DEFAULT_THRESHOLD,
+    MAX_FRAME_SIZE,
+    NO_CODEC,
+    ZlibCodec,
+    compress_frame,
+    counters as default_counters,
+    decompress_frame,
+    pack_frame_header,
+)
+from .base import readall
+from .buffered import TAsyncBufferedTransport
+from .framed import TAsyncFramedTransport
+
+
+class TAsyncCompressedTransport(TAsyncFramedTransport):
+    """Async version of
+    :class:`thriftpy2.transport.compressed.TCompressedTransport`.
+    """
+    def __init__(self, trans, codec=None, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        super(TAsyncCompressedTransport, self).__init__(trans)
+        self._codec = ZlibCodec() if codec is None else codec
+        self._codecs = {self._codec.codec_id: self._codec}
+        self._threshold = threshold
+        self._counters = default_counters if counters is None else counters
+        self._max_frame_size = max_frame_size
+
+    async def read_frame(self):
+        buff = await readall(self._trans.read, 4)
+        sz, = struct.unpack('!i', buff)
+        if sz <= 0:
+            raise TTransportException("No frame.", TTransportException.UNKNOWN)
+
+        frame = await readall(self._trans.read, sz)
+        if frame[0] == NO_CODEC:
+            self._counters.add_read(sz - 1, sz - 1, 0.0, False)
+            self._rbuf = BytesIO(frame)
+            self._rbuf.seek(1)
+        else:
+            self._rbuf = BytesIO(decompress_frame(
+                self._codecs, frame, self._counters, self._max_frame_size))
+
+    async def flush(self):
+        # reset wbuf before write/flush to preserve state on underlying failure
+        out = self._wbuf.getvalue()
+        self._wbuf = BytesIO()
+
+        codec_id, payload = compress_frame(self._codec, out, self._threshold,
+                                           self._counters)
+        header = pack_frame_header(len(payload) + 1, codec_id)
+        self._trans.write(header + payload)
+        await self._trans.flush()
+
+
+class TAsyncZlibTransport(TAsyncCompressedTransport):
+    """Async compressed transport using zlib at compression `level`."""
+    def __init__(self, trans, level=6, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        super(TAsyncZlibTransport, self).__init__(trans, ZlibCodec(level),
+                                                  threshold, counters,
+                                                  max_frame_size)
+
+
+class TAsyncCompressedTransportFactory(object):
+    def __init__(self, codec=None, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        self.codec = codec
+        self.threshold = threshold
+        self.counters = counters
+        self.max_frame_size = max_frame_size
+
+    def get_transport(self, trans):
+        return TAsyncBufferedTransport(TAsyncCompressedTransport(
+            trans, self.codec, self.threshold, self.counters,
+            self.max_frame_size))
+
+
+class TAsyncZlibTransportFactory(TAsyncCompressedTransportFactory):
+    def __init__(self, level=6, threshold=DEFAULT_THRESHOLD, counters=None,
+                 max_frame_size=MAX_FRAME_SIZE):
+        super(TAsyncZlibTransportFactory, self).__init__(
+            ZlibCodec(level), threshold, counters, max_frame_size)
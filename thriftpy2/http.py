@@ -67,6 +67,13 @@ class TFileObjectTransport(TTransportBase):
     def read(self, sz: int) -> bytes:
         return self.fileobj.read(sz)
 
+    def read_some(self, sz: int) -> bytes:
+        read1 = getattr(self.fileobj, 'read1', None)
+        if read1 is None:
+            # `read` may block until `sz` bytes are read
+            return self.fileobj.read(1)
+        return read1(sz)
+
     def write(self, buf: bytes) -> None:
         self.fileobj.write(buf)
 
@@ -237,6 +244,10 @@ class THttpClient(TTransportBase):
         content = self.response.read(sz)
         return content
 
+    def read_some(self, sz: int) -> bytes:
+        # the response body is a single message
+        return self.read(sz)
+
     def write(self, buf: bytes) -> None:
         self.__wbuf.write(buf)
 
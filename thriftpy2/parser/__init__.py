@@ -23,6 +23,7 @@ def load(
     include_dirs: Optional[List[Union[str, os.PathLike]]] = None,
     include_dir: Optional[Union[str, os.PathLike]] = None,
     encoding: str = 'utf-8',
+    gen_codec: bool = False,
 ) -> types.ModuleType:
     """Load thrift file as a module.
 
@@ -32,6 +33,9 @@ def load(
     Note: `include_dir` will be depreacated in the future, use `include_dirs`
     instead. If `include_dir` was provided (not None), it will be appended to
     `include_dirs`.
+
+    If `gen_codec` is True, binary codecs specialized for each struct are
+    generated at load time, which speeds up the pure python binary protocol.
     """
     path = os.fspath(path)
     if include_dirs is not None:
@@ -41,7 +45,8 @@ def load(
     real_module = bool(module_name)
     # `parse` resolves forward references and caches a fully-built module.
     thrift = parse(path, module_name, include_dirs=include_dirs,
-                   include_dir=include_dir, encoding=encoding)
+                   include_dir=include_dir, encoding=encoding,
+                   gen_codec=gen_codec)
 
     # add sub modules to sys.modules recursively
     if real_module:
@@ -64,10 +69,11 @@ def load(
     return thrift
 
 
-def load_fp(source: TextIO, module_name: str) -> types.ModuleType:
+def load_fp(source: TextIO, module_name: str,
+            gen_codec: bool = False) -> types.ModuleType:
     """Load thrift file like object as a module.
     """
-    thrift = parse_fp(source, module_name)
+    thrift = parse_fp(source, module_name, gen_codec=gen_codec)
     sys.modules[module_name] = thrift
     return thrift
 
@@ -612,7 +612,7 @@ def p_type_annotation(p):
 
 def parse(path, module_name=None, include_dirs=None, include_dir=None,
           lexer=None, parser=None, enable_cache=True, encoding='utf-8',
-          _context=None):
+          gen_codec=False, _context=None):
     """Parse a single thrift file to module object, e.g.::
 
         >>> from thriftpy2.parser.parser import parse
@@ -633,6 +633,10 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
     :param enable_cache: if this is set to be `True`, parsed module will be
                          cached, this is enabled by default. If `module_name`
                          is provided, use it as cache key, else use the `path`.
+    :param gen_codec: if this is set to be `True`, generate specialized binary
+                      codecs for the structs of the parsed module (and the
+                      modules it includes), see
+                      :func:`thriftpy2.protocol.binary.gen_codec`.
     """
     # `_context` is shared across recursive `include` parsing; a top-level
     # call creates a fresh one so no state leaks between parse invocations.
@@ -648,7 +652,10 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
 
     with _parse_lock:
         if enable_cache and cache_key in _thrift_cache:
-            return _thrift_cache[cache_key]
+            thrift = _thrift_cache[cache_key]
+            if gen_codec:
+                _gen_codecs(thrift)
+            return thrift
 
         if include_dirs is not None:
             context.include_dirs = include_dirs
@@ -688,6 +695,8 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
         setattr(thrift, '__thrift_namespaces__', {})
         _parse_data(data, thrift, context, lexer, parser,
                     is_root=_context is None)
+        if gen_codec:
+            _gen_codecs(thrift)
 
         if enable_cache:
             _thrift_cache[cache_key] = thrift
@@ -695,7 +704,7 @@ def parse(path, module_name=None, include_dirs=None, include_dir=None,
 
 
 def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True,
-             _context=None):
+             gen_codec=False, _context=None):
     """Parse a file-like object to thrift module object, e.g.::
 
         >>> from thriftpy2.parser.parser import parse_fp
@@ -710,6 +719,8 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True,
     :param parser: ply parser to use, if not provided, `parse` will new one.
     :param enable_cache: if this is set to be `True`, parsed module will be
                          cached by `module_name`, this is enabled by default.
+    :param gen_codec: if this is set to be `True`, generate specialized binary
+                      codecs for the structs of the parsed module.
     """
     context = _context if _context is not None else ParseContext()
 
@@ -723,7 +734,10 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True,
 
     with _parse_lock:
         if enable_cache and module_name in _thrift_cache:
-            return _thrift_cache[module_name]
+            thrift = _thrift_cache[module_name]
+            if gen_codec:
+                _gen_codecs(thrift)
+            return thrift
 
         data = source.read()
 
@@ -732,6 +746,8 @@ def parse_fp(source, module_name, lexer=None, parser=None, enable_cache=True,
         setattr(thrift, '__thrift_namespaces__', {})
         _parse_data(data, thrift, context, lexer, parser,
                     is_root=_context is None)
+        if gen_codec:
+            _gen_codecs(thrift)
 
         if enable_cache:
             _thrift_cache[module_name] = thrift
@@ -884,6 +900,30 @@ def _fill_incomplete_ttype(tmodule, definition, incomplete_type):
     return definition
 
 
+def _gen_codecs(thrift):
+    """Generate binary codecs for all the structs, unions, exceptions and
+    service payloads of a parsed module and the modules it includes.
+
+    This must run after `_fill_incomplete_ttype`, since the codecs are
+    generated from the final thrift_spec.
+    """
+    from ..protocol.binary import gen_codec
+
+    meta = getattr(thrift, '__thrift_meta__', {})
+    for key in ('structs', 'unions', 'exceptions'):
+        for cls in meta.get(key, []):
+            if '__thrift_binary_codec__' not in cls.__dict__:
+                gen_codec(cls)
+    for service in meta.get('services', []):
+        for api in service.thrift_services:
+            for suffix in ('_args', '_result'):
+                cls = getattr(service, api + suffix)
+                if '__thrift_binary_codec__' not in cls.__dict__:
+                    gen_codec(cls)
+    for include in meta.get('includes', []):
+        _gen_codecs(include)
+
+
 def _get_definition(thrift, name, lineno, incomplete_type):
     """Get definition from thrift module and incomplete type map.
     """
@@ -6,26 +6,45 @@ from .json import TJSONProtocol, TJSONProtocolFactory
 from .apache_json import TApacheJSONProtocol, TApacheJSONProtocolFactory
 from .compact import TCompactProtocol, TCompactProtocolFactory
 from .multiplex import TMultiplexedProtocol, TMultiplexedProtocolFactory
+from .header import THeaderProtocol, THeaderProtocolFactory
 
 from thriftpy2._compat import PYPY, CYTHON
 if not PYPY:
-    # enable cython binary by default for CPython.
+    # enable cython binary, compact and json protocol by default for CPython.
     if CYTHON:
         if TYPE_CHECKING:
             TCyBinaryProtocol = TBinaryProtocol
             TCyBinaryProtocolFactory = TBinaryProtocolFactory
+            TCyCompactProtocol = TCompactProtocol
+            TCyCompactProtocolFactory = TCompactProtocolFactory
+            TCyJSONProtocol = TJSONProtocol
+            TCyJSONProtocolFactory = TJSONProtocolFactory
         else:
             from .cybin import TCyBinaryProtocol, TCyBinaryProtocolFactory
+            from .cycompact import (TCyCompactProtocol,
+                                    TCyCompactProtocolFactory)
+            from .cyjson import TCyJSONProtocol, TCyJSONProtocolFactory
         TBinaryProtocol = TCyBinaryProtocol  # noqa
         TBinaryProtocolFactory = TCyBinaryProtocolFactory  # noqa
+        TCompactProtocol = TCyCompactProtocol  # noqa
+        TCompactProtocolFactory = TCyCompactProtocolFactory  # noqa
+        TJSONProtocol = TCyJSONProtocol  # noqa
+        TJSONProtocolFactory = TCyJSONProtocolFactory  # noqa
 else:
-    # disable cython binary protocol for PYPY since it's slower.
+    # disable cython protocols for PYPY since they're slower.
     TCyBinaryProtocol = TBinaryProtocol
     TCyBinaryProtocolFactory = TBinaryProtocolFactory
+    TCyCompactProtocol = TCompactProtocol
+    TCyCompactProtocolFactory = TCompactProtocolFactory
+    TCyJSONProtocol = TJSONProtocol
+    TCyJSONProtocolFactory = TJSONProtocolFactory
 
 __all__ = ['TProtocolBase', 'TBinaryProtocol', 'TBinaryProtocolFactory',
            'TCyBinaryProtocol', 'TCyBinaryProtocolFactory',
            'TJSONProtocol', 'TJSONProtocolFactory',
+           'TCyJSONProtocol', 'TCyJSONProtocolFactory',
            'TApacheJSONProtocol', 'TApacheJSONProtocolFactory',
            'TMultiplexedProtocol', 'TMultiplexedProtocolFactory',
-           'TCompactProtocol', 'TCompactProtocolFactory']
+           'TCompactProtocol', 'TCompactProtocolFactory',
+           'TCyCompactProtocol', 'TCyCompactProtocolFactory',
+           'THeaderProtocol', 'THeaderProtocolFactory']
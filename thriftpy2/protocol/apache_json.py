@@ -5,12 +5,13 @@ unfortunately, thriftpy2's TJSONProtocol is not compatible with apache's
 
 import json
 import base64
+import re
 from typing import Any
 
-import ijson
-
 from thriftpy2.protocol import TProtocolBase
+from thriftpy2.protocol.exc import TProtocolException
 from thriftpy2.thrift import TType
+from thriftpy2.transport.base import TTransportException
 
 
 CTYPES = {
@@ -32,6 +33,9 @@ JTYPES = {v: k for k, v in CTYPES.items()}
 
 VERSION = 1
 
+# bytes asked at once to the transports that can return less, see `read_some`
+READ_CHUNK_SIZE = 4096
+
 
 def flatten(suitable_for_isinstance):
     """
@@ -64,23 +68,74 @@ def _ensure_b64_encode(val):
     return val
 
 
-class _ListSink(object):
-    """Minimal coroutine-like sink for ijson's items_coro pipeline.
+class _MessageScanner(object):
+    """Find the end of a JSON message fed in chunks.
 
-    ijson's chained-coroutine API calls ``target.send(item)`` on its sink, so
-    a plain ``list.append`` won't work as a target. This wrapper exposes a
-    ``send`` (and ``close``) so a list can act as the sink directly.
+    Only the brackets and strings are tracked, so the whole message can be
+    handed to `json.loads` once it is complete.
     """
-    __slots__ = ('_target',)
+    __slots__ = ('_depth', '_in_string', '_escape')
 
-    def __init__(self, target):
-        self._target = target
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        # the last chunk ended with a backslash in a string
+        self._escape = False
+
+    def feed(self, chunk):
+        """Return the offset in `chunk` where the message ends, or -1 if it
+        continues in the next chunk.
+        """
+        pos = 0
+        end = len(chunk)
+        if self._escape:
+            pos = 1
+            self._escape = False
+
+        while pos < end:
+            if self._in_string:
+                m = _STRING_SPECIAL.search(chunk, pos)
+                if m is None:
+                    return -1
+                pos = m.end()
+                if m.group() == b'"':
+                    self._in_string = False
+                elif pos < end:
+                    pos += 1
+                else:
+                    self._escape = True
+
+            elif self._depth == 0:
+                m = _NON_SPACE.search(chunk, pos)
+                if m is None:
+                    return -1
+                if m.group() not in (b'[', b'{'):
+                    raise TProtocolException(
+                        type=TProtocolException.INVALID_DATA,
+                        message="Expecting a JSON array or object")
+                pos = m.end()
+                self._depth = 1
+
+            else:
+                m = _STRUCTURAL.search(chunk, pos)
+                if m is None:
+                    return -1
+                pos = m.end()
+                c = m.group()
+                if c == b'"':
+                    self._in_string = True
+                elif c == b'[' or c == b'{':
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        return pos
+        return -1
 
-    def send(self, item):
-        self._target.append(item)
 
-    def close(self):
-        pass
+_NON_SPACE = re.compile(rb'\S')
+_STRUCTURAL = re.compile(rb'[\[\]{}"]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
 
 
 class TApacheJSONProtocolFactory(object):
@@ -96,6 +151,8 @@ class TApacheJSONProtocol(TProtocolBase):
     def __init__(self, trans):
         TProtocolBase.__init__(self, trans)
         self._req: Any = None
+        # bytes read past the end of the last message
+        self._rbuf = b''
 
     def _load_data(self):
         # Fast path: transports that buffer the whole message expose getvalue()
@@ -108,26 +165,43 @@ class TApacheJSONProtocol(TProtocolBase):
             except Exception:
                 pass
 
-        # Streaming path: feed bytes to ijson's push parser; stop the moment
-        # the top-level value is fully materialized. trans.read(n) blocks until
-        # exactly n bytes arrive and Apache JSON has no length prefix, so we
-        # must read one byte at a time to avoid consuming past the message end.
-        items = []
-        sink = _ListSink(items)
-        coro = ijson.items_coro(sink, '')
-        try:
-            while not items:
-                chunk = self.trans.read(1)
-                if not chunk:
+        data = self._read_message()
+        self._req = json.loads(data.decode('utf8')) if data else None
+
+    def _read_message(self):
+        """Read the bytes of the next message from the transport.
+
+        Apache JSON has no length prefix, so the end of the message is found
+        by scanning the chunks read. Transports with a `read_some` method are
+        read by chunks, whatever is read past the end of the message is kept
+        for the next one. Other transports block until `read(sz)` gets
+        exactly `sz` bytes, so they have to be read one byte at a time.
+        """
+        read_some = getattr(self.trans, 'read_some', None)
+        scanner = _MessageScanner()
+        chunks = []
+        chunk, self._rbuf = self._rbuf, b''
+        while True:
+            if chunk:
+                end = scanner.feed(chunk)
+                if end >= 0:
+                    chunks.append(chunk[:end])
+                    self._rbuf = chunk[end:]
                     break
-                coro.send(chunk)
-        finally:
-            try:
-                coro.close()
-            except Exception:
-                pass
+                chunks.append(chunk)
 
-        self._req = items[0] if items else None
+            if read_some is not None:
+                chunk = read_some(READ_CHUNK_SIZE)
+            else:
+                chunk = self.trans.read(1)
+            if not chunk:
+                data = b''.join(chunks)
+                if data.strip():
+                    raise TTransportException(
+                        TTransportException.END_OF_FILE,
+                        "End of file in the middle of a message")
+                return b''
+        return b''.join(chunks)
 
     def read_message_begin(self):
         if not self._req:
@@ -135,7 +209,7 @@ class TApacheJSONProtocol(TProtocolBase):
         return self._req[1:4]
 
     def read_message_end(self):
-        pass
+        self._req = None
 
     def skip(self, ttype):
         pass
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import sys
-from typing import TYPE_CHECKING, Any, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Tuple, Union
 
 if sys.version_info >= (3, 8):
     from typing import Protocol
@@ -13,6 +13,25 @@ if TYPE_CHECKING:
     from ..transport.base import TTransportBase
 
 
+FieldsProjection = Union[Iterable[int], Dict[int, Any]]
+
+
+def normalize_fields(fields: FieldsProjection) -> Dict[int, Optional[dict]]:
+    """Normalize a field projection to a dict mapping each field id to
+    read to the projection of its struct value, or None to read it fully.
+
+    A projection is either an iterable of field ids, or a dict mapping
+    field ids to None or to the (nested) projection applied to the struct
+    in that field (the elements of a list/set, or the values of a map).
+    For example ``{1: None, 4: {2}}`` reads field 1, and only field 2 of
+    the struct in field 4.
+    """
+    if isinstance(fields, dict):
+        return {fid: None if sub is None else normalize_fields(sub)
+                for fid, sub in fields.items()}
+    return dict.fromkeys(fields)
+
+
 class TProtocolFactory(Protocol):
     """Protocol factory interface for type annotations."""
 
@@ -42,7 +61,8 @@ class TProtocolBase(object):
     def write_message_end(self) -> None:
         raise NotImplementedError
 
-    def read_struct(self, obj: TPayload) -> Any:
+    def read_struct(self, obj: TPayload,
+                    fields: Optional[FieldsProjection] = None) -> Any:
         raise NotImplementedError
 
     def write_struct(self, obj: TPayload) -> None:
@@ -1,10 +1,10 @@
 import struct
-from typing import Any
+from typing import Any, Callable, Tuple
 
-from ..thrift import TType
+from ..thrift import TType, compile_function
 
 from .exc import TProtocolException
-from .base import TProtocolBase
+from .base import TProtocolBase, normalize_fields
 
 # VERSION_MASK = 0xffff0000
 VERSION_MASK = -65536
@@ -152,6 +152,11 @@ def write_val(outbuf, ttype, val, spec: Any = None):
             write_val(outbuf, v_type, val[k], v_spec)
 
     elif ttype == TType.STRUCT:
+        codec = getattr(val, '__thrift_binary_codec__', None)
+        if codec is not None:
+            codec[1](outbuf, val)
+            return
+
         for fid in iter(val.thrift_spec):
             f_spec = val.thrift_spec[fid]
             if len(f_spec) == 3:
@@ -215,7 +220,7 @@ def read_map_begin(inbuf):
 
 
 def read_val(inbuf, ttype, spec: Any = None, decode_response=True,
-             strict_decode=False):
+             strict_decode=False, fields=None):
     if ttype == TType.BOOL:
         return bool(unpack_i8(inbuf.read(1)))
 
@@ -269,7 +274,7 @@ def read_val(inbuf, ttype, spec: Any = None, decode_response=True,
 
         for i in range(sz):
             result.append(read_val(inbuf, v_type, v_spec, decode_response,
-                                   strict_decode))
+                                   strict_decode, fields))
         return result
 
     elif ttype == TType.MAP:
@@ -301,24 +306,34 @@ def read_val(inbuf, ttype, spec: Any = None, decode_response=True,
             k_val = read_val(inbuf, k_type, k_spec, decode_response,
                              strict_decode)
             v_val = read_val(inbuf, v_type, v_spec, decode_response,
-                             strict_decode)
+                             strict_decode, fields)
             result[k_val] = v_val
 
         return result
 
     elif ttype == TType.STRUCT:
         obj = spec()
-        read_struct(inbuf, obj, decode_response, strict_decode)
+        read_struct(inbuf, obj, decode_response, strict_decode, fields)
         return obj
 
 
-def read_struct(inbuf, obj, decode_response=True, strict_decode=False):
+def read_struct(inbuf, obj, decode_response=True, strict_decode=False,
+                fields=None):
+    """Read a struct into `obj`. If `fields` (a normalized projection, see
+    :func:`thriftpy2.protocol.base.normalize_fields`) is given, only the
+    fields in it are decoded and the others are skipped."""
+    if fields is None:
+        codec = getattr(obj, '__thrift_binary_codec__', None)
+        if codec is not None:
+            return codec[0](inbuf, obj, decode_response, strict_decode)
+
     while True:
         f_type, fid = read_field_begin(inbuf)
         if f_type == TType.STOP:
             break
 
-        if fid not in obj.thrift_spec:
+        if fid not in obj.thrift_spec or (
+                fields is not None and fid not in fields):
             skip(inbuf, f_type)
             continue
 
@@ -339,7 +354,8 @@ def read_struct(inbuf, obj, decode_response=True, strict_decode=False):
 
         setattr(obj, f_name,
                 read_val(inbuf, f_type, f_container_spec, decode_response,
-                         strict_decode))
+                         strict_decode,
+                         None if fields is None else fields[fid]))
 
 
 def skip(inbuf, ftype):
@@ -380,6 +396,199 @@ def skip(inbuf, ftype):
             skip(inbuf, f_type)
 
 
+# struct formats of the fixed size ttypes, used by the generated codecs.
+_FIXED_FORMATS = {
+    TType.BOOL: 'b',
+    TType.BYTE: 'b',
+    TType.I16: 'h',
+    TType.I32: 'i',
+    TType.I64: 'q',
+    TType.DOUBLE: 'd',
+}
+
+
+def _split_spec(f_spec):
+    if len(f_spec) == 3:
+        return f_spec[0], f_spec[1], None
+    return f_spec[0], f_spec[1], f_spec[2]
+
+
+def _gen_read_field(lines, ttype, container_spec, spec_name):
+    """Append the source reading one field value into `v`."""
+    fmt = _FIXED_FORMATS.get(ttype)
+    if fmt is not None:
+        value = "_unpack('!%s', read(%d))[0]" % (fmt, struct.calcsize(fmt))
+        if ttype == TType.BOOL:
+            value = 'bool(%s)' % value
+        lines.append('v = %s' % value)
+
+    elif ttype == TType.BINARY:
+        lines.append("v = read(_unpack('!i', read(4))[0])")
+
+    elif ttype == TType.STRING:
+        lines.extend([
+            "v = read(_unpack('!i', read(4))[0])",
+            "if decode_response:",
+            "    try:",
+            "        v = v.decode('utf-8')",
+            "    except UnicodeDecodeError:",
+            "        if strict_decode:",
+            "            raise",
+        ])
+
+    elif ttype in (TType.LIST, TType.SET) and \
+            _FIXED_FORMATS.get(container_spec) is not None:
+        # list of fixed size elements, unpack all of them in one call.
+        fmt = _FIXED_FORMATS[container_spec]
+        value = "_unpack('!%%d%s' %% sz, read(%d * sz))" % (
+            fmt, struct.calcsize(fmt))
+        if container_spec == TType.BOOL:
+            value = 'list(map(bool, %s))' % value
+        else:
+            value = 'list(%s)' % value
+        lines.extend([
+            "r_type, sz = read_list_begin(inbuf)",
+            "if r_type == %d:" % container_spec,
+            "    v = %s" % value,
+            "else:",
+            "    for _ in range(sz):",
+            "        skip(inbuf, r_type)",
+            "    v = []",
+        ])
+
+    else:
+        lines.append(
+            'v = read_val(inbuf, %d, %s, decode_response, strict_decode)'
+            % (ttype, spec_name))
+
+
+def _gen_write_field(lines, ttype, container_spec, spec_name, header):
+    """Append the source writing the field header and value `v`."""
+    fmt = _FIXED_FORMATS.get(ttype)
+    if ttype == TType.BOOL:
+        lines.append('write(%r if v else %r)' % (header + b'\x01',
+                                                 header + b'\x00'))
+
+    elif fmt is not None:
+        lines.append("write(%r + _pack('!%s', v))" % (header, fmt))
+
+    elif ttype in BIN_TYPES:
+        lines.extend([
+            "if isinstance(v, str):",
+            "    v = v.encode('utf-8')",
+            "v = memoryview(v)",
+            "write(%r + _pack('!i', v.nbytes))" % header,
+            "write(v)",
+        ])
+
+    elif ttype in (TType.LIST, TType.SET) and \
+            _FIXED_FORMATS.get(container_spec) is not None:
+        fmt = _FIXED_FORMATS[container_spec]
+        if container_spec == TType.BOOL:
+            v = '[1 if x else 0 for x in v]'
+        else:
+            v = 'v'
+        lines.extend([
+            "write(%r + _pack('!i', len(v)))" % (header + pack_i8(
+                container_spec)),
+            "write(_pack('!%%d%s' %% len(v), *%s))" % (fmt, v),
+        ])
+
+    else:
+        lines.append('write(%r)' % header)
+        lines.append('write_val(outbuf, %d, v, %s)' % (ttype, spec_name))
+
+
+def struct_codec_generator(
+        cls: type) -> Tuple[Callable[..., None], Callable[..., None]]:
+    """Generate binary `read` and `write` functions specialized for the
+    `thrift_spec` of a struct class.
+
+    The generated functions behave the same as `read_struct` and
+    `write_val(outbuf, TType.STRUCT, obj)`, but the field dispatch and
+    the encoding of primitive fields are unrolled into straight-line code,
+    so no per-field lookup of thrift_spec is needed.
+    """
+    func_globals = {
+        '_unpack': struct.unpack,
+        '_pack': struct.pack,
+        'read_list_begin': read_list_begin,
+        'read_val': read_val,
+        'write_val': write_val,
+        'skip': skip,
+    }
+
+    read_lines = []
+    write_lines = []
+    for i, (fid, f_spec) in enumerate(cls.thrift_spec.items()):
+        ttype, name, container_spec = _split_spec(f_spec)
+        spec_name = '_spec%d' % i
+        func_globals[spec_name] = container_spec
+
+        # field type on the wire, see `write_field_begin`.
+        wire_type = TType.STRING if ttype == TType.BINARY else ttype
+        if ttype in BIN_TYPES:
+            cond = 'f_type in (%d, %d)' % BIN_TYPES
+        else:
+            cond = 'f_type == %d' % ttype
+
+        read_lines.append('%s fid == %d and %s:' % (
+            'if' if i == 0 else 'elif', fid, cond))
+        field_lines = []
+        _gen_read_field(field_lines, ttype, container_spec, spec_name)
+        field_lines.append('obj.%s = v' % name)
+        read_lines.extend('    ' + line for line in field_lines)
+
+        write_lines.append('v = getattr(obj, %r, None)' % name)
+        write_lines.append('if v is not None:')
+        field_lines = []
+        _gen_write_field(field_lines, ttype, container_spec, spec_name,
+                         pack_i8(wire_type) + pack_i16(fid))
+        write_lines.extend('    ' + line for line in field_lines)
+
+    if read_lines:
+        read_lines.extend(['else:', '    skip(inbuf, f_type)'])
+    else:
+        read_lines.append('skip(inbuf, f_type)')
+
+    read_src = '\n'.join([
+        'def read_struct(inbuf, obj, decode_response=True,',
+        '                strict_decode=False):',
+        '    read = inbuf.read',
+        '    while True:',
+        "        f_type = _unpack('!b', read(1))[0]",
+        '        if f_type == 0:',
+        '            break',
+        "        fid = _unpack('!h', read(2))[0]",
+    ] + ['        ' + line for line in read_lines])
+
+    write_src = '\n'.join([
+        'def write_struct(outbuf, obj):',
+        '    write = outbuf.write',
+    ] + ['    ' + line for line in write_lines] + [
+        "    write(b'\\x00')",
+    ])
+
+    read_func = compile_function(
+        '<generated {}.read_struct>'.format(cls.__name__), read_src,
+        func_globals, (True, False))
+    write_func = compile_function(
+        '<generated {}.write_struct>'.format(cls.__name__), write_src,
+        func_globals)
+    return read_func, write_func
+
+
+def gen_codec(cls: type) -> type:
+    """Attach the codec generated by `struct_codec_generator` to a struct
+    class, the pure python binary protocol will use it from then on.
+
+    Note the codec is built from the current `thrift_spec`, call this again
+    if the thrift_spec of `cls` is changed.
+    """
+    cls.__thrift_binary_codec__ = struct_codec_generator(cls)
+    return cls
+
+
 class TBinaryProtocol(TProtocolBase):
     """Binary implementation of the Thrift protocol driver."""
 
@@ -410,9 +619,11 @@ class TBinaryProtocol(TProtocolBase):
     def write_message_end(self):
         pass
 
-    def read_struct(self, obj):
+    def read_struct(self, obj, fields=None):
+        if fields is not None:
+            fields = normalize_fields(fields)
         return read_struct(self.trans, obj, self.decode_response,
-                           self.strict_decode)
+                           self.strict_decode, fields)
 
     def write_struct(self, obj):
         write_val(self.trans, TType.STRUCT, obj)
@@ -5,7 +5,7 @@ from typing import Any
 
 
 from ..thrift import TException, TType
-from .base import TProtocolBase
+from .base import TProtocolBase, normalize_fields
 from .exc import TProtocolException
 
 CLEAR = 0
@@ -247,14 +247,20 @@ class TCompactProtocol(TProtocolBase):
             return result
         return self._read_byte() == CompactType.TRUE
 
-    def read_struct(self, obj):
+    def read_struct(self, obj, fields=None):
+        if fields is not None:
+            fields = normalize_fields(fields)
+        self._read_struct(obj, fields)
+
+    def _read_struct(self, obj, fields):
         self._read_struct_begin()
         while True:
             fname, ftype, fid = self._read_field_begin()
             if ftype == TType.STOP:
                 break
 
-            if fid not in obj.thrift_spec:
+            if fid not in obj.thrift_spec or (
+                    fields is not None and fid not in fields):
                 self.skip(ftype)
                 continue
 
@@ -270,14 +276,16 @@ class TCompactProtocol(TProtocolBase):
                              and field[0] in BIN_TYPES)):
                     fname = field[1]
                     fspec = field[2]
-                    val = self._read_val(field[0], fspec)
+                    val = self._read_val(
+                        field[0], fspec,
+                        None if fields is None else fields[fid])
                     setattr(obj, fname, val)
                 else:
                     self.skip(ftype)
             self._read_field_end()
         self._read_struct_end()
 
-    def _read_val(self, ttype, spec: Any = None):
+    def _read_val(self, ttype, spec: Any = None, fields=None):
         if ttype == TType.BOOL:
             return self._read_bool()
 
@@ -305,7 +313,7 @@ class TCompactProtocol(TProtocolBase):
             r_type, sz = self._read_collection_begin()
 
             for i in range(sz):
-                result.append(self._read_val(v_type, v_spec))
+                result.append(self._read_val(v_type, v_spec, fields))
 
             self._read_collection_end()
             return result
@@ -338,14 +346,14 @@ class TCompactProtocol(TProtocolBase):
 
             for i in range(sz):
                 k_val = self._read_val(k_type, k_spec)
-                v_val = self._read_val(v_type, v_spec)
+                v_val = self._read_val(v_type, v_spec, fields)
                 result[k_val] = v_val
             self._read_collection_end()
             return result
 
         elif ttype == TType.STRUCT:
             obj = spec()
-            self.read_struct(obj)
+            self._read_struct(obj, fields)
             return obj
 
     def _write_size(self, i32):
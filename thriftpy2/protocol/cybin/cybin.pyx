@@ -6,9 +6,16 @@ from libc.stdlib cimport free, malloc
 from libc.stdint cimport int16_t, int32_t, int64_t
 from libc.string cimport memcpy
 from cpython cimport bool, PyObject_GetBuffer, PyBuffer_Release, PyBUF_ANY_CONTIGUOUS, PyBUF_SIMPLE
+from cpython cimport PyObject_CheckBuffer, PyBUF_FORMAT, PyBUF_STRIDES
+from cpython.buffer cimport PyBuffer_IsContiguous
+from cpython cimport array
+import array
 
 from thriftpy2.thrift import TDecodeException
+from thriftpy2.protocol.base import normalize_fields
+from thriftpy2.protocol.exc import TProtocolException
 from thriftpy2.transport.cybase cimport CyTransportBase, STACK_STRING_LEN
+from thriftpy2.transport.memory.cymemory cimport TCyMemoryBuffer
 
 cdef extern from "endian_port.h":
     int16_t htobe16(int16_t n)
@@ -21,6 +28,7 @@ cdef extern from "endian_port.h":
 DEF VERSION_MASK = -65536
 DEF VERSION_1 = -2147418112
 DEF TYPE_MASK = 0x000000ff
+DEF NUMERIC_CHUNK = 65536
 
 ctypedef enum TType:
     T_STOP = 0,
@@ -46,6 +54,19 @@ ctypedef enum TType:
 
 BIN_TYPES = (T_BINARY, T_STRING)
 
+# decode options, see `TCyBinaryProtocol`
+cdef enum:
+    BINARY_VIEW = 1
+    NUMERIC_ARRAY = 2
+    NUMERIC_NUMPY = 4
+
+NUMERIC_LISTS = {'list': 0, 'array': NUMERIC_ARRAY, 'numpy': NUMERIC_NUMPY}
+
+# array.array typecodes of the numeric ttypes decoded in bulk
+cdef array.array I32_ARRAY = array.array('i')
+cdef array.array I64_ARRAY = array.array('q')
+cdef array.array DOUBLE_ARRAY = array.array('d')
+
 
 class ProtocolError(Exception):
     pass
@@ -117,22 +138,85 @@ cdef inline write_list(CyTransportBase buf, object val, spec):
         e_type = spec[0]
         e_spec = spec[1]
 
-    if e_type == T_BINARY:
-        e_type = T_STRING
+    if (e_type == T_I32 or e_type == T_I64 or e_type == T_DOUBLE) and \
+            PyObject_CheckBuffer(val) and write_numeric_buffer(buf, e_type, val):
+        return
 
     val_len = len(val)
-    write_i08(buf, e_type)
+    # binary values are written as buffers, but typed as string on the wire
+    write_i08(buf, T_STRING if e_type == T_BINARY else e_type)
     write_i32(buf, val_len)
 
     for e_val in val:
         c_write_val(buf, e_type, e_val, e_spec)
 
 
+cdef inline bint match_format(TType e_type, Py_buffer *view):
+    if view.format == NULL:
+        return False
+
+    cdef bytes fmt = view.format
+    if fmt[:1] in (b'@', b'=', b'<' if sys.byteorder == 'little' else b'>'):
+        fmt = fmt[1:]
+
+    if e_type == T_DOUBLE:
+        return fmt == b'd'
+    if e_type == T_I32 and view.itemsize == 4:
+        return fmt in (b'i', b'l')
+    if e_type == T_I64 and view.itemsize == 8:
+        return fmt in (b'l', b'q')
+    return False
+
+
+cdef bint write_numeric_buffer(CyTransportBase buf, TType e_type, val) except -1:
+    """Write a list of i32/i64/double from a buffer object (array.array,
+    numpy arrays, ...) in bulk. Returns False if the buffer's item format
+    doesn't match `e_type` or it isn't contiguous, in which case nothing is
+    written."""
+    cdef Py_buffer view
+    cdef char *out
+    cdef Py_ssize_t i, n
+    cdef int32_t *i32_out
+    cdef int64_t *i64_out
+
+    PyObject_GetBuffer(val, &view, PyBUF_FORMAT | PyBUF_STRIDES)
+    try:
+        if view.ndim != 1 or not PyBuffer_IsContiguous(&view, b'C') or \
+                not match_format(e_type, &view):
+            return False
+
+        n = view.shape[0]
+        write_i08(buf, e_type)
+        write_i32(buf, n)
+        if n == 0:
+            return True
+
+        out = <char*>malloc(view.len)
+        if out == NULL:
+            raise MemoryError()
+        try:
+            if view.itemsize == 4:
+                i32_out = <int32_t*>out
+                for i in range(n):
+                    i32_out[i] = htobe32((<int32_t*>view.buf)[i])
+            else:
+                i64_out = <int64_t*>out
+                for i in range(n):
+                    i64_out[i] = htobe64((<int64_t*>view.buf)[i])
+            buf.c_write(out, view.len)
+        finally:
+            free(out)
+    finally:
+        PyBuffer_Release(&view)
+
+    return True
+
+
 cdef inline write_string(CyTransportBase buf, bytes val):
     cdef int val_len = len(val)
     write_i32(buf, val_len)
 
-    buf.c_write(<char*>val, val_len)
+    buf.c_write_object(val, <char*>val, val_len)
 
 
 cdef inline write_buffer(CyTransportBase buf, val):
@@ -140,7 +224,7 @@ cdef inline write_buffer(CyTransportBase buf, val):
     PyObject_GetBuffer(val, &in_buffer, PyBUF_SIMPLE | PyBUF_ANY_CONTIGUOUS)
     try:
         write_i32(buf, in_buffer.len)
-        buf.c_write(<char *>in_buffer.buf, in_buffer.len)
+        buf.c_write_object(val, <char *>in_buffer.buf, in_buffer.len)
     finally:
         PyBuffer_Release(&in_buffer)
 
@@ -157,9 +241,6 @@ cdef inline write_dict(CyTransportBase buf, object val, spec):
         k_type = key[0]
         k_spec = key[1]
 
-    if k_type == T_BINARY:
-        k_type = T_STRING
-
     value = spec[1]
     if isinstance(value, int):
         v_type = value
@@ -168,13 +249,10 @@ cdef inline write_dict(CyTransportBase buf, object val, spec):
         v_type = value[0]
         v_spec = value[1]
 
-    if v_type == T_BINARY:
-        v_type = T_STRING
-
     val_len = len(val)
 
-    write_i08(buf, k_type)
-    write_i08(buf, v_type)
+    write_i08(buf, T_STRING if k_type == T_BINARY else k_type)
+    write_i08(buf, T_STRING if v_type == T_BINARY else v_type)
     write_i32(buf, val_len)
 
     for k, v in val.items():
@@ -183,7 +261,8 @@ cdef inline write_dict(CyTransportBase buf, object val, spec):
 
 
 cdef inline read_struct(CyTransportBase buf, obj, decode_response=True,
-                        strict_decode=False):
+                        strict_decode=False, dict fields=None,
+                        int flags=0):
     cdef dict field_specs = obj.thrift_spec
     cdef int fid
     cdef TType field_type, ttype
@@ -196,7 +275,8 @@ cdef inline read_struct(CyTransportBase buf, obj, decode_response=True,
             break
 
         fid = read_i16(buf)
-        if fid not in field_specs:
+        if fid not in field_specs or (fields is not None and
+                                      fid not in fields):
             skip(buf, field_type)
             continue
 
@@ -212,8 +292,9 @@ cdef inline read_struct(CyTransportBase buf, obj, decode_response=True,
         else:
             spec = field_spec[2]
 
-        setattr(obj, name, c_read_val(buf, ttype, spec, decode_response,
-                                      strict_decode))
+        setattr(obj, name, c_read_val(
+            buf, ttype, spec, decode_response, strict_decode,
+            None if fields is None else fields[fid], flags))
 
     return obj
 
@@ -278,8 +359,68 @@ cdef inline c_read_string(CyTransportBase buf, int32_t size,
         return py_data
 
 
+cdef inline skip_binary(CyTransportBase buf, int32_t size):
+    cdef char string_val[STACK_STRING_LEN]
+    cdef int32_t n
+
+    while size > 0:
+        n = min(size, STACK_STRING_LEN)
+        buf.c_read(n, string_val)
+        size -= n
+
+
+cdef read_numeric_list(CyTransportBase buf, TType v_type, int size,
+                       int flags):
+    """Read a list of i32/i64/double into an array.array (or a numpy
+    array over it) with an in place byte swap.
+
+    A size over the data left in a memory buffer is rejected, and on other
+    transports the array grows as the items are read, from NUMERIC_CHUNK
+    bytes, so a bogus size doesn't allocate much more than the data
+    received."""
+    cdef array.array arr
+    cdef int32_t *i32_data
+    cdef int64_t *i64_data
+    cdef int i, n, done, itemsize
+
+    if v_type == T_I32:
+        arr = array.clone(I32_ARRAY, 0, False)
+    elif v_type == T_I64:
+        arr = array.clone(I64_ARRAY, 0, False)
+    else:
+        arr = array.clone(DOUBLE_ARRAY, 0, False)
+
+    itemsize = arr.ob_descr.itemsize
+    if size > 0:
+        if size > 0x7fffffff // itemsize:
+            raise ProtocolError('list size %d is too large' % size)
+        if isinstance(buf, TCyMemoryBuffer) and \
+                (<TCyMemoryBuffer>buf).buf.data_size < size * itemsize:
+            raise ProtocolError('list size %d is over the data left' % size)
+        done = 0
+        while done < size:
+            n = min(size - done, max(done, NUMERIC_CHUNK // itemsize))
+            array.resize(arr, done + n)
+            buf.c_read(n * itemsize, arr.data.as_chars + done * itemsize)
+            done += n
+        if itemsize == 4:
+            i32_data = <int32_t*>arr.data.as_chars
+            for i in range(size):
+                i32_data[i] = be32toh(i32_data[i])
+        else:
+            i64_data = <int64_t*>arr.data.as_chars
+            for i in range(size):
+                i64_data[i] = be64toh(i64_data[i])
+
+    if flags & NUMERIC_NUMPY:
+        import numpy
+        return numpy.frombuffer(arr, dtype=arr.typecode)
+    return arr
+
+
 cdef c_read_val(CyTransportBase buf, TType ttype, spec=None,
-                decode_response=True, strict_decode=False):
+                decode_response=True, strict_decode=False,
+                dict fields=None, int flags=0):
     cdef int size
     cdef int64_t n
     cdef TType v_type, k_type, orig_type, orig_key_type
@@ -307,6 +448,10 @@ cdef c_read_val(CyTransportBase buf, TType ttype, spec=None,
 
     elif ttype == T_BINARY:
         size = read_i32(buf)
+        if flags & BINARY_VIEW:
+            view = buf.c_read_view(size)
+            if view is not None:
+                return view
         return c_read_binary(buf, size)
 
     elif ttype == T_STRING:
@@ -332,7 +477,12 @@ cdef c_read_val(CyTransportBase buf, TType ttype, spec=None,
                 skip(buf, orig_type)
             return []
 
-        return [c_read_val(buf, v_type, v_spec, decode_response, strict_decode)
+        if flags & (NUMERIC_ARRAY | NUMERIC_NUMPY) and ttype == T_LIST and \
+                (v_type == T_I32 or v_type == T_I64 or v_type == T_DOUBLE):
+            return read_numeric_list(buf, v_type, size, flags)
+
+        return [c_read_val(buf, v_type, v_spec, decode_response, strict_decode,
+                           fields, flags)
                 for _ in range(size)]
 
     elif ttype == T_MAP:
@@ -367,12 +517,14 @@ cdef c_read_val(CyTransportBase buf, TType ttype, spec=None,
 
         return {
             c_read_val(buf, k_type, k_spec, decode_response, strict_decode):
-                c_read_val(buf, v_type, v_spec, decode_response, strict_decode)
+                c_read_val(buf, v_type, v_spec, decode_response, strict_decode,
+                           fields, flags)
             for _ in range(size)
         }
 
     elif ttype == T_STRUCT:
-        return read_struct(buf, spec(), decode_response, strict_decode)
+        return read_struct(buf, spec(), decode_response, strict_decode,
+                           fields, flags)
 
 
 cdef c_write_val(CyTransportBase buf, TType ttype, val, spec=None):
@@ -431,7 +583,7 @@ cpdef skip(CyTransportBase buf, TType ttype):
         read_i64(buf)
     elif ttype == T_STRING or ttype == T_BINARY:
         size = read_i32(buf)
-        c_read_binary(buf, size)
+        skip_binary(buf, size)
     elif ttype == T_SET or ttype == T_LIST:
         v_type = <TType>read_i08(buf)
         size = read_i32(buf)
@@ -454,8 +606,265 @@ cpdef skip(CyTransportBase buf, TType ttype):
 
 
 def read_val(CyTransportBase buf, TType ttype, decode_response=True,
-             strict_decode=False):
-    return c_read_val(buf, ttype, None, decode_response, strict_decode)
+             strict_decode=False, spec=None):
+    return c_read_val(buf, ttype, spec, decode_response, strict_decode)
+
+
+def scan_struct(TCyMemoryBuffer buf, dict thrift_spec):
+    """Scan a struct without decoding it.
+
+    Returns a dict mapping the id of each field in `thrift_spec` found
+    (with the expected type) to the `(start, end)` offsets of its value,
+    and the size of the whole struct. Offsets are relative to the start
+    of the struct.
+    """
+    cdef int start = buf.buf.cur
+    cdef int fid, begin
+    cdef TType field_type, ttype
+    cdef dict fields = {}
+
+    while True:
+        field_type = <TType>read_i08(buf)
+        if field_type == T_STOP:
+            break
+
+        fid = read_i16(buf)
+        begin = buf.buf.cur - start
+        skip(buf, field_type)
+
+        field_spec = thrift_spec.get(fid)
+        if field_spec is None:
+            continue
+        ttype = field_spec[0]
+        if field_type != ttype and not (ttype in BIN_TYPES and field_type in BIN_TYPES):
+            continue
+        fields[fid] = (begin, buf.buf.cur - start)
+
+    return fields, buf.buf.cur - start
+
+
+DEF MAX_SCAN_DEPTH = 64
+
+
+cdef inline int32_t peek_i32(const unsigned char *data):
+    cdef int32_t n
+    memcpy(&n, data, 4)
+    return be32toh(n)
+
+
+cdef inline Py_ssize_t fixed_size(TType ttype):
+    if ttype == T_BOOL or ttype == T_I08:
+        return 1
+    elif ttype == T_I16:
+        return 2
+    elif ttype == T_I32:
+        return 4
+    elif ttype == T_I64 or ttype == T_DOUBLE:
+        return 8
+    return 0
+
+
+DEF SCAN_STRUCT = 0
+DEF SCAN_LIST = 1
+DEF SCAN_MAP = 2
+
+
+cdef class BinaryScanner(object):
+    """Scanner of binary messages, going on from where it stopped when
+    the data of a message is incomplete, see
+    `thriftpy2.protocol.message._Scanner`.
+    """
+    cdef public object header
+    cdef public Py_ssize_t cur, needed
+    cdef int depth
+    cdef int kinds[MAX_SCAN_DEPTH + 1]
+    cdef TType types1[MAX_SCAN_DEPTH + 1]
+    cdef TType types2[MAX_SCAN_DEPTH + 1]
+    cdef int64_t remaining[MAX_SCAN_DEPTH + 1]
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.header = None
+        self.cur = self.needed = 0
+        self.depth = 0
+
+    def scan(self, const unsigned char[::1] data, Py_ssize_t pos=0):
+        """Returns `(name, type, seqid, start, end)`, the offsets of the
+        struct of the message at `pos` and of its end, or None if `data`
+        ends before the message.
+        """
+        cdef Py_ssize_t end = data.shape[0]
+        cdef Py_ssize_t name_end, msg_end
+        cdef const unsigned char *p
+        cdef int32_t size, name_size, seqid
+        cdef int ttype
+
+        if pos >= end:
+            return None
+        p = &data[0]
+
+        if self.header is None:
+            self.needed = 4
+            if pos + 4 > end:
+                return None
+            size = peek_i32(p + pos)
+            if size < 0:
+                if size & VERSION_MASK != VERSION_1:
+                    raise TProtocolException(
+                        TProtocolException.BAD_VERSION,
+                        'Bad version %d' % (size & VERSION_MASK))
+                ttype = size & TYPE_MASK
+                self.needed = 8
+                if pos + 8 > end:
+                    return None
+                name_size = peek_i32(p + pos + 4)
+                if name_size < 0:
+                    raise TProtocolException(
+                        TProtocolException.NEGATIVE_SIZE)
+                name_end = pos + 8 + name_size
+                self.needed = name_end + 4 - pos
+                if name_end + 4 > end:
+                    return None
+                name = (<const char *>p)[pos + 8:name_end]
+            else:
+                # no version header, the size is the one of the name.
+                name_end = pos + 4 + size
+                self.needed = name_end + 5 - pos
+                if name_end + 5 > end:
+                    return None
+                name = (<const char *>p)[pos + 4:name_end]
+                ttype = p[name_end]
+                name_end += 1
+
+            seqid = peek_i32(p + name_end)
+            self.header = (name.decode('utf-8'), ttype, seqid,
+                           name_end + 4 - pos)
+            self.cur = name_end + 4 - pos
+            self.depth = 0
+            self.push(SCAN_STRUCT, T_STOP, T_STOP, 0)
+
+        msg_end = self.scan_values(p, pos, end)
+        if msg_end < 0:
+            return None
+        name, ttype, seqid, start = self.header
+        self.reset()
+        return name, ttype, seqid, pos + start, msg_end
+
+    cdef int push(self, int kind, TType t1, TType t2, int64_t n) except -1:
+        if self.depth > MAX_SCAN_DEPTH:
+            raise TProtocolException(TProtocolException.INVALID_DATA,
+                                     'Nesting deeper than %d' % MAX_SCAN_DEPTH)
+        self.kinds[self.depth] = kind
+        self.types1[self.depth] = t1
+        self.types2[self.depth] = t2
+        self.remaining[self.depth] = n
+        self.depth += 1
+        return 0
+
+    cdef Py_ssize_t suspend(self, Py_ssize_t pos, Py_ssize_t cur,
+                            Py_ssize_t needed):
+        self.cur = cur - pos
+        self.needed = needed - pos
+        return -1
+
+    cdef Py_ssize_t scan_values(self, const unsigned char *data,
+                                Py_ssize_t pos, Py_ssize_t end) except -2:
+        """Return the offset of the end of the message, -1 if it ends past
+        `end`. Unlike `skip`, never reads past `end`.
+        """
+        cdef Py_ssize_t cur = pos + self.cur
+        cdef Py_ssize_t p, size
+        cdef int i, kind, child
+        cdef TType ttype, k_type, v_type
+        cdef int32_t n
+
+        while self.depth:
+            i = self.depth - 1
+            kind = self.kinds[i]
+            if kind == SCAN_STRUCT:
+                if cur >= end:
+                    return self.suspend(pos, cur, cur + 1)
+                ttype = <TType>data[cur]
+                if ttype == T_STOP:
+                    self.depth -= 1
+                    cur += 1
+                    continue
+                p = cur + 3
+            else:
+                if self.remaining[i] == 0:
+                    self.depth -= 1
+                    continue
+                if kind == SCAN_LIST or self.remaining[i] % 2 == 0:
+                    ttype = self.types1[i]
+                else:
+                    ttype = self.types2[i]
+                p = cur
+
+            child = -1
+            size = fixed_size(ttype)
+            if size:
+                p += size
+            elif ttype == T_STRING or ttype == T_BINARY:
+                if p + 4 > end:
+                    return self.suspend(pos, cur, p + 4)
+                n = peek_i32(data + p)
+                if n < 0:
+                    raise TProtocolException(TProtocolException.NEGATIVE_SIZE)
+                p += 4 + n
+            elif ttype == T_SET or ttype == T_LIST:
+                if p + 5 > end:
+                    return self.suspend(pos, cur, p + 5)
+                v_type = <TType>data[p]
+                n = peek_i32(data + p + 1)
+                if n < 0:
+                    raise TProtocolException(TProtocolException.NEGATIVE_SIZE)
+                p += 5
+                size = fixed_size(v_type)
+                if size:
+                    p += n * size
+                elif n:
+                    child = SCAN_LIST
+                    k_type = v_type
+            elif ttype == T_MAP:
+                if p + 6 > end:
+                    return self.suspend(pos, cur, p + 6)
+                k_type = <TType>data[p]
+                v_type = <TType>data[p + 1]
+                n = peek_i32(data + p + 2)
+                if n < 0:
+                    raise TProtocolException(TProtocolException.NEGATIVE_SIZE)
+                p += 6
+                if n:
+                    child = SCAN_MAP
+            elif ttype == T_STRUCT:
+                child = SCAN_STRUCT
+                k_type = T_STOP
+                n = 0
+            else:
+                raise TProtocolException(TProtocolException.INVALID_DATA,
+                                         'Unknown type %d' % ttype)
+
+            if p > end:
+                return self.suspend(pos, cur, p)
+            if kind != SCAN_STRUCT:
+                self.remaining[i] -= 1
+            if child == SCAN_MAP:
+                self.push(child, k_type, v_type, 2 * <int64_t>n)
+            elif child >= 0:
+                self.push(child, k_type, T_STOP, n)
+            cur = p
+        return cur
+
+
+def scan_message(const unsigned char[::1] data, Py_ssize_t pos=0):
+    """Scan the binary message at `pos` of `data` without decoding it.
+
+    Returns `(name, type, seqid, start, end)`, the offsets of the struct of
+    the message and of its end, or None if `data` ends before the message.
+    """
+    return BinaryScanner().scan(data, pos)
 
 
 def write_val(CyTransportBase buf, TType ttype, val, spec=None):
@@ -468,14 +877,38 @@ cdef class TCyBinaryProtocol(object):
     cdef public bool strict_write
     cdef public bool decode_response
     cdef public bool strict_decode
+    cdef public bool binary_view
+    cdef int numeric_flags
 
     def __init__(self, trans, strict_read=True, strict_write=True,
-                 decode_response=True, strict_decode=False):
+                 decode_response=True, strict_decode=False,
+                 binary_view=False, numeric_list='list'):
         self.trans = trans
         self.strict_read = strict_read
         self.strict_write = strict_write
         self.decode_response = decode_response
         self.strict_decode = strict_decode
+        # decode binary fields as memoryviews over the buffer retained by
+        # the transport (if it supports `c_read_view`) instead of copies.
+        self.binary_view = binary_view
+        # decode list<i32>, list<i64> and list<double> in bulk into
+        # array.array ('array') or numpy arrays ('numpy').
+        self.numeric_list = numeric_list
+
+    @property
+    def numeric_list(self):
+        for k, v in NUMERIC_LISTS.items():
+            if v == self.numeric_flags:
+                return k
+
+    @numeric_list.setter
+    def numeric_list(self, value):
+        if value not in NUMERIC_LISTS:
+            raise ValueError('numeric_list should be one of %s'
+                             % ', '.join(map(repr, NUMERIC_LISTS)))
+        if value == 'numpy':
+            import numpy  # noqa, fail early if numpy is not installed
+        self.numeric_flags = NUMERIC_LISTS[value]
 
     def skip(self, ttype):
         skip(self.trans, <TType>(ttype))
@@ -520,10 +953,14 @@ cdef class TCyBinaryProtocol(object):
     def write_message_end(self):
         pass
 
-    def read_struct(self, obj):
+    def read_struct(self, obj, fields=None):
+        if fields is not None:
+            fields = normalize_fields(fields)
         try:
             return read_struct(self.trans, obj, self.decode_response,
-                               self.strict_decode)
+                               self.strict_decode, fields,
+                               self.numeric_flags |
+                               (BINARY_VIEW if self.binary_view else 0))
         except Exception:
             self.trans.clean()
             raise
@@ -538,13 +975,16 @@ cdef class TCyBinaryProtocol(object):
 
 class TCyBinaryProtocolFactory(object):
     def __init__(self, strict_read=True, strict_write=True,
-                 decode_response=True, strict_decode=False):
+                 decode_response=True, strict_decode=False,
+                 binary_view=False, numeric_list='list'):
         self.strict_read = strict_read
         self.strict_write = strict_write
         self.decode_response = decode_response
         self.strict_decode = strict_decode
+        self.binary_view = binary_view
+        self.numeric_list = numeric_list
 
     def get_protocol(self, trans):
         return TCyBinaryProtocol(
             trans, self.strict_read, self.strict_write, self.decode_response,
-            self.strict_decode)
+            self.strict_decode, self.binary_view, self.numeric_list)
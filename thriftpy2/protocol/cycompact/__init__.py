@@ -0,0 +1 @@
+from .cycompact import *
@@ -0,0 +1,671 @@
+# cython: freethreading_compatible = True
+
+from libc.stdint cimport int8_t, int16_t, int32_t, int64_t, uint8_t, uint32_t, uint64_t
+from libc.string cimport memcpy
+from cpython cimport bool, PyObject_GetBuffer, PyBuffer_Release, PyBUF_ANY_CONTIGUOUS, PyBUF_SIMPLE
+
+from thriftpy2.thrift import TDecodeException
+from thriftpy2.protocol.base import normalize_fields
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.transport.cybase cimport CyTransportBase, STACK_STRING_LEN
+
+cdef extern from "../cybin/endian_port.h":
+    int64_t htole64(int64_t n)
+    int64_t le64toh(int64_t n)
+
+DEF PROTOCOL_ID = 0x82
+DEF VERSION = 1
+DEF VERSION_MASK = 0x1f
+DEF TYPE_BITS = 0x07
+DEF TYPE_SHIFT_AMOUNT = 5
+
+ctypedef enum TType:
+    T_STOP = 0,
+    T_VOID = 1,
+    T_BOOL = 2,
+    T_BYTE = 3,
+    T_I08 = 3,
+    T_I16 = 6,
+    T_I32 = 8,
+    T_U64 = 9,
+    T_I64 = 10,
+    T_DOUBLE = 4,
+    T_STRING = 11,
+    T_UTF7 = 11,
+    T_NARY = 11
+    T_STRUCT = 12,
+    T_MAP = 13,
+    T_SET = 14,
+    T_LIST = 15,
+    T_UTF8 = 16,
+    T_UTF16 = 17,
+    T_BINARY = 18
+
+ctypedef enum CType:
+    C_STOP = 0x00,
+    C_TRUE = 0x01,
+    C_FALSE = 0x02,
+    C_BYTE = 0x03,
+    C_I16 = 0x04,
+    C_I32 = 0x05,
+    C_I64 = 0x06,
+    C_DOUBLE = 0x07,
+    C_BINARY = 0x08,
+    C_LIST = 0x09,
+    C_SET = 0x0A,
+    C_MAP = 0x0B,
+    C_STRUCT = 0x0C
+
+BIN_TYPES = (T_BINARY, T_STRING)
+
+
+cdef inline CType to_ctype(TType ttype) except? C_STOP:
+    if ttype == T_BOOL:
+        return C_TRUE
+    elif ttype == T_BYTE:
+        return C_BYTE
+    elif ttype == T_I16:
+        return C_I16
+    elif ttype == T_I32:
+        return C_I32
+    elif ttype == T_I64:
+        return C_I64
+    elif ttype == T_DOUBLE:
+        return C_DOUBLE
+    elif ttype == T_STRING or ttype == T_BINARY:
+        return C_BINARY
+    elif ttype == T_LIST:
+        return C_LIST
+    elif ttype == T_SET:
+        return C_SET
+    elif ttype == T_MAP:
+        return C_MAP
+    elif ttype == T_STRUCT:
+        return C_STRUCT
+    elif ttype == T_STOP:
+        return C_STOP
+    raise TProtocolException(TProtocolException.INVALID_DATA,
+                             "Unknown TType %d" % ttype)
+
+
+cdef inline TType to_ttype(uint8_t ctype) except? T_STOP:
+    ctype &= 0x0f
+    if ctype == C_TRUE or ctype == C_FALSE:
+        return T_BOOL
+    elif ctype == C_BYTE:
+        return T_BYTE
+    elif ctype == C_I16:
+        return T_I16
+    elif ctype == C_I32:
+        return T_I32
+    elif ctype == C_I64:
+        return T_I64
+    elif ctype == C_DOUBLE:
+        return T_DOUBLE
+    elif ctype == C_BINARY:
+        return T_BINARY
+    elif ctype == C_LIST:
+        return T_LIST
+    elif ctype == C_SET:
+        return T_SET
+    elif ctype == C_MAP:
+        return T_MAP
+    elif ctype == C_STRUCT:
+        return T_STRUCT
+    elif ctype == C_STOP:
+        return T_STOP
+    raise TProtocolException(TProtocolException.INVALID_DATA,
+                             "Unknown compact type %d" % ctype)
+
+
+cdef inline uint8_t read_ubyte(CyTransportBase buf) except? 0:
+    cdef uint8_t data = 0
+    buf.c_read(1, <char*>&data)
+    return data
+
+
+cdef inline uint64_t read_varint(CyTransportBase buf) except? 0:
+    cdef:
+        uint64_t result = 0
+        uint8_t byte
+        int shift = 0
+
+    while True:
+        byte = read_ubyte(buf)
+        result |= <uint64_t>(byte & 0x7f) << shift
+        if byte & 0x80 == 0:
+            return result
+        shift += 7
+        if shift > 63:
+            raise TProtocolException(TProtocolException.INVALID_DATA,
+                                     "Variable-length int over 10 bytes")
+
+
+cdef inline int64_t from_zig_zag(uint64_t n):
+    return <int64_t>(n >> 1) ^ -<int64_t>(n & 1)
+
+
+cdef inline int64_t read_int(CyTransportBase buf) except? -1:
+    return from_zig_zag(read_varint(buf))
+
+
+cdef inline int32_t read_size(CyTransportBase buf) except? -1:
+    cdef uint64_t size = read_varint(buf)
+    if size > 0x7fffffff:
+        raise TProtocolException(TProtocolException.NEGATIVE_SIZE,
+                                 "Length < 0")
+    return <int32_t>size
+
+
+cdef inline double read_double(CyTransportBase buf) except? -1:
+    cdef:
+        int64_t n
+        double value
+    buf.c_read(8, <char*>&n)
+    n = le64toh(n)
+    memcpy(&value, &n, 8)
+    return value
+
+
+cdef inline int write_ubyte(CyTransportBase buf, uint8_t val) except -1:
+    buf.c_write(<char*>&val, 1)
+    return 0
+
+
+cdef inline int write_varint(CyTransportBase buf, uint64_t n) except -1:
+    cdef:
+        char out[10]
+        int i = 0
+
+    while n & ~<uint64_t>0x7f:
+        out[i] = <char>((n & 0x7f) | 0x80)
+        n >>= 7
+        i += 1
+    out[i] = <char>n
+    buf.c_write(out, i + 1)
+    return 0
+
+
+cdef inline uint64_t to_zig_zag(int64_t n):
+    return (<uint64_t>n << 1) ^ <uint64_t>(n >> 63)
+
+
+cdef inline int write_int(CyTransportBase buf, int64_t n) except -1:
+    return write_varint(buf, to_zig_zag(n))
+
+
+cdef inline int write_double(CyTransportBase buf, double val) except -1:
+    cdef int64_t v
+    memcpy(&v, &val, 8)
+    v = htole64(v)
+    buf.c_write(<char*>&v, 8)
+    return 0
+
+
+cdef inline int write_field_header(CyTransportBase buf, uint8_t ctype,
+                                   int16_t fid, int16_t last_fid) except -1:
+    cdef int delta = fid - last_fid
+    if 0 < delta <= 15:
+        write_ubyte(buf, <uint8_t>(delta << 4 | ctype))
+    else:
+        write_ubyte(buf, ctype)
+        write_int(buf, fid)
+    return 0
+
+
+cdef inline int write_collection_begin(CyTransportBase buf, TType e_type,
+                                       int size) except -1:
+    if size <= 14:
+        write_ubyte(buf, <uint8_t>(size << 4 | to_ctype(e_type)))
+    else:
+        write_ubyte(buf, 0xf0 | to_ctype(e_type))
+        write_varint(buf, size)
+    return 0
+
+
+cdef inline write_list(CyTransportBase buf, object val, spec):
+    cdef TType e_type
+
+    if isinstance(spec, int):
+        e_type = spec
+        e_spec = None
+    else:
+        e_type = spec[0]
+        e_spec = spec[1]
+
+    write_collection_begin(buf, e_type, len(val))
+    for e_val in val:
+        c_write_val(buf, e_type, e_val, e_spec)
+
+
+cdef inline write_dict(CyTransportBase buf, object val, spec):
+    cdef TType k_type, v_type
+    cdef int val_len
+
+    key = spec[0]
+    if isinstance(key, int):
+        k_type = key
+        k_spec = None
+    else:
+        k_type = key[0]
+        k_spec = key[1]
+
+    value = spec[1]
+    if isinstance(value, int):
+        v_type = value
+        v_spec = None
+    else:
+        v_type = value[0]
+        v_spec = value[1]
+
+    val_len = len(val)
+    if val_len == 0:
+        write_ubyte(buf, 0)
+        return
+
+    write_varint(buf, val_len)
+    write_ubyte(buf, <uint8_t>(to_ctype(k_type) << 4 | to_ctype(v_type)))
+    for k, v in val.items():
+        c_write_val(buf, k_type, k, k_spec)
+        c_write_val(buf, v_type, v, v_spec)
+
+
+cdef inline write_string(CyTransportBase buf, bytes val):
+    cdef int val_len = len(val)
+    write_varint(buf, val_len)
+    buf.c_write_object(val, <char*>val, val_len)
+
+
+cdef inline write_buffer(CyTransportBase buf, val):
+    cdef Py_buffer in_buffer
+    PyObject_GetBuffer(val, &in_buffer, PyBUF_SIMPLE | PyBUF_ANY_CONTIGUOUS)
+    try:
+        write_varint(buf, in_buffer.len)
+        buf.c_write_object(val, <char *>in_buffer.buf, in_buffer.len)
+    finally:
+        PyBuffer_Release(&in_buffer)
+
+
+cdef c_write_val(CyTransportBase buf, TType ttype, val, spec=None):
+    if ttype == T_BOOL:
+        write_ubyte(buf, C_TRUE if val else C_FALSE)
+
+    elif ttype == T_I08:
+        write_ubyte(buf, <uint8_t><int8_t>val)
+
+    elif ttype == T_I16:
+        write_int(buf, <int16_t>val)
+
+    elif ttype == T_I32:
+        write_int(buf, <int32_t>val)
+
+    elif ttype == T_I64:
+        write_int(buf, <int64_t>val)
+
+    elif ttype == T_DOUBLE:
+        write_double(buf, val)
+
+    elif ttype == T_BINARY:
+        if isinstance(val, str):
+            val = val.encode()
+        write_buffer(buf, val)
+
+    elif ttype == T_STRING:
+        if not isinstance(val, bytes):
+            try:
+                val = val.encode("utf-8")
+            except Exception:
+                pass
+        write_string(buf, val)
+
+    elif ttype == T_SET or ttype == T_LIST:
+        write_list(buf, val, spec)
+
+    elif ttype == T_MAP:
+        write_dict(buf, val, spec)
+
+    elif ttype == T_STRUCT:
+        write_struct(buf, val)
+
+
+cdef write_struct(CyTransportBase buf, obj):
+    cdef int fid
+    cdef int16_t last_fid = 0
+    cdef TType f_type
+    cdef dict thrift_spec = obj.thrift_spec
+    cdef tuple field_spec
+    cdef str f_name
+
+    for fid, field_spec in thrift_spec.items():
+        f_type = field_spec[0]
+        f_name = field_spec[1]
+        if len(field_spec) <= 3:
+            container_spec = None
+        else:
+            container_spec = field_spec[2]
+
+        v = getattr(obj, f_name, None)
+        if v is None:
+            continue
+
+        try:
+            if f_type == T_BOOL:
+                # bool values are packed into the field header
+                write_field_header(buf, C_TRUE if v else C_FALSE, fid,
+                                   last_fid)
+            else:
+                write_field_header(buf, to_ctype(f_type), fid, last_fid)
+                c_write_val(buf, f_type, v, container_spec)
+        except (TypeError, AttributeError, AssertionError, OverflowError):
+            raise TDecodeException(obj.__class__.__name__, fid, f_name, v,
+                                   f_type, container_spec)
+        last_fid = fid
+
+    write_ubyte(buf, C_STOP)
+
+
+cdef inline c_read_binary(CyTransportBase buf, int32_t size):
+    return buf.get_string(size)
+
+
+cdef inline c_read_string(CyTransportBase buf, int32_t size,
+                          strict_decode=False):
+    py_data = c_read_binary(buf, size)
+    try:
+        return (<bytes>py_data).decode("utf-8")
+    except:  # noqa
+        if strict_decode:
+            raise
+        return py_data
+
+
+cdef read_struct(CyTransportBase buf, obj, decode_response=True,
+                 strict_decode=False, dict fields=None):
+    cdef dict field_specs = obj.thrift_spec
+    cdef int fid
+    cdef int16_t last_fid = 0
+    cdef uint8_t header, ctype
+    cdef TType field_type, ttype
+    cdef tuple field_spec
+    cdef str name
+
+    while True:
+        header = read_ubyte(buf)
+        ctype = header & 0x0f
+        if ctype == C_STOP:
+            break
+
+        if header >> 4 == 0:
+            fid = <int16_t>read_int(buf)
+        else:
+            fid = last_fid + (header >> 4)
+        last_fid = fid
+
+        field_type = to_ttype(ctype)
+        if fid not in field_specs or (fields is not None and
+                                      fid not in fields):
+            skip_val(buf, field_type, ctype)
+            continue
+
+        field_spec = field_specs[fid]
+        ttype = field_spec[0]
+        if field_type != ttype and not (ttype in BIN_TYPES and field_type in BIN_TYPES):
+            skip_val(buf, field_type, ctype)
+            continue
+
+        name = field_spec[1]
+        if field_type == T_BOOL:
+            setattr(obj, name, ctype == C_TRUE)
+            continue
+
+        if len(field_spec) <= 3:
+            spec = None
+        else:
+            spec = field_spec[2]
+
+        setattr(obj, name, c_read_val(
+            buf, ttype, spec, decode_response, strict_decode,
+            None if fields is None else fields[fid]))
+
+    return obj
+
+
+cdef c_read_val(CyTransportBase buf, TType ttype, spec=None,
+                decode_response=True, strict_decode=False,
+                dict fields=None):
+    cdef int32_t size
+    cdef uint8_t size_type, types
+    cdef TType v_type, k_type, orig_type, orig_key_type
+
+    if ttype == T_BOOL:
+        return read_ubyte(buf) == C_TRUE
+
+    elif ttype == T_I08:
+        return <int8_t>read_ubyte(buf)
+
+    elif ttype == T_I16 or ttype == T_I32 or ttype == T_I64:
+        return read_int(buf)
+
+    elif ttype == T_DOUBLE:
+        return read_double(buf)
+
+    elif ttype == T_BINARY:
+        size = read_size(buf)
+        return c_read_binary(buf, size)
+
+    elif ttype == T_STRING:
+        size = read_size(buf)
+        if decode_response:
+            return c_read_string(buf, size, strict_decode)
+        else:
+            return c_read_binary(buf, size)
+
+    elif ttype == T_SET or ttype == T_LIST:
+        if isinstance(spec, int):
+            v_type = spec
+            v_spec = None
+        else:
+            v_type = spec[0]
+            v_spec = spec[1]
+
+        size_type = read_ubyte(buf)
+        orig_type = to_ttype(size_type)
+        size = size_type >> 4
+        if size == 15:
+            size = read_size(buf)
+
+        if orig_type != v_type and not (orig_type in BIN_TYPES and v_type in BIN_TYPES):
+            for _ in range(size):
+                skip(buf, orig_type)
+            return []
+
+        return [c_read_val(buf, v_type, v_spec, decode_response, strict_decode,
+                           fields)
+                for _ in range(size)]
+
+    elif ttype == T_MAP:
+        key = spec[0]
+        if isinstance(key, int):
+            k_type = key
+            k_spec = None
+        else:
+            k_type = key[0]
+            k_spec = key[1]
+
+        value = spec[1]
+        if isinstance(value, int):
+            v_type = value
+            v_spec = None
+        else:
+            v_type = value[0]
+            v_spec = value[1]
+
+        size = read_size(buf)
+        if size == 0:
+            return {}
+
+        types = read_ubyte(buf)
+        orig_key_type = to_ttype(types >> 4)
+        orig_type = to_ttype(types)
+        if orig_key_type in BIN_TYPES:
+            orig_key_type = k_type
+        if orig_type in BIN_TYPES:
+            orig_type = v_type
+        if orig_key_type != k_type or orig_type != v_type:
+            for _ in range(size):
+                skip(buf, orig_key_type)
+                skip(buf, orig_type)
+            return {}
+
+        return {
+            c_read_val(buf, k_type, k_spec, decode_response, strict_decode):
+                c_read_val(buf, v_type, v_spec, decode_response, strict_decode,
+                           fields)
+            for _ in range(size)
+        }
+
+    elif ttype == T_STRUCT:
+        return read_struct(buf, spec(), decode_response, strict_decode,
+                           fields)
+
+
+cdef inline skip_binary(CyTransportBase buf, int32_t size):
+    cdef char string_val[STACK_STRING_LEN]
+    cdef int32_t n
+
+    while size > 0:
+        n = min(size, STACK_STRING_LEN)
+        buf.c_read(n, string_val)
+        size -= n
+
+
+cdef skip_val(CyTransportBase buf, TType ttype, uint8_t ctype):
+    # struct fields of type bool carry their value in the field header
+    if ttype != T_BOOL:
+        skip(buf, ttype)
+
+
+cpdef skip(CyTransportBase buf, TType ttype):
+    cdef TType v_type, k_type
+    cdef uint8_t header, size_type, types
+    cdef int32_t size
+
+    if ttype == T_BOOL or ttype == T_I08:
+        read_ubyte(buf)
+    elif ttype == T_I16 or ttype == T_I32 or ttype == T_I64:
+        read_varint(buf)
+    elif ttype == T_DOUBLE:
+        read_double(buf)
+    elif ttype == T_STRING or ttype == T_BINARY:
+        size = read_size(buf)
+        skip_binary(buf, size)
+    elif ttype == T_SET or ttype == T_LIST:
+        size_type = read_ubyte(buf)
+        v_type = to_ttype(size_type)
+        size = size_type >> 4
+        if size == 15:
+            size = read_size(buf)
+        for _ in range(size):
+            skip(buf, v_type)
+    elif ttype == T_MAP:
+        size = read_size(buf)
+        if size == 0:
+            return
+        types = read_ubyte(buf)
+        k_type = to_ttype(types >> 4)
+        v_type = to_ttype(types)
+        for _ in range(size):
+            skip(buf, k_type)
+            skip(buf, v_type)
+    elif ttype == T_STRUCT:
+        while 1:
+            header = read_ubyte(buf)
+            if header & 0x0f == C_STOP:
+                break
+            if header >> 4 == 0:
+                read_varint(buf)
+            skip_val(buf, to_ttype(header), header & 0x0f)
+
+
+def read_val(CyTransportBase buf, TType ttype, spec=None,
+             decode_response=True, strict_decode=False):
+    return c_read_val(buf, ttype, spec, decode_response, strict_decode)
+
+
+def write_val(CyTransportBase buf, TType ttype, val, spec=None):
+    c_write_val(buf, ttype, val, spec)
+
+
+cdef class TCyCompactProtocol(object):
+    cdef public CyTransportBase trans
+    cdef public bool decode_response
+    cdef public bool strict_decode
+
+    def __init__(self, trans, decode_response=True, strict_decode=False):
+        self.trans = trans
+        self.decode_response = decode_response
+        self.strict_decode = strict_decode
+
+    def skip(self, ttype):
+        skip(self.trans, <TType>(ttype))
+
+    def read_message_begin(self):
+        cdef uint8_t proto_id, ver_type
+        cdef int32_t size
+
+        proto_id = read_ubyte(self.trans)
+        if proto_id != PROTOCOL_ID:
+            raise TProtocolException(TProtocolException.BAD_VERSION,
+                                     'Bad protocol id in the message: %d'
+                                     % proto_id)
+
+        ver_type = read_ubyte(self.trans)
+        ttype = (ver_type >> TYPE_SHIFT_AMOUNT) & TYPE_BITS
+        version = ver_type & VERSION_MASK
+        if version != VERSION:
+            raise TProtocolException(TProtocolException.BAD_VERSION,
+                                     'Bad version: %d (expect %d)'
+                                     % (version, VERSION))
+        seqid = <int32_t>read_varint(self.trans)
+        size = read_size(self.trans)
+        name = c_read_string(self.trans, size)
+        return name, ttype, seqid
+
+    def read_message_end(self):
+        pass
+
+    def write_message_begin(self, name, TType ttype, int32_t seqid):
+        write_ubyte(self.trans, PROTOCOL_ID)
+        write_ubyte(self.trans, VERSION | (ttype << TYPE_SHIFT_AMOUNT))
+        write_varint(self.trans, <uint32_t>seqid)
+        c_write_val(self.trans, T_STRING, name)
+
+    def write_message_end(self):
+        pass
+
+    def read_struct(self, obj, fields=None):
+        if fields is not None:
+            fields = normalize_fields(fields)
+        try:
+            return read_struct(self.trans, obj, self.decode_response,
+                               self.strict_decode, fields)
+        except Exception:
+            self.trans.clean()
+            raise
+
+    def write_struct(self, obj):
+        try:
+            write_struct(self.trans, obj)
+        except Exception:
+            self.trans.clean()
+            raise
+
+
+class TCyCompactProtocolFactory(object):
+    def __init__(self, decode_response=True, strict_decode=False):
+        self.decode_response = decode_response
+        self.strict_decode = strict_decode
+
+    def get_protocol(self, trans):
+        return TCyCompactProtocol(
+            trans, self.decode_response, self.strict_decode)
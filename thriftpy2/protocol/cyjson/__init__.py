@@ -0,0 +1 @@
+from .cyjson import *
@@ -0,0 +1,690 @@
+# cython: freethreading_compatible = True
+
+from libc.stdio cimport snprintf
+from libc.string cimport memcmp, strlen
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from cpython.mem cimport PyMem_Free
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+
+import base64
+import json
+import struct
+from binascii import a2b_base64, b2a_base64
+from json.encoder import encode_basestring_ascii
+from warnings import warn
+
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.transport.cybase cimport TCyBuffer, DEFAULT_BUFFER
+
+cdef extern from "Python.h":
+    char *PyOS_double_to_string(double val, char format_code, int precision,
+                                int flags, int *type) except NULL
+    double PyOS_string_to_double(const char *s, char **endptr,
+                                 object overflow_exception) except? -1.0
+    int Py_DTSF_ADD_DOT_0
+    bint PyUnicode_IS_ASCII(object o)
+    void *PyUnicode_DATA(object o)
+    Py_ssize_t PyUnicode_GET_LENGTH(object o)
+
+ctypedef enum TType:
+    T_BOOL = 2,
+    T_BYTE = 3,
+    T_I16 = 6,
+    T_I32 = 8,
+    T_I64 = 10,
+    T_DOUBLE = 4,
+    T_STRING = 11,
+    T_STRUCT = 12,
+    T_MAP = 13,
+    T_SET = 14,
+    T_LIST = 15,
+    T_BINARY = 18
+
+DEF VERSION = 1
+
+cdef char *HEX_DIGITS = b"0123456789abcdef"
+
+_pack_len = struct.Struct('!I').pack
+_unpack_len = struct.Struct('!I').unpack
+
+
+# The output must be the same as `json.dumps` in protocol.json, with the
+# default separators and `ensure_ascii`.
+
+cdef inline write_raw(TCyBuffer buf, const char *data, int sz):
+    if buf.write(sz, data) == -1:
+        raise MemoryError("Write to buffer error")
+
+
+cdef write_string(TCyBuffer buf, s):
+    cdef:
+        const char *data
+        Py_ssize_t i, start = 0, n
+        unsigned char c
+        char esc[6]
+
+    if type(s) is not str:
+        s = str(s)
+
+    if not PyUnicode_IS_ASCII(s):
+        s = encode_basestring_ascii(s)
+        write_raw(buf, <const char*>PyUnicode_DATA(s), PyUnicode_GET_LENGTH(s))
+        return
+
+    data = <const char*>PyUnicode_DATA(s)
+    n = PyUnicode_GET_LENGTH(s)
+    write_raw(buf, b'"', 1)
+    for i in range(n):
+        c = <unsigned char>data[i]
+        if 0x20 <= c < 0x7f and c != b'"' and c != b'\\':
+            continue
+
+        write_raw(buf, data + start, i - start)
+        start = i + 1
+        esc[0] = b'\\'
+        if c == b'"' or c == b'\\':
+            esc[1] = c
+        elif c == b'\n':
+            esc[1] = b'n'
+        elif c == b'\r':
+            esc[1] = b'r'
+        elif c == b'\t':
+            esc[1] = b't'
+        elif c == b'\b':
+            esc[1] = b'b'
+        elif c == b'\f':
+            esc[1] = b'f'
+        else:
+            esc[1] = b'u'
+            esc[2] = b'0'
+            esc[3] = b'0'
+            esc[4] = HEX_DIGITS[c >> 4]
+            esc[5] = HEX_DIGITS[c & 0xf]
+            write_raw(buf, esc, 6)
+            continue
+        write_raw(buf, esc, 2)
+    write_raw(buf, data + start, n - start)
+    write_raw(buf, b'"', 1)
+
+
+cdef write_int(TCyBuffer buf, val):
+    cdef:
+        long long n
+        char out[32]
+        int size
+
+    if type(val) is not int:
+        val = int(val)
+
+    try:
+        n = val
+    except OverflowError:
+        data = repr(val).encode('ascii')
+        write_raw(buf, data, len(data))
+        return
+
+    size = snprintf(out, sizeof(out), "%lld", n)
+    write_raw(buf, out, size)
+
+
+cdef write_double(TCyBuffer buf, val):
+    cdef:
+        double d
+        char *out
+
+    if type(val) is not float:
+        val = float(val)
+    d = val
+
+    if d != d:
+        write_raw(buf, b'NaN', 3)
+    elif d == float('inf'):
+        write_raw(buf, b'Infinity', 8)
+    elif d == -float('inf'):
+        write_raw(buf, b'-Infinity', 9)
+    else:
+        out = PyOS_double_to_string(d, b'r', 0, Py_DTSF_ADD_DOT_0, NULL)
+        try:
+            write_raw(buf, out, strlen(out))
+        finally:
+            PyMem_Free(out)
+
+
+cdef write_binary(TCyBuffer buf, val):
+    cdef bytes data
+
+    if isinstance(val, str):
+        val = val.encode()
+    data = b2a_base64(val, newline=False)
+    write_raw(buf, b'"', 1)
+    write_raw(buf, PyBytes_AS_STRING(data), len(data))
+    write_raw(buf, b'"', 1)
+
+
+cdef inline split_spec(spec):
+    if isinstance(spec, int):
+        return spec, None
+    return spec[0], spec[1]
+
+
+cdef write_struct(TCyBuffer buf, obj):
+    cdef bint first = True
+
+    write_raw(buf, b'{', 1)
+    for field_spec in obj.thrift_spec.values():
+        name = field_spec[1]
+        v = getattr(obj, name)
+        if v is None:
+            continue
+
+        if first:
+            first = False
+        else:
+            write_raw(buf, b', ', 2)
+        write_string(buf, name)
+        write_raw(buf, b': ', 2)
+        c_write_val(buf, field_spec[0], v,
+                    field_spec[2] if len(field_spec) > 3 else None)
+    write_raw(buf, b'}', 1)
+
+
+cdef c_write_val(TCyBuffer buf, TType ttype, val, spec=None):
+    cdef bint first = True
+
+    if ttype == T_BYTE or ttype == T_I16 or ttype == T_I32 or \
+            ttype == T_I64:
+        write_int(buf, val)
+
+    elif ttype == T_DOUBLE:
+        write_double(buf, val)
+
+    elif ttype == T_STRING:
+        write_string(buf, val)
+
+    elif ttype == T_BOOL:
+        if val:
+            write_raw(buf, b'true', 4)
+        else:
+            write_raw(buf, b'false', 5)
+
+    elif ttype == T_STRUCT:
+        write_struct(buf, val)
+
+    elif ttype == T_SET or ttype == T_LIST:
+        e_type, e_spec = split_spec(spec)
+        write_raw(buf, b'[', 1)
+        for e in val:
+            if first:
+                first = False
+            else:
+                write_raw(buf, b', ', 2)
+            c_write_val(buf, e_type, e, e_spec)
+        write_raw(buf, b']', 1)
+
+    elif ttype == T_MAP:
+        k_type, k_spec = split_spec(spec[0])
+        v_type, v_spec = split_spec(spec[1])
+        write_raw(buf, b'[', 1)
+        for k, v in val.items():
+            if first:
+                first = False
+            else:
+                write_raw(buf, b', ', 2)
+            write_raw(buf, b'{"key": ', 8)
+            c_write_val(buf, k_type, k, k_spec)
+            write_raw(buf, b', "value": ', 11)
+            c_write_val(buf, v_type, v, v_spec)
+            write_raw(buf, b'}', 1)
+        write_raw(buf, b']', 1)
+
+    elif ttype == T_BINARY:
+        write_binary(buf, val)
+
+    else:
+        raise TProtocolException(
+            type=TProtocolException.INVALID_DATA,
+            message="Unknown TType {} for JSON serialization".format(ttype))
+
+
+# Decoding walks the JSON text with the thrift_spec of the struct, values
+# are converted as `obj_value` in protocol.json does.
+
+cdef struct Reader:
+    const char *data
+    Py_ssize_t pos
+    Py_ssize_t end
+
+
+cdef invalid(Reader *r, msg):
+    raise TProtocolException(
+        type=TProtocolException.INVALID_DATA,
+        message="{} at position {}".format(msg, r.pos))
+
+
+cdef inline void skip_ws(Reader *r):
+    cdef char c
+    while r.pos < r.end:
+        c = r.data[r.pos]
+        if c != b' ' and c != b'\t' and c != b'\n' and c != b'\r':
+            break
+        r.pos += 1
+
+
+cdef inline char peek(Reader *r) except? -1:
+    skip_ws(r)
+    if r.pos >= r.end:
+        invalid(r, "Unexpected end of JSON")
+    return r.data[r.pos]
+
+
+cdef inline int expect(Reader *r, char c) except -1:
+    if peek(r) != c:
+        invalid(r, "Expecting '{}'".format(chr(c)))
+    r.pos += 1
+    return 0
+
+
+cdef inline bint is_delimiter(char c):
+    return (c == b',' or c == b'}' or c == b']' or c == b':' or
+            c == b' ' or c == b'\t' or c == b'\n' or c == b'\r')
+
+
+cdef int scan_string(Reader *r, Py_ssize_t *start, Py_ssize_t *stop) except -1:
+    """Scan the string at the cursor, `start` and `stop` are set to the
+    offsets of its content, returns 1 if it contains escapes.
+    """
+    cdef:
+        Py_ssize_t i
+        int escaped = 0
+        char c
+
+    expect(r, b'"')
+    i = r.pos
+    while i < r.end:
+        c = r.data[i]
+        if c == b'"':
+            start[0] = r.pos
+            stop[0] = i
+            r.pos = i + 1
+            return escaped
+        if c == b'\\':
+            escaped = 1
+            i += 1
+        i += 1
+    invalid(r, "Unterminated string")
+
+
+cdef read_string(Reader *r):
+    cdef Py_ssize_t start, stop
+
+    if scan_string(r, &start, &stop):
+        return json.loads(r.data[start - 1:stop + 1])
+    return PyUnicode_DecodeUTF8(r.data + start, stop - start, NULL)
+
+
+cdef int skip_value(Reader *r) except -1:
+    cdef:
+        Py_ssize_t start, stop
+        int depth = 0
+        char c = peek(r)
+
+    if c == b'"':
+        scan_string(r, &start, &stop)
+        return 0
+
+    if c != b'{' and c != b'[':
+        while r.pos < r.end and not is_delimiter(r.data[r.pos]):
+            r.pos += 1
+        return 0
+
+    while r.pos < r.end:
+        c = r.data[r.pos]
+        if c == b'"':
+            scan_string(r, &start, &stop)
+            continue
+        if c == b'{' or c == b'[':
+            depth += 1
+        elif c == b'}' or c == b']':
+            depth -= 1
+            if depth == 0:
+                r.pos += 1
+                return 0
+        r.pos += 1
+    invalid(r, "Unexpected end of JSON")
+
+
+cdef read_generic(Reader *r):
+    cdef Py_ssize_t start
+
+    skip_ws(r)
+    start = r.pos
+    skip_value(r)
+    return json.loads(r.data[start:r.pos])
+
+
+cdef read_int(Reader *r):
+    cdef:
+        Py_ssize_t i
+        long long n = 0
+        int digits = 0
+        bint negative = False
+
+    i = r.pos
+    if i < r.end and r.data[i] == b'-':
+        negative = True
+        i += 1
+    while i < r.end and b'0' <= r.data[i] <= b'9' and digits < 18:
+        n = n * 10 + (r.data[i] - c'0')
+        digits += 1
+        i += 1
+
+    if digits == 0 or (i < r.end and not is_delimiter(r.data[i])):
+        return int(read_generic(r))
+
+    r.pos = i
+    return -n if negative else n
+
+
+cdef read_double(Reader *r):
+    cdef:
+        char *stop
+        double d
+
+    if r.data[r.pos] != b'"' and r.data[r.pos] != b'[' and \
+            r.data[r.pos] != b'{':
+        # the data is a bytes object, so it is NUL terminated
+        d = PyOS_string_to_double(r.data + r.pos, &stop, None)
+        if stop != r.data + r.pos and (
+                stop == r.data + r.end or is_delimiter(stop[0])):
+            r.pos = stop - r.data
+            return d
+    return float(read_generic(r))
+
+
+cdef read_binary(Reader *r):
+    cdef Py_ssize_t start, stop
+
+    if r.data[r.pos] == b'"':
+        if not scan_string(r, &start, &stop):
+            return a2b_base64(PyBytes_FromStringAndSize(r.data + start,
+                                                        stop - start))
+        return base64.b64decode(json.loads(r.data[start - 1:stop + 1]))
+    return base64.b64decode(read_generic(r))
+
+
+cdef read_map(Reader *r, spec):
+    cdef:
+        dict res = {}
+        bint has_key, has_value
+
+    k_type, k_spec = split_spec(spec[0])
+    v_type, v_spec = split_spec(spec[1])
+
+    expect(r, b'[')
+    if peek(r) == b']':
+        r.pos += 1
+        return res
+
+    while True:
+        has_key = has_value = False
+        expect(r, b'{')
+        if peek(r) != b'}':
+            while True:
+                name = read_string(r)
+                expect(r, b':')
+                if name == "key":
+                    k = c_read_val(r, k_type, k_spec)
+                    has_key = True
+                elif name == "value":
+                    v = c_read_val(r, v_type, v_spec)
+                    has_value = True
+                else:
+                    skip_value(r)
+                if peek(r) != b',':
+                    break
+                r.pos += 1
+        expect(r, b'}')
+        if not (has_key and has_value):
+            invalid(r, "Map entry without key or value")
+        res[k] = v
+
+        if peek(r) != b',':
+            break
+        r.pos += 1
+    expect(r, b']')
+    return res
+
+
+cdef read_list(Reader *r, spec):
+    cdef list res = []
+
+    e_type, e_spec = split_spec(spec)
+    expect(r, b'[')
+    if peek(r) == b']':
+        r.pos += 1
+        return res
+
+    while True:
+        res.append(c_read_val(r, e_type, e_spec))
+        if peek(r) != b',':
+            break
+        r.pos += 1
+    expect(r, b']')
+    return res
+
+
+cdef dict field_specs(obj):
+    """Map the field names to `(ttype, spec)`, cached on the class."""
+    cls = type(obj)
+    thrift_spec = obj.thrift_spec
+    cached = getattr(cls, '__thrift_json_fields__', None)
+    if cached is not None and cached[0] is thrift_spec:
+        return cached[1]
+
+    fields = {}
+    for field_spec in thrift_spec.values():
+        fields[field_spec[1]] = (
+            field_spec[0], field_spec[2] if len(field_spec) > 3 else None)
+    cls.__thrift_json_fields__ = (thrift_spec, fields)
+    return fields
+
+
+cdef read_struct(Reader *r, obj):
+    cdef dict fields = field_specs(obj)
+
+    expect(r, b'{')
+    if peek(r) == b'}':
+        r.pos += 1
+        return obj
+
+    while True:
+        name = read_string(r)
+        expect(r, b':')
+        f = fields.get(name)
+        if f is None:
+            skip_value(r)
+        else:
+            setattr(obj, name, c_read_val(r, f[0], f[1]))
+        if peek(r) != b',':
+            break
+        r.pos += 1
+    expect(r, b'}')
+    return obj
+
+
+cdef c_read_val(Reader *r, TType ttype, spec=None):
+    cdef char c = peek(r)
+
+    if ttype == T_BYTE or ttype == T_I16 or ttype == T_I32 or \
+            ttype == T_I64:
+        return read_int(r)
+
+    elif ttype == T_DOUBLE:
+        return read_double(r)
+
+    elif ttype == T_STRING:
+        if c == b'"':
+            return read_string(r)
+        return str(read_generic(r))
+
+    elif ttype == T_BOOL:
+        if r.end - r.pos >= 4 and memcmp(r.data + r.pos, b'true', 4) == 0:
+            r.pos += 4
+            return True
+        if r.end - r.pos >= 5 and memcmp(r.data + r.pos, b'false', 5) == 0:
+            r.pos += 5
+            return False
+        return bool(read_generic(r))
+
+    elif ttype == T_STRUCT:
+        return read_struct(r, spec())
+
+    elif ttype == T_SET or ttype == T_LIST:
+        return read_list(r, spec)
+
+    elif ttype == T_MAP:
+        return read_map(r, spec)
+
+    elif ttype == T_BINARY:
+        return read_binary(r)
+
+    raise TProtocolException(
+        type=TProtocolException.INVALID_DATA,
+        message="Unknown TType {} for JSON deserialization".format(ttype))
+
+
+def write_val(TType ttype, val, spec=None):
+    """Return the JSON encoding of a value, as `json_value` in
+    protocol.json followed by `json.dumps`."""
+    cdef TCyBuffer buf = TCyBuffer(DEFAULT_BUFFER)
+    c_write_val(buf, ttype, val, spec)
+    return buf.buf[buf.cur:buf.cur + buf.data_size]
+
+
+def read_val(bytes data, TType ttype, spec=None):
+    """Decode the JSON encoding of a value."""
+    cdef Reader r
+    r.data = data
+    r.pos = 0
+    r.end = len(data)
+    return c_read_val(&r, ttype, spec)
+
+
+cdef class TCyJSONProtocol(object):
+    """Cython implementation of the JSON protocol, see
+    protocol.json.TJSONProtocol for the format.
+    """
+
+    cdef public object trans
+    cdef dict _meta
+    cdef TCyBuffer buf
+    # the message being read and the offset of its payload, -1 if missing
+    cdef bytes _data
+    cdef Py_ssize_t _payload
+
+    def __init__(self, trans):
+        self.trans = trans
+        self._meta = {"version": VERSION}
+        self.buf = TCyBuffer(DEFAULT_BUFFER)
+        self._data = None
+
+    def _read_len(self):
+        return _unpack_len(self.trans.read(4))[0]
+
+    cdef _read_message(self):
+        cdef Reader r
+
+        size = self._read_len()
+        self._data = self.trans.read(size)
+        self._payload = -1
+        metadata = None
+
+        r.data = self._data
+        r.pos = 0
+        r.end = len(self._data)
+        expect(&r, b'{')
+        if peek(&r) != b'}':
+            while True:
+                name = read_string(&r)
+                expect(&r, b':')
+                if name == "metadata":
+                    metadata = read_generic(&r)
+                elif name == "payload":
+                    skip_ws(&r)
+                    self._payload = r.pos
+                    skip_value(&r)
+                else:
+                    skip_value(&r)
+                if peek(&r) != b',':
+                    break
+                r.pos += 1
+        expect(&r, b'}')
+        return metadata
+
+    def read_message_begin(self):
+        metadata = self._read_message()
+        if metadata is None:
+            raise TProtocolException(
+                type=TProtocolException.INVALID_DATA,
+                message="Missing metadata in read_message_begin")
+
+        version = int(metadata["version"])
+        if version != VERSION:
+            raise TProtocolException(
+                type=TProtocolException.BAD_VERSION,
+                message="Bad version in read_message_begin:{}".format(version))
+
+        return metadata["name"], metadata["ttype"], metadata["seqid"]
+
+    def read_message_end(self):
+        pass
+
+    def write_message_begin(self, name, ttype, seqid):
+        self._meta.update({"name": name, "ttype": ttype, "seqid": seqid})
+
+    def write_message_end(self):
+        pass
+
+    def read_struct(self, obj):
+        cdef Reader r
+
+        if self._data is None:
+            self._read_message()
+
+        try:
+            if self._payload < 0:
+                raise TProtocolException(
+                    type=TProtocolException.INVALID_DATA,
+                    message="Missing payload in read_struct")
+
+            r.data = self._data
+            r.pos = self._payload
+            r.end = len(self._data)
+            return read_struct(&r, obj)
+        finally:
+            self._data = None
+
+    def write_struct(self, obj):
+        cdef TCyBuffer buf = self.buf
+        cdef bytes meta = json.dumps(self._meta).encode('ascii')
+
+        buf.clean()
+        try:
+            write_raw(buf, b'{"metadata": ', 13)
+            write_raw(buf, meta, len(meta))
+            write_raw(buf, b', "payload": ', 13)
+            write_struct(buf, obj)
+            write_raw(buf, b'}', 1)
+
+            self.trans.write(_pack_len(buf.data_size) +
+                             buf.buf[buf.cur:buf.cur + buf.data_size])
+        finally:
+            buf.clean()
+
+    def skip(self, ttype):
+        warn("TJsonProtocol doesn't support skipping. Ignoring.")
+
+
+class TCyJSONProtocolFactory(object):
+    def get_protocol(self, trans):
+        return TCyJSONProtocol(trans)
@@ -0,0 +1,96 @@
+"""
+    thriftpy2.protocol.header
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    THeader protocol, see :mod:`thriftpy2.transport.header`. The messages
+    are encoded with the binary or compact protocol, as told by the header
+    or detected from the message.
+"""
+
+from typing import Dict, Iterable, Optional
+
+from ..thrift import TApplicationException
+from ..transport.header import (  # noqa
+    THeaderClientType,
+    THeaderSubprotocolID,
+    THeaderTransformID,
+    THeaderTransport,
+)
+from .binary import TBinaryProtocol
+from .compact import TCompactProtocol
+
+PROTOCOLS = {
+    THeaderSubprotocolID.BINARY: TBinaryProtocol,
+    THeaderSubprotocolID.COMPACT: TCompactProtocol,
+}
+
+
+class THeaderProtocol(object):
+    """Protocol of THeaderTransport, which wraps `trans` unless it is one
+    already.
+
+    `get_headers` returns the headers of the last message read, headers set
+    with `set_header` are sent with the next message written. The same
+    protocol must be used to read a request and write its reply, for the
+    reply to be written as the request was.
+    """
+
+    def __init__(self, trans, client_types: Optional[Iterable[int]] = None,
+                 default_protocol: int = THeaderSubprotocolID.BINARY,
+                 decode_response: bool = True):
+        if not isinstance(trans, THeaderTransport):
+            trans = THeaderTransport(trans, client_types, default_protocol)
+        self.trans = trans
+        self.decode_response = decode_response
+        self._protocols = {}
+        self._proto = self._get_protocol()
+
+    def __getattr__(self, name):
+        return getattr(self._proto, name)
+
+    def _get_protocol(self):
+        protocol_id = self.trans.protocol_id
+        proto = self._protocols.get(protocol_id)
+        if proto is None:
+            proto_cls = PROTOCOLS.get(protocol_id)
+            if proto_cls is None:
+                raise TApplicationException(
+                    TApplicationException.INVALID_PROTOCOL,
+                    "Unknown protocol {}".format(protocol_id))
+            proto = self._protocols[protocol_id] = proto_cls(
+                self.trans, decode_response=self.decode_response)
+        return proto
+
+    def get_headers(self) -> Dict[str, str]:
+        return self.trans.get_headers()
+
+    def set_header(self, key: str, value: str) -> None:
+        self.trans.set_header(key, value)
+
+    def clear_headers(self) -> None:
+        self.trans.clear_headers()
+
+    def add_transform(self, transform_id: int) -> None:
+        self.trans.add_transform(transform_id)
+
+    def read_message_begin(self):
+        self.trans.read_frame()
+        self._proto = self._get_protocol()
+        return self._proto.read_message_begin()
+
+    def write_message_begin(self, name, ttype, seqid):
+        self.trans.seqid = seqid
+        self._proto.write_message_begin(name, ttype, seqid)
+
+
+class THeaderProtocolFactory(object):
+    def __init__(self, client_types: Optional[Iterable[int]] = None,
+                 default_protocol: int = THeaderSubprotocolID.BINARY,
+                 decode_response: bool = True):
+        self.client_types = client_types
+        self.default_protocol = default_protocol
+        self.decode_response = decode_response
+
+    def get_protocol(self, trans):
+        return THeaderProtocol(trans, self.client_types,
+                               self.default_protocol, self.decode_response)
@@ -0,0 +1,200 @@
+"""
+    thriftpy2.protocol.lazy
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Lazy decoding of binary encoded structs.
+
+    A lazy payload only records where each of its fields is in the original
+    buffer, and decodes a field the first time it is accessed. If a lazy
+    payload is written back with the binary protocol without being touched,
+    the original bytes are copied as they are.
+"""
+
+from io import BytesIO
+from typing import Any, Dict, Tuple
+
+from thriftpy2._compat import CYTHON
+from ..thrift import TType, _hash_value
+from . import binary
+
+if CYTHON:
+    from .cybin import TCyBinaryProtocol, TCyBinaryProtocolFactory
+    from .cybin import read_val as cy_read_val, scan_struct as cy_scan_struct
+    from ..transport.memory import TCyMemoryBuffer
+
+    BINARY_PROTOCOLS = (binary.TBinaryProtocol, TCyBinaryProtocol)
+    BINARY_FACTORIES = (binary.TBinaryProtocolFactory,
+                        TCyBinaryProtocolFactory)
+else:
+    BINARY_PROTOCOLS = (binary.TBinaryProtocol, )
+    BINARY_FACTORIES = (binary.TBinaryProtocolFactory, )
+
+# field types whose decoded values may be mutated in place, handing one out
+# means the original bytes can no longer be trusted.
+MUTABLE_TYPES = (TType.STRUCT, TType.LIST, TType.SET, TType.MAP)
+
+
+def scan_struct(data: bytes, thrift_spec: Dict[int, tuple]
+                ) -> Tuple[Dict[int, Tuple[int, int]], int]:
+    """Find the `(start, end)` offsets of the fields of the binary encoded
+    struct at the start of `data`, see :func:`cybin.scan_struct`.
+    """
+    if CYTHON:
+        return cy_scan_struct(TCyMemoryBuffer(data), thrift_spec)
+
+    inbuf = BytesIO(data)
+    fields = {}
+    while True:
+        f_type, fid = binary.read_field_begin(inbuf)
+        if f_type == TType.STOP:
+            break
+
+        start = inbuf.tell()
+        binary.skip(inbuf, f_type)
+
+        f_spec = thrift_spec.get(fid)
+        if f_spec is None:
+            continue
+        if f_type != f_spec[0] and not (
+                f_type in binary.BIN_TYPES and f_spec[0] in binary.BIN_TYPES):
+            continue
+        fields[fid] = (start, inbuf.tell())
+    return fields, inbuf.tell()
+
+
+def _read_val(data, ttype, spec, decode_response, strict_decode):
+    if CYTHON:
+        return cy_read_val(TCyMemoryBuffer(data), ttype, decode_response,
+                           strict_decode, spec=spec)
+    return binary.read_val(BytesIO(data), ttype, spec, decode_response,
+                           strict_decode)
+
+
+class TLazyPayload(object):
+    """Mixin of the lazy payload classes, see `lazy_class`."""
+
+    __slots__ = ('_lazy_data', '_lazy_size', '_lazy_pending',
+                 '_lazy_decode_response', '_lazy_strict_decode',
+                 '_lazy_untouched')
+
+    def __getattr__(self, name):
+        if name.startswith('_lazy_'):
+            raise AttributeError(name)
+
+        entry = self._lazy_pending.pop(name, None)
+        if entry is None:
+            raise AttributeError("{} instance has no attribute '{}'".format(
+                self.__class__.__name__, name))
+
+        ttype, spec, start, end = entry
+        if ttype in MUTABLE_TYPES:
+            self._lazy_untouched = False
+        value = _read_val(self._lazy_data[start:end], ttype, spec,
+                          self._lazy_decode_response,
+                          self._lazy_strict_decode)
+        self.__dict__[name] = value
+        return value
+
+    def __setattr__(self, name, value):
+        if not name.startswith('_lazy_'):
+            self._lazy_pending.pop(name, None)
+            self._lazy_untouched = False
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if not name.startswith('_lazy_'):
+            self._lazy_pending.pop(name, None)
+            self._lazy_untouched = False
+        object.__delattr__(self, name)
+
+    def _lazy_materialize(self):
+        """Decode all the pending fields, keeping the thrift_spec order."""
+        if self._lazy_pending:
+            for name in list(self._lazy_pending):
+                getattr(self, name)
+            fields = {}
+            for f_spec in self.thrift_spec.values():
+                if f_spec[1] in self.__dict__:
+                    fields[f_spec[1]] = self.__dict__.pop(f_spec[1])
+            fields.update(self.__dict__)
+            self.__dict__.clear()
+            self.__dict__.update(fields)
+        # the decoded values may be mutated from now on
+        self._lazy_untouched = False
+
+    def write(self, oprot):
+        if self._lazy_untouched and isinstance(oprot, BINARY_PROTOCOLS):
+            data = self._lazy_data
+            if self._lazy_size != len(data):
+                data = data[:self._lazy_size]
+            oprot.trans.write(data)
+            return
+
+        self._lazy_materialize()
+        super(TLazyPayload, self).write(oprot)
+
+    def __repr__(self):
+        self._lazy_materialize()
+        return super(TLazyPayload, self).__repr__()
+
+    def __eq__(self, other):
+        self._lazy_materialize()
+        if isinstance(other, TLazyPayload):
+            other._lazy_materialize()
+        return isinstance(other, self._lazy_base) and \
+            self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        self._lazy_materialize()
+        return hash(self._lazy_base) ^ _hash_value(self.__dict__)
+
+    def __reduce__(self):
+        self._lazy_materialize()
+        return self._lazy_base, (), self.__dict__.copy()
+
+
+def lazy_class(cls: type) -> type:
+    """Return the lazy payload class of a struct class."""
+    lazy_cls = cls.__dict__.get('__thrift_lazy_class__')
+    if lazy_cls is None:
+        lazy_cls = type(cls)(cls.__name__, (TLazyPayload, cls), {
+            '__slots__': (),
+            '__module__': cls.__module__,
+            '__qualname__': cls.__qualname__,
+            '_lazy_base': cls,
+        })
+        cls.__thrift_lazy_class__ = lazy_cls
+    return lazy_cls
+
+
+def read_lazy_struct(obj: Any, data: bytes, decode_response: bool = True,
+                     strict_decode: bool = False) -> Any:
+    """Lazily read the binary encoded struct in `data`.
+
+    Returns an instance of the lazy class of `obj`'s class, fields not found
+    in `data` keep the values of `obj`.
+    """
+    data = bytes(data)
+    fields, size = scan_struct(data, obj.thrift_spec)
+
+    cls = type(obj)
+    lazy_obj = lazy_class(cls).__new__(lazy_class(cls))
+    pending = {}
+    for fid, (start, end) in fields.items():
+        f_spec = cls.thrift_spec[fid]
+        spec = f_spec[2] if len(f_spec) > 3 else None
+        pending[f_spec[1]] = (f_spec[0], spec, start, end)
+
+    object.__setattr__(lazy_obj, '_lazy_data', data)
+    object.__setattr__(lazy_obj, '_lazy_size', size)
+    object.__setattr__(lazy_obj, '_lazy_pending', pending)
+    object.__setattr__(lazy_obj, '_lazy_decode_response', decode_response)
+    object.__setattr__(lazy_obj, '_lazy_strict_decode', strict_decode)
+    object.__setattr__(lazy_obj, '_lazy_untouched', True)
+    lazy_obj.__dict__.update((name, value)
+                             for name, value in obj.__dict__.items()
+                             if name not in pending)
+    return lazy_obj
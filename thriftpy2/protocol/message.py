@@ -0,0 +1,494 @@
+"""
+    thriftpy2.protocol.message
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Push parsers of binary and compact messages, which don't do any I/O:
+    the bytes received are fed to the parser, which returns the messages
+    they complete. They can be used from `asyncio.Protocol.data_received`
+    or any other event loop.
+"""
+
+import struct
+from typing import Any, Callable, List, Optional, Tuple  # noqa
+
+from thriftpy2._compat import CYTHON
+from ..thrift import TType
+from ..transport import TMemoryBuffer
+from . import TBinaryProtocolFactory, TCompactProtocolFactory
+from .binary import VERSION_1, VERSION_MASK, TYPE_MASK
+from .compact import CompactType, TCompactProtocol
+from .exc import TProtocolException
+
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+MAX_DEPTH = 64
+
+_i32 = struct.Struct('!i')
+
+# (name, type, seqid, offset of the struct, offset of the end), or None if
+# the data ends before the message.
+ScanResult = Optional[Tuple[str, int, int, int, int]]
+
+_BINARY_SIZES = {
+    TType.BOOL: 1,
+    TType.BYTE: 1,
+    TType.I16: 2,
+    TType.I32: 4,
+    TType.I64: 8,
+    TType.DOUBLE: 8,
+}
+
+
+_COMPACT_SIZES = {
+    CompactType.TRUE: 1,
+    CompactType.FALSE: 1,
+    CompactType.BYTE: 1,
+    CompactType.DOUBLE: 8,
+}
+
+# kinds of the containers on the stack of a scanner
+_STRUCT, _LIST, _MAP = range(3)
+
+
+def _check_size(n):
+    if n < 0:
+        raise TProtocolException(TProtocolException.NEGATIVE_SIZE)
+    return n
+
+
+def _scan_varint(data, pos):
+    """Return the value of the varint at `pos` and the offset of its end,
+    -1 if `data` ends before it.
+    """
+    result = shift = 0
+    end = len(data)
+    while pos < end:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte >> 7 == 0:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise TProtocolException(TProtocolException.INVALID_DATA,
+                                     'Varint longer than 10 bytes')
+    return 0, -1
+
+
+class _Scanner(object):
+    """Scanner of a message, finding where it ends without decoding it.
+
+    `scan(data, pos)` returns `(name, type, seqid, start, end)`, the
+    offsets of the struct of the message at `pos` and of its end, or None
+    if `data` ends before the message. The scanner then remembers how far
+    it went, and the next `scan`, with more data of the same message
+    (which may have moved to another `pos`), goes on from there instead
+    of scanning the message again. `needed` is the size of the data from
+    `pos` that the next `scan` needs to get any further.
+
+    Values are scanned one at a time, along with the header of their
+    field and the size of their container, the containers being kept on
+    a stack.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the message scanned so far."""
+        self.header = None  # type: Optional[Tuple[str, int, int, int]]
+        self.stack = []  # type: List[List[int]]
+        self.cur = 0
+        self.needed = 0
+
+    def scan(self, data: Any, pos: int = 0) -> ScanResult:
+        if self.header is None:
+            header = self._scan_header(data, pos)
+            if header is None:
+                return None
+            name, ttype, seqid, start = header
+            self.header = (name, ttype, seqid, start - pos)
+            self.cur = start - pos
+            self.stack = [[_STRUCT, 0, 0, 0]]
+
+        end = self._scan_values(data, pos)
+        if end < 0:
+            return None
+        name, ttype, seqid, start = self.header
+        self.reset()
+        return name, ttype, seqid, pos + start, end
+
+    def _suspend(self, pos, cur, needed):
+        self.cur = cur - pos
+        self.needed = needed - pos
+        return -1
+
+    def _push(self, frame):
+        if len(self.stack) > MAX_DEPTH:
+            raise TProtocolException(TProtocolException.INVALID_DATA,
+                                     'Nesting deeper than %d' % MAX_DEPTH)
+        self.stack.append(frame)
+
+    def _scan_header(self, data, pos):
+        raise NotImplementedError
+
+    def _scan_values(self, data, pos):
+        raise NotImplementedError
+
+
+class _BinaryScanner(_Scanner):
+    """Scanner of binary messages, see `_Scanner`."""
+
+    def _scan_header(self, data, pos):
+        end = len(data)
+        self.needed = 4
+        if pos + 4 > end:
+            return None
+        size, = _i32.unpack_from(data, pos)
+        if size < 0:
+            if size & VERSION_MASK != VERSION_1:
+                raise TProtocolException(
+                    TProtocolException.BAD_VERSION,
+                    'Bad version %d' % (size & VERSION_MASK))
+            ttype = size & TYPE_MASK
+            self.needed = 8
+            if pos + 8 > end:
+                return None
+            name_end = pos + 8 + _check_size(
+                _i32.unpack_from(data, pos + 4)[0])
+            self.needed = name_end + 4 - pos
+            if name_end + 4 > end:
+                return None
+            name = bytes(data[pos + 8:name_end])
+        else:
+            # no version header, the size is the one of the name.
+            name_end = pos + 4 + size
+            self.needed = name_end + 5 - pos
+            if name_end + 5 > end:
+                return None
+            name = bytes(data[pos + 4:name_end])
+            ttype = data[name_end]
+            name_end += 1
+
+        seqid, = _i32.unpack_from(data, name_end)
+        return name.decode('utf-8'), ttype, seqid, name_end + 4
+
+    def _scan_values(self, data, pos):
+        end = len(data)
+        stack = self.stack
+        cur = pos + self.cur
+        while stack:
+            frame = stack[-1]
+            kind = frame[0]
+            if kind == _STRUCT:
+                if cur >= end:
+                    return self._suspend(pos, cur, cur + 1)
+                ttype = data[cur]
+                if ttype == TType.STOP:
+                    stack.pop()
+                    cur += 1
+                    continue
+                p = cur + 3
+            else:
+                if frame[3] == 0:
+                    stack.pop()
+                    continue
+                if kind == _LIST or frame[3] % 2 == 0:
+                    ttype = frame[1]
+                else:
+                    ttype = frame[2]
+                p = cur
+
+            child = None
+            size = _BINARY_SIZES.get(ttype)
+            if size is not None:
+                p += size
+            elif ttype in (TType.STRING, TType.BINARY):
+                if p + 4 > end:
+                    return self._suspend(pos, cur, p + 4)
+                p += 4 + _check_size(_i32.unpack_from(data, p)[0])
+            elif ttype in (TType.LIST, TType.SET):
+                if p + 5 > end:
+                    return self._suspend(pos, cur, p + 5)
+                v_type = data[p]
+                n = _check_size(_i32.unpack_from(data, p + 1)[0])
+                p += 5
+                size = _BINARY_SIZES.get(v_type)
+                if size is not None:
+                    p += n * size
+                elif n:
+                    child = [_LIST, v_type, 0, n]
+            elif ttype == TType.MAP:
+                if p + 6 > end:
+                    return self._suspend(pos, cur, p + 6)
+                k_type, v_type = data[p], data[p + 1]
+                n = _check_size(_i32.unpack_from(data, p + 2)[0])
+                p += 6
+                if n:
+                    child = [_MAP, k_type, v_type, 2 * n]
+            elif ttype == TType.STRUCT:
+                child = [_STRUCT, 0, 0, 0]
+            else:
+                raise TProtocolException(TProtocolException.INVALID_DATA,
+                                         'Unknown type %d' % ttype)
+
+            if p > end:
+                return self._suspend(pos, cur, p)
+            if kind != _STRUCT:
+                frame[3] -= 1
+            if child is not None:
+                self._push(child)
+            cur = p
+        return cur
+
+
+class CompactScanner(_Scanner):
+    """Scanner of compact messages, see `_Scanner`."""
+
+    def _scan_header(self, data, pos):
+        end = len(data)
+        self.needed = 2
+        if pos + 2 > end:
+            return None
+        if data[pos] != TCompactProtocol.PROTOCOL_ID:
+            raise TProtocolException(TProtocolException.BAD_VERSION,
+                                     'Bad protocol id in the message: %d'
+                                     % data[pos])
+        ver_type = data[pos + 1]
+        if ver_type & TCompactProtocol.VERSION_MASK != \
+                TCompactProtocol.VERSION:
+            raise TProtocolException(
+                TProtocolException.BAD_VERSION,
+                'Bad version: %d (expect %d)'
+                % (ver_type & TCompactProtocol.VERSION_MASK,
+                   TCompactProtocol.VERSION))
+        ttype = (ver_type >> TCompactProtocol.TYPE_SHIFT_AMOUNT) & \
+            TCompactProtocol.TYPE_BITS
+
+        self.needed = end + 1 - pos
+        seqid, p = _scan_varint(data, pos + 2)
+        if p < 0:
+            return None
+        name_size, p = _scan_varint(data, p)
+        if p < 0:
+            return None
+        self.needed = p + name_size - pos
+        if p + name_size > end:
+            return None
+        name = bytes(data[p:p + name_size])
+        return name.decode('utf-8'), ttype, seqid, p + name_size
+
+    def _scan_values(self, data, pos):
+        end = len(data)
+        stack = self.stack
+        cur = pos + self.cur
+        while stack:
+            frame = stack[-1]
+            kind = frame[0]
+            if kind == _STRUCT:
+                if cur >= end:
+                    return self._suspend(pos, cur, cur + 1)
+                f_type = data[cur]
+                ctype = f_type & 0x0f
+                p = cur + 1
+                if ctype == CompactType.STOP:
+                    stack.pop()
+                    cur = p
+                    continue
+                if f_type >> 4 == 0:
+                    # the field id is a varint instead of a delta.
+                    _, p = _scan_varint(data, p)
+                    if p < 0:
+                        return self._suspend(pos, cur, end + 1)
+            else:
+                if frame[3] == 0:
+                    stack.pop()
+                    continue
+                if kind == _LIST or frame[3] % 2 == 0:
+                    ctype = frame[1]
+                else:
+                    ctype = frame[2]
+                p = cur
+
+            child = None
+            if ctype in (CompactType.TRUE, CompactType.FALSE):
+                # the value of a boolean field is in its type.
+                if kind != _STRUCT:
+                    p += 1
+            elif ctype == CompactType.BYTE:
+                p += 1
+            elif ctype == CompactType.DOUBLE:
+                p += 8
+            elif ctype in (CompactType.I16, CompactType.I32,
+                           CompactType.I64):
+                _, p = _scan_varint(data, p)
+                if p < 0:
+                    return self._suspend(pos, cur, end + 1)
+            elif ctype == CompactType.BINARY:
+                n, p = _scan_varint(data, p)
+                if p < 0:
+                    return self._suspend(pos, cur, end + 1)
+                p += n
+            elif ctype in (CompactType.LIST, CompactType.SET):
+                if p >= end:
+                    return self._suspend(pos, cur, p + 1)
+                n, v_type = data[p] >> 4, data[p] & 0x0f
+                p += 1
+                if n == 15:
+                    n, p = _scan_varint(data, p)
+                    if p < 0:
+                        return self._suspend(pos, cur, end + 1)
+                size = _COMPACT_SIZES.get(v_type)
+                if size is not None:
+                    p += n * size
+                elif n:
+                    child = [_LIST, v_type, 0, n]
+            elif ctype == CompactType.MAP:
+                n, p = _scan_varint(data, p)
+                if p < 0:
+                    return self._suspend(pos, cur, end + 1)
+                if n:
+                    if p >= end:
+                        return self._suspend(pos, cur, p + 1)
+                    child = [_MAP, data[p] >> 4, data[p] & 0x0f, 2 * n]
+                    p += 1
+            elif ctype == CompactType.STRUCT:
+                child = [_STRUCT, 0, 0, 0]
+            else:
+                raise TProtocolException(TProtocolException.INVALID_DATA,
+                                         'Unknown type %d' % ctype)
+
+            if p > end:
+                return self._suspend(pos, cur, p)
+            if kind != _STRUCT:
+                frame[3] -= 1
+            if child is not None:
+                self._push(child)
+            cur = p
+        return cur
+
+
+def _scan_binary_message(data: Any, pos: int = 0) -> ScanResult:
+    """Scan the binary message at `pos` of `data` without decoding it."""
+    return _BinaryScanner().scan(data, pos)
+
+
+def scan_compact_message(data: Any, pos: int = 0) -> ScanResult:
+    """Scan the compact message at `pos` of `data` without decoding it."""
+    return CompactScanner().scan(data, pos)
+
+
+if CYTHON:
+    from .cybin import BinaryScanner, scan_message as scan_binary_message
+else:
+    BinaryScanner = _BinaryScanner
+    scan_binary_message = _scan_binary_message
+
+
+class TMessageParser(object):
+    """Push parser of binary messages, decoded with `proto_factory`'s
+    protocol (the Cython binary one by default).
+
+    `feed` takes the bytes received and returns the messages they complete
+    as `(name, type, seqid, payload)` tuples, `payload` being the encoded
+    struct of the arguments or the result, to be read with `decode`.
+    `encode` encodes a message to be sent. With `framed`, the messages are
+    prefixed with their size, as TFramedTransport does. A message larger
+    than `max_message_size` raises a TProtocolException.
+    """
+
+    scanner_class = BinaryScanner  # type: Callable[[], Any]
+    default_proto_factory = TBinaryProtocolFactory
+
+    def __init__(self, proto_factory: Any = None, framed: bool = False,
+                 max_message_size: int = MAX_MESSAGE_SIZE) -> None:
+        self.proto_factory = proto_factory or self.default_proto_factory()
+        self.framed = framed
+        self.max_message_size = max_message_size
+        self._buf = bytearray()
+        self._pos = 0
+        self._scanner = self.scanner_class()
+
+    def feed(self, data: bytes) -> List[Tuple[str, int, int, bytes]]:
+        self._buf += data
+        messages = []
+        while True:
+            message = self._next_message()
+            if message is None:
+                break
+            messages.append(message)
+
+        if self._pos:
+            del self._buf[:self._pos]
+            self._pos = 0
+        return messages
+
+    def _next_message(self) -> Optional[Tuple[str, int, int, bytes]]:
+        buf, pos = self._buf, self._pos
+        if not self.framed:
+            # the scanner goes on from where it stopped, once there is
+            # enough data for it to get any further. The size it needs
+            # for that is checked too, it may be declared by a value.
+            self._check_size(max(len(buf) - pos, self._scanner.needed))
+            if len(buf) - pos < self._scanner.needed:
+                return None
+            result = self._scanner.scan(buf, pos)
+            if result is None:
+                self._check_size(self._scanner.needed)
+                return None
+            name, ttype, seqid, start, end = result
+            self._check_size(end - pos)
+            self._pos = end
+            return name, ttype, seqid, bytes(buf[start:end])
+
+        if len(buf) - pos < 4:
+            return None
+        size, = _i32.unpack_from(buf, pos)
+        if size < 0:
+            raise TProtocolException(TProtocolException.NEGATIVE_SIZE,
+                                     'Negative frame size %d' % size)
+        self._check_size(size)
+        if len(buf) - pos - 4 < size:
+            return None
+
+        frame = bytes(buf[pos + 4:pos + 4 + size])
+        self._pos = pos + 4 + size
+        result = self._scanner.scan(frame)
+        if result is None:
+            self._scanner.reset()
+            raise TProtocolException(TProtocolException.INVALID_DATA,
+                                     'Frame ends before its message')
+        name, ttype, seqid, start, end = result
+        return name, ttype, seqid, frame[start:end]
+
+    def _check_size(self, size: int) -> None:
+        if size > self.max_message_size:
+            raise TProtocolException(TProtocolException.SIZE_LIMIT,
+                                     'Message larger than %d bytes'
+                                     % self.max_message_size)
+
+    def decode(self, payload: bytes, obj: Any) -> Any:
+        """Read the struct `obj` from the payload of a message."""
+        proto = self.proto_factory.get_protocol(TMemoryBuffer(payload))
+        proto.read_struct(obj)
+        return obj
+
+    def encode(self, name: str, ttype: int, seqid: int, obj: Any) -> bytes:
+        """Encode a message of struct `obj`, e.g. the `_args` or the
+        `_result` of an API.
+        """
+        buf = TMemoryBuffer()
+        proto = self.proto_factory.get_protocol(buf)
+        proto.write_message_begin(name, ttype, seqid)
+        proto.write_struct(obj)
+        proto.write_message_end()
+        data = buf.getvalue()
+        if self.framed:
+            return _i32.pack(len(data)) + data
+        return data
+
+
+class TCompactMessageParser(TMessageParser):
+    """Push parser of compact messages, see TMessageParser."""
+
+    scanner_class = CompactScanner
+    default_proto_factory = TCompactProtocolFactory
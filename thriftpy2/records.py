@@ -0,0 +1,214 @@
+"""
+    thriftpy2.records
+    ~~~~~~~~~~~~~~~~~
+
+    Record files: length prefixed streams of serialized structs, see
+    :func:`thriftpy2.utils.iter_serialize`.
+
+    The reader memory maps the file, so records are iterated over without
+    reading the whole file, and an optional sidecar index of the record
+    offsets (``<path>.idx``, 8 bytes big endian per record) gives random
+    access to record N.
+"""
+
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Any, Callable, Iterable, Iterator
+
+from .protocol.base import TProtocolFactory
+from .protocol.binary import TBinaryProtocolFactory
+from .transport import TMemoryBuffer
+from .utils import _iter_spans, _pack_length
+
+INDEX_SUFFIX = '.idx'
+
+_pack_offset = struct.Struct('!q').pack
+
+
+def _index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def _read_index(path: str) -> array:
+    offsets = array('q')
+    with open(path, 'rb') as f:
+        offsets.frombytes(f.read())
+    if sys.byteorder == 'little':
+        offsets.byteswap()
+    return offsets
+
+
+def _scan_offsets(path: str) -> array:
+    offsets = array('q')
+    if os.path.getsize(path) == 0:
+        return offsets
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        with memoryview(m) as view:
+            offsets.extend(start - 4 for start, _ in _iter_spans(view))
+    return offsets
+
+
+def build_index(path: str) -> int:
+    """(Re)build the sidecar index of the record file at `path`, returns
+    the number of records.
+    """
+    offsets = _scan_offsets(path)
+    if sys.byteorder == 'little':
+        offsets.byteswap()
+    with open(_index_path(path), 'wb') as f:
+        offsets.tofile(f)
+    return len(offsets)
+
+
+class TRecordFileReader(object):
+    """Read the records of a record file.
+
+    Raw records are memoryviews over the mapped file, they must be released
+    (or dropped) before the reader is closed.
+    """
+
+    def __init__(self, path: str, thrift_class: Callable[[], Any],
+                 proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                 use_index: bool = True):
+        """If `use_index` is True the sidecar index is used when it exists,
+        otherwise the offsets are scanned at the first random access.
+        """
+        self.path = path
+        self.thrift_class = thrift_class
+        self.proto_factory = proto_factory
+
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._mmap = mmap.mmap(f.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+            else:
+                # empty files can't be mapped
+                self._mmap = None
+        self._view = memoryview(self._mmap if self._mmap is not None
+                                else b'')
+
+        self._offsets = None
+        if use_index and os.path.exists(_index_path(path)):
+            self._offsets = _read_index(_index_path(path))
+
+    @property
+    def offsets(self) -> array:
+        """Offsets of the records in the file."""
+        if self._offsets is None:
+            self._offsets = _scan_offsets(self.path)
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def raw(self, n: int) -> memoryview:
+        """Return the raw record N."""
+        pos = self.offsets[n]
+        start, end = next(_iter_spans(self._view, pos))
+        return self._view[start:end]
+
+    def iter_raw(self, start: int = 0) -> Iterator[memoryview]:
+        """Iterate over the raw records, from record `start`."""
+        pos = self.offsets[start] if start else 0
+        view = self._view
+        for begin, end in _iter_spans(view, pos):
+            yield view[begin:end]
+
+    def __getitem__(self, n: int) -> Any:
+        thrift_object = self.thrift_class()
+        with self.raw(n) as view:
+            transport = TMemoryBuffer(view)
+        thrift_object.read(self.proto_factory.get_protocol(transport))
+        return thrift_object
+
+    def iter_objects(self, start: int = 0) -> Iterator[Any]:
+        """Iterate over the deserialized records, from record `start`,
+        reusing one buffer and protocol.
+        """
+        transport = TMemoryBuffer()
+        protocol = self.proto_factory.get_protocol(transport)
+        for view in self.iter_raw(start):
+            with view:
+                transport.setvalue(view)
+            thrift_object = self.thrift_class()
+            thrift_object.read(protocol)
+            yield thrift_object
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.iter_objects()
+
+    def close(self) -> None:
+        self._view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class TRecordFileWriter(object):
+    """Append records to a record file, through a buffered file."""
+
+    def __init__(self, path: str,
+                 proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                 index: bool = False,
+                 buffer_size: int = io.DEFAULT_BUFFER_SIZE):
+        """If `index` is True the sidecar index is kept up to date, it is
+        built first if the file has records but no index yet.
+        """
+        self.path = path
+        self.proto_factory = proto_factory
+
+        self._file = open(path, 'ab', buffering=buffer_size)
+        self._offset = self._file.tell()
+        self._index = None
+        if index:
+            if self._offset and not os.path.exists(_index_path(path)):
+                build_index(path)
+            self._index = open(_index_path(path), 'ab')
+
+        self._transport = TMemoryBuffer()
+        self._protocol = proto_factory.get_protocol(self._transport)
+
+    def write(self, thrift_object: Any) -> None:
+        thrift_object.write(self._protocol)
+        self._protocol.write_message_end()
+        data = self._transport.getvalue()
+        self._transport.setvalue(b'')
+        self.write_raw(data)
+
+    def write_many(self, thrift_objects: Iterable[Any]) -> None:
+        for thrift_object in thrift_objects:
+            self.write(thrift_object)
+
+    def write_raw(self, data: bytes) -> None:
+        """Append an already serialized record."""
+        if self._index is not None:
+            self._index.write(_pack_offset(self._offset))
+        self._file.write(_pack_length(len(data)))
+        self._file.write(data)
+        self._offset += 4 + len(data)
+
+    def flush(self) -> None:
+        self._file.flush()
+        if self._index is not None:
+            self._index.flush()
+
+    def close(self) -> None:
+        self._file.close()
+        if self._index is not None:
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
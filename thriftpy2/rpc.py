@@ -1,33 +1,36 @@
 import contextlib
+import functools
+import select
 import socket
 import ssl
+import threading
+import time
 import types
 import urllib.parse
 import warnings
-from typing import Generator, Optional
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generator, Optional, Type  # noqa
 
 from thriftpy2.contrib.aio.rpc import make_client as make_aio_client  # noqa
 from thriftpy2.contrib.aio.rpc import make_server as make_aio_server  # noqa
 from thriftpy2.protocol import TBinaryProtocolFactory
 from thriftpy2.protocol.base import TProtocolFactory
-from thriftpy2.server import TThreadedServer
-from thriftpy2.thrift import TClient, TProcessor
+from thriftpy2.protocol.exc import TProtocolException
+from thriftpy2.server import TServer, TThreadedServer
+from thriftpy2.thrift import (TClient, TDecodeException, TException,
+                              TProcessor)
 from thriftpy2.transport import (TBufferedTransportFactory, TServerSocket,
-                                 TSocket, TSSLServerSocket, TSSLSocket)
+                                 TSocket, TSSLServerSocket, TSSLSocket,
+                                 TTransportException)
 from thriftpy2.transport.base import TTransportFactory
 
 
-def make_client(service: types.ModuleType, host: str = "localhost",
-                port: int = 9090, unix_socket: Optional[str] = None,
-                proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
-                trans_factory: TTransportFactory = TBufferedTransportFactory(),
-                timeout: int = 3000, cafile: Optional[str] = None,
-                ssl_context: Optional[ssl.SSLContext] = None,
-                certfile: Optional[str] = None,
-                keyfile: Optional[str] = None,
-                url: str = "",
-                socket_family: socket.AddressFamily = socket.AF_INET
-                ) -> TClient:
+def _client_socket(host: str, port: int, unix_socket: Optional[str],
+                   timeout: int, cafile: Optional[str],
+                   ssl_context: Optional[ssl.SSLContext],
+                   certfile: Optional[str], keyfile: Optional[str],
+                   url: str, socket_family: socket.AddressFamily
+                   ) -> TSocket:
     if url:
         parsed_url = urllib.parse.urlparse(url)
         host = parsed_url.hostname or host
@@ -55,7 +58,23 @@ def make_client(service: types.ModuleType, host: str = "localhost",
     else:
         raise ValueError("Either host/port or unix_socket"
                          " or url must be provided.")
+    return client_socket
+
 
+def make_client(service: types.ModuleType, host: str = "localhost",
+                port: int = 9090, unix_socket: Optional[str] = None,
+                proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                trans_factory: TTransportFactory = TBufferedTransportFactory(),
+                timeout: int = 3000, cafile: Optional[str] = None,
+                ssl_context: Optional[ssl.SSLContext] = None,
+                certfile: Optional[str] = None,
+                keyfile: Optional[str] = None,
+                url: str = "",
+                socket_family: socket.AddressFamily = socket.AF_INET
+                ) -> TClient:
+    client_socket = _client_socket(host, port, unix_socket, timeout, cafile,
+                                   ssl_context, certfile, keyfile, url,
+                                   socket_family)
     transport = trans_factory.get_transport(client_socket)
     protocol = proto_factory.get_protocol(transport)
     transport.open()
@@ -69,8 +88,15 @@ def make_server(service: types.ModuleType, handler: object,
                 trans_factory: TTransportFactory = TBufferedTransportFactory(),
                 client_timeout: int = 3000,
                 certfile: Optional[str] = None,
-                socket_family: socket.AddressFamily = socket.AF_INET
-                ) -> TThreadedServer:
+                socket_family: socket.AddressFamily = socket.AF_INET,
+                server_class: Type[TServer] = TThreadedServer,
+                **server_kwargs: Any
+                ) -> TServer:
+    """Make a server of `server_class` (a thread per connection by
+    default, TThreadPoolServer for a bounded pool, TNonblockingServer for
+    framed clients), `server_kwargs` are passed to it, e.g. `threads` and
+    `queue_timeout` of TThreadPoolServer.
+    """
     processor = TProcessor(service, handler)
 
     if unix_socket:
@@ -89,9 +115,9 @@ def make_server(service: types.ModuleType, handler: object,
     else:
         raise ValueError("Either host/port or unix_socket must be provided.")
 
-    server = TThreadedServer(processor, server_socket,
-                             iprot_factory=proto_factory,
-                             itrans_factory=trans_factory)
+    server = server_class(processor, server_socket,
+                          iprot_factory=proto_factory,
+                          itrans_factory=trans_factory, **server_kwargs)
     return server
 
 
@@ -161,3 +187,226 @@ def client_context(service: types.ModuleType, host: str = "localhost",
 
     finally:
         transport.close()
+
+
+def _is_readable(sock: socket.socket) -> bool:
+    if hasattr(select, "poll"):
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        return bool(poller.poll(0))
+    readable, _, _ = select.select([sock], [], [], 0)
+    return bool(readable)
+
+
+class _PooledClient(object):
+    __slots__ = ("client", "sock", "transport", "released_at")
+
+    def __init__(self, client: TClient, sock: TSocket,
+                 transport: Any) -> None:
+        self.client = client
+        self.sock = sock
+        self.transport = transport
+        self.released_at = time.monotonic()
+
+
+class ClientPool(object):
+    """Thread-safe pool of at most `max_size` clients of `service`, the
+    other arguments up to `socket_family` are the ones of make_client.
+
+    `connection()` checks out a client, waiting for one for up to
+    `wait_timeout` seconds (forever if None) when all of them are in use.
+    A checked out client is reconnected if it has been idle for more than
+    `idle_timeout` seconds, if its server closed the connection, or if
+    `health_check(client)` returns False or raises. A client which raises
+    anything but a thrift exception (e.g. a TTransportException) is closed
+    and replaced by a new one on next checkout. The APIs of `service`
+    (but `close`, `connection` and `stats`) may also be called on the pool
+    directly, each call checks out a client.
+    """
+
+    def __init__(self, service: types.ModuleType, host: str = "localhost",
+                 port: int = 9090, unix_socket: Optional[str] = None,
+                 proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                 trans_factory: TTransportFactory = TBufferedTransportFactory(),
+                 timeout: int = 3000, cafile: Optional[str] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 certfile: Optional[str] = None,
+                 keyfile: Optional[str] = None,
+                 url: str = "",
+                 socket_family: socket.AddressFamily = socket.AF_INET,
+                 max_size: int = 10,
+                 idle_timeout: Optional[float] = 60.0,
+                 wait_timeout: Optional[float] = None,
+                 health_check: Optional[Callable[[TClient], bool]] = None
+                 ) -> None:
+        self.service = service
+        self.proto_factory = proto_factory
+        self.trans_factory = trans_factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self.health_check = health_check
+        self._socket_args = (host, port, unix_socket, timeout, cafile,
+                             ssl_context, certfile, keyfile, url,
+                             socket_family)
+
+        self.closed = False
+        self._cond = threading.Condition()
+        # most recently released last, to reuse the warmest client first.
+        self._idle = deque()  # type: Deque[_PooledClient]
+        self._size = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def __getattr__(self, _api: str) -> functools.partial:
+        if _api in self.service.thrift_services:
+            return functools.partial(self._call, _api)
+        raise AttributeError("{} instance has no attribute '{}'".format(
+            self.__class__.__name__, _api))
+
+    def _call(self, _api: str, *args: Any, **kwargs: Any) -> Any:
+        with self.connection() as client:
+            return getattr(client, _api)(*args, **kwargs)
+
+    @contextlib.contextmanager
+    def connection(self) -> Generator[TClient, None, None]:
+        pooled = self._checkout()
+        try:
+            yield pooled.client
+        except (TTransportException, TProtocolException, TDecodeException):
+            # the reply may have been read in part.
+            self._discard(pooled)
+            raise
+        except TException:
+            # declared exceptions and TApplicationException are read whole,
+            # the connection is still usable.
+            self._release(pooled)
+            raise
+        except BaseException:
+            self._discard(pooled)
+            raise
+        self._release(pooled)
+
+    def _checkout(self) -> _PooledClient:
+        start = time.monotonic()
+        while True:
+            pooled = None
+            with self._cond:
+                self._waiting += 1
+                try:
+                    while not self._idle and self._size >= self.max_size:
+                        if self.closed:
+                            break
+                        remaining = None
+                        if self.wait_timeout is not None:
+                            remaining = start + self.wait_timeout - \
+                                time.monotonic()
+                            if remaining <= 0:
+                                raise TTransportException(
+                                    TTransportException.TIMED_OUT,
+                                    "No client available after {}s".format(
+                                        self.wait_timeout))
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                if self.closed:
+                    raise TTransportException(TTransportException.NOT_OPEN,
+                                              "Client pool is closed.")
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if pooled is None:
+                try:
+                    pooled = self._create()
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+
+            wait_time = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            return pooled
+
+    def _create(self) -> _PooledClient:
+        sock = _client_socket(*self._socket_args)
+        transport = self.trans_factory.get_transport(sock)
+        protocol = self.proto_factory.get_protocol(transport)
+        transport.open()
+        with self._cond:
+            self._created += 1
+        return _PooledClient(TClient(self.service, protocol), sock, transport)
+
+    def _is_healthy(self, pooled: _PooledClient) -> bool:
+        if self.idle_timeout is not None and \
+                time.monotonic() - pooled.released_at > self.idle_timeout:
+            return False
+        # an idle connection is readable only if the server closed it, or
+        # sent something unexpected.
+        if pooled.sock.sock is None or _is_readable(pooled.sock.sock):
+            return False
+        if self.health_check is None:
+            return True
+        try:
+            return bool(self.health_check(pooled.client))
+        except Exception:
+            return False
+
+    def _release(self, pooled: _PooledClient) -> None:
+        pooled.released_at = time.monotonic()
+        with self._cond:
+            if self.closed:
+                self._size -= 1
+                pooled.transport.close()
+                return
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def _discard(self, pooled: _PooledClient) -> None:
+        pooled.transport.close()
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the metrics of the pool: its clients, idle or in use,
+        the threads waiting for one, and how long checkouts waited.
+        """
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "wait_time_total": self._wait_time,
+                "wait_time_max": self._max_wait_time,
+            }
+
+    def close(self) -> None:
+        """Close the idle clients, the ones in use are closed when they are
+        released.
+        """
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.transport.close()
@@ -1,12 +1,28 @@
+import asyncio
 import logging
+import os
+import queue
+import selectors
+import signal
+import socket
+import struct
 import threading
-from typing import Optional
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple  # noqa
 
 from thriftpy2.protocol import TBinaryProtocolFactory
-from thriftpy2.protocol.base import TProtocolFactory
-from thriftpy2.thrift import TProcessor
+from thriftpy2.protocol.base import TProtocolBase, TProtocolFactory
+from thriftpy2.protocol.header import THeaderProtocolFactory
+from thriftpy2.thrift import (
+    TApplicationException,
+    TMessageType,
+    TProcessor,
+    TType,
+)
 from thriftpy2.transport import (
     TBufferedTransportFactory,
+    TMemoryBuffer,
     TServerSocket,
     TTransportException,
 )
@@ -15,6 +31,8 @@ from thriftpy2.transport.base import TTransportBase, TTransportFactory
 
 logger = logging.getLogger(__name__)
 
+_frame_size = struct.Struct("!i")
+
 
 class TServer(object):
     def __init__(self, processor: TProcessor, trans: TServerSocket,
@@ -30,6 +48,22 @@ class TServer(object):
         self.otrans_factory = otrans_factory or self.itrans_factory
         self.oprot_factory = oprot_factory or self.iprot_factory
 
+    def get_protocols(self, client: TTransportBase) -> Tuple[
+            TTransportBase, TTransportBase, TProtocolBase, TProtocolBase]:
+        """Return the input and output transports and protocols of a
+        client.
+        """
+        itrans = self.itrans_factory.get_transport(client)
+        iprot = self.iprot_factory.get_protocol(itrans)
+        if isinstance(self.iprot_factory, THeaderProtocolFactory):
+            # the reply must be written by the protocol that read the
+            # request, to be framed as the request was.
+            return itrans, itrans, iprot, iprot
+
+        otrans = self.otrans_factory.get_transport(client)
+        oprot = self.oprot_factory.get_protocol(otrans)
+        return itrans, otrans, iprot, oprot
+
     def serve(self) -> None:
         pass
 
@@ -48,10 +82,7 @@ class TSimpleServer(TServer):
         self.trans.listen()
         while not self.closed:
             client = self.trans.accept()
-            itrans = self.itrans_factory.get_transport(client)
-            otrans = self.otrans_factory.get_transport(client)
-            iprot = self.iprot_factory.get_protocol(itrans)
-            oprot = self.oprot_factory.get_protocol(otrans)
+            itrans, otrans, iprot, oprot = self.get_protocols(client)
             try:
                 while not self.closed:
                     self.processor.process(iprot, oprot)
@@ -89,10 +120,7 @@ class TThreadedServer(TServer):
                 logger.exception(x)
 
     def handle(self, client: TTransportBase) -> None:
-        itrans = self.itrans_factory.get_transport(client)
-        otrans = self.otrans_factory.get_transport(client)
-        iprot = self.iprot_factory.get_protocol(itrans)
-        oprot = self.oprot_factory.get_protocol(otrans)
+        itrans, otrans, iprot, oprot = self.get_protocols(client)
         try:
             while True:
                 self.processor.process(iprot, oprot)
@@ -106,3 +134,509 @@ class TThreadedServer(TServer):
 
     def close(self) -> None:
         self.closed = True
+
+
+class TThreadPoolServer(TThreadedServer):
+    """Threaded server handling the connections with a fixed pool of
+    `threads` worker threads, each serving one connection at a time.
+
+    Accepted connections wait for a worker in a queue of at most
+    `queue_size` connections, the server stops accepting while it is full.
+    If `queue_timeout` (in seconds) is set, the first request of a
+    connection that waited longer than that is answered with a
+    TApplicationException and the connection is closed.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.threads = kwargs.pop("threads", 10)  # type: int
+        self.queue_size = kwargs.pop("queue_size", 128)  # type: int
+        self.queue_timeout = kwargs.pop("queue_timeout", None)
+        TThreadedServer.__init__(self, *args, **kwargs)
+
+        # the queue itself is unbounded so that close never blocks, the
+        # slots bound the connections waiting in it.
+        self.clients = queue.Queue()  # type: queue.Queue
+        self._slots = threading.Semaphore(self.queue_size)
+        self.workers = []  # type: List[threading.Thread]
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._max_queue_depth = 0
+        self._accepted = 0
+        self._rejected = 0
+
+    def serve(self) -> None:
+        self.trans.listen()
+        for _ in range(self.threads):
+            t = threading.Thread(target=self.work)
+            t.daemon = self.daemon
+            t.start()
+            self.workers.append(t)
+
+        while not self.closed:
+            self._slots.acquire()
+            try:
+                client = self.trans.accept()
+                self.clients.put((client, time.monotonic()))
+                with self._lock:
+                    self._accepted += 1
+                    self._max_queue_depth = max(self._max_queue_depth,
+                                                self.clients.qsize())
+            except KeyboardInterrupt:
+                raise
+            except Exception as x:
+                self._slots.release()
+                logger.exception(x)
+
+    def work(self) -> None:
+        while True:
+            item = self.clients.get()
+            if item is None:
+                return
+            self._slots.release()
+
+            client, accepted_at = item
+            if self.queue_timeout is not None and \
+                    time.monotonic() - accepted_at > self.queue_timeout:
+                self.reject(client)
+                continue
+
+            with self._lock:
+                self._busy += 1
+            try:
+                self.handle(client)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+    def reject(self, client: TTransportBase) -> None:
+        """Answer the first request of `client` with an exception and
+        close it.
+        """
+        with self._lock:
+            self._rejected += 1
+
+        itrans, otrans, iprot, oprot = self.get_protocols(client)
+        try:
+            api, mtype, seqid = iprot.read_message_begin()
+            iprot.skip(TType.STRUCT)
+            iprot.read_message_end()
+            if mtype != TMessageType.ONEWAY:
+                self.processor.send_exception(
+                    oprot, api, TApplicationException(
+                        TApplicationException.INTERNAL_ERROR,
+                        "Server busy, request waited more than {}s".format(
+                            self.queue_timeout)),
+                    seqid)
+        except TTransportException:
+            pass
+        except Exception as x:
+            logger.exception(x)
+
+        itrans.close()
+        otrans.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the metrics of the pool: the number of workers, busy
+        ones, connections waiting in the queue (and the most ever seen),
+        and connections accepted and rejected so far.
+        """
+        with self._lock:
+            return {
+                "threads": self.threads,
+                "busy_threads": self._busy,
+                "queue_depth": self.clients.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "accepted": self._accepted,
+                "rejected": self._rejected,
+            }
+
+    def close(self) -> None:
+        self.closed = True
+        for _ in self.workers:
+            self.clients.put(None)
+
+
+class _Connection(object):
+    """A client of TNonblockingServer, with what was read of its next
+    request and what is left to write of its last reply.
+    """
+
+    __slots__ = ("sock", "events", "rbuf", "wbuf", "wpos")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock  # type: Optional[socket.socket]
+        self.events = 0
+        self.rbuf = bytearray()
+        self.wbuf = b""
+        self.wpos = 0
+
+
+class TNonblockingServer(TServer):
+    """Server of framed transports, which waits on all the connections in
+    one I/O thread with `selectors`.
+
+    The I/O thread reads whole frames and hands them to a pool of `threads`
+    worker threads, which process them in memory buffers and hand the
+    replies back to be written by the I/O thread, so that an idle
+    connection costs no thread. Clients must use a framed transport,
+    `itrans_factory` is not used. A connection has one request processed
+    at a time, the next one is read once the reply is written. A frame
+    larger than `max_frame_size` closes its connection.
+    """
+
+    recv_size = 65536
+
+    def __init__(self, *args, **kwargs) -> None:
+        self.threads = kwargs.pop("threads", 10)  # type: int
+        self.max_frame_size = kwargs.pop(
+            "max_frame_size", 256 * 1024 * 1024)  # type: int
+        self.daemon = kwargs.pop("daemon", False)
+        TServer.__init__(self, *args, **kwargs)
+        self.closed = False
+
+        self.tasks = queue.Queue()  # type: queue.Queue
+        self.workers = []  # type: List[threading.Thread]
+        self.connections = set()  # type: Set[_Connection]
+        self._replies = deque()  # type: Deque[Tuple[_Connection, Optional[bytes]]]  # noqa
+        self._selector = None  # type: Optional[selectors.BaseSelector]
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+
+    def serve(self) -> None:
+        self.trans.listen()
+        listener = self.trans.sock
+        listener.setblocking(False)
+
+        for _ in range(self.threads):
+            t = threading.Thread(target=self.work)
+            t.daemon = self.daemon
+            t.start()
+            self.workers.append(t)
+
+        selector = self._selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while not self.closed:
+                for key, events in selector.select():
+                    if key.fileobj is listener:
+                        self._accept(listener)
+                    elif key.fileobj is self._wake_r:
+                        self._handle_replies()
+                    elif events & selectors.EVENT_READ:
+                        self._read(key.data)
+                    else:
+                        self._write(key.data)
+        finally:
+            for conn in list(self.connections):
+                self._close(conn)
+            selector.close()
+            for _ in self.workers:
+                self.tasks.put(None)
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def work(self) -> None:
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+
+            conn, frame = task
+            try:
+                reply = self.process(frame)  # type: Optional[bytes]
+            except TTransportException:
+                reply = None
+            except Exception as x:
+                logger.exception(x)
+                reply = None
+            self._replies.append((conn, reply))
+            self._wake()
+
+    def process(self, frame: bytes) -> bytes:
+        """Process the request of `frame`, return the reply, empty for a
+        oneway request.
+        """
+        itrans = TMemoryBuffer(frame)
+        otrans = TMemoryBuffer()
+        self.processor.process(self.iprot_factory.get_protocol(itrans),
+                               self.oprot_factory.get_protocol(otrans))
+        return otrans.getvalue()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            # the I/O thread is awake already, or the server is closed.
+            pass
+
+    def _watch(self, conn: _Connection, events: int) -> None:
+        assert self._selector is not None
+        if events == conn.events:
+            return
+        if not conn.events:
+            self._selector.register(conn.sock, events, conn)
+        elif not events:
+            self._selector.unregister(conn.sock)
+        else:
+            self._selector.modify(conn.sock, events, conn)
+        conn.events = events
+
+    def _close(self, conn: _Connection) -> None:
+        if conn.sock is None:
+            return
+        self._watch(conn, 0)
+        self.connections.discard(conn)
+        conn.sock.close()
+        conn.sock = None
+
+    def _accept(self, listener: socket.socket) -> None:
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as x:
+                logger.exception(x)
+                return
+
+            sock.setblocking(False)
+            conn = _Connection(sock)
+            self.connections.add(conn)
+            self._watch(conn, selectors.EVENT_READ)
+
+    def _read(self, conn: _Connection) -> None:
+        assert conn.sock is not None
+        try:
+            data = conn.sock.recv(self.recv_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+
+        conn.rbuf += data
+        self._dispatch(conn)
+
+    def _dispatch(self, conn: _Connection) -> None:
+        """Hand the request of `conn` to the workers if its frame is
+        complete.
+        """
+        rbuf = conn.rbuf
+        if len(rbuf) < _frame_size.size:
+            return
+        size, = _frame_size.unpack_from(rbuf)
+        if size < 0 or size > self.max_frame_size:
+            logger.warning("Closing a connection sending a frame of %d "
+                           "bytes", size)
+            self._close(conn)
+            return
+
+        end = _frame_size.size + size
+        if len(rbuf) < end:
+            return
+        frame = bytes(rbuf[_frame_size.size:end])
+        del rbuf[:end]
+        # stop reading the connection until the reply is written.
+        self._watch(conn, 0)
+        self.tasks.put((conn, frame))
+
+    def _handle_replies(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        while self._replies:
+            conn, reply = self._replies.popleft()
+            if conn.sock is None:
+                continue
+            if reply is None:
+                self._close(conn)
+            elif reply:
+                conn.wbuf = _frame_size.pack(len(reply)) + reply
+                conn.wpos = 0
+                self._write(conn)
+            else:
+                self._watch(conn, selectors.EVENT_READ)
+                self._dispatch(conn)
+
+    def _write(self, conn: _Connection) -> None:
+        assert conn.sock is not None
+        try:
+            conn.wpos += conn.sock.send(memoryview(conn.wbuf)[conn.wpos:])
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._close(conn)
+            return
+
+        if conn.wpos < len(conn.wbuf):
+            self._watch(conn, selectors.EVENT_WRITE)
+            return
+        conn.wbuf = b""
+        self._watch(conn, selectors.EVENT_READ)
+        self._dispatch(conn)
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+
+class TProcessPoolServer(object):
+    """Run `server`, a TServer or a TAsyncServer, in `workers` forked
+    processes, to use more than one core.
+
+    The workers accept on the socket the supervising process listens on,
+    or, with `reuse_port`, each one binds its own socket with SO_REUSEPORT
+    and the kernel balances the connections among them. A worker that
+    dies is started again.
+
+    `restart` (SIGHUP) restarts the workers one after the other: a new
+    worker is started before the old one is stopped. `close` (SIGTERM or
+    SIGINT) stops them all. A worker is stopped with SIGTERM: it stops
+    accepting and serves its connections for up to `graceful_timeout`
+    seconds before being killed. With `reuse_port`, the connections waiting
+    in the backlog of a stopped worker are lost.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, server: Any, workers: int = 4,
+                 reuse_port: bool = False,
+                 graceful_timeout: float = 10) -> None:
+        if reuse_port and getattr(server.trans, "unix_socket", None):
+            raise ValueError("reuse_port only works with host:port.")
+        self.server = server
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.graceful_timeout = graceful_timeout
+
+        self.pids = set()  # type: Set[int]
+        self.closed = False
+        self._restart = False
+        self._is_async = asyncio.iscoroutinefunction(server.close)
+
+    def serve(self) -> None:
+        if not self.reuse_port:
+            self.server.trans.listen()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            handlers = {
+                signal.SIGTERM: signal.signal(signal.SIGTERM,
+                                              lambda *_: self.close()),
+                signal.SIGINT: signal.signal(signal.SIGINT,
+                                             lambda *_: self.close()),
+                signal.SIGHUP: signal.signal(signal.SIGHUP,
+                                             lambda *_: self.restart()),
+            }
+        try:
+            while not self.closed:
+                self._reap()
+                while len(self.pids) < self.workers and not self.closed:
+                    self.pids.add(self._spawn())
+                if self._restart:
+                    self._restart = False
+                    self._rolling_restart()
+                time.sleep(self.poll_interval)
+        finally:
+            for pid in list(self.pids):
+                self._stop(pid, wait=False)
+            for pid in list(self.pids):
+                self._wait(pid)
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            self.server.trans.close()
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, self._stop_worker)
+            if self._is_async:
+                # the event loop of the supervising process must not be
+                # shared by the workers.
+                self.server.loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(self.server.loop)
+            self.server.serve()
+        except SystemExit:
+            pass
+        except BaseException as x:
+            logger.exception(x)
+            status = 1
+        finally:
+            # let the threads serving connections finish.
+            for t in threading.enumerate():
+                if t is not threading.current_thread() and not t.daemon:
+                    t.join()
+            os._exit(status)
+
+    def _stop_worker(self, signum: int, frame: Any) -> None:
+        if self._is_async:
+            loop = self.server.loop
+            loop.call_soon_threadsafe(loop.stop)
+            return
+        self.server.close()
+        raise SystemExit(0)
+
+    def _reap(self) -> None:
+        for pid in list(self.pids):
+            try:
+                done, status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done, status = pid, 0
+            if done:
+                self.pids.discard(pid)
+                if not self.closed:
+                    logger.warning("Worker %d exited with status %d, "
+                                   "restarting it", pid, status)
+
+    def _stop(self, pid: int, wait: bool = True) -> None:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        if wait:
+            self._wait(pid)
+
+    def _wait(self, pid: int) -> None:
+        """Wait for worker `pid` to exit, kill it after graceful_timeout."""
+        deadline = time.monotonic() + self.graceful_timeout
+        while True:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            if time.monotonic() > deadline:
+                logger.warning("Killing worker %d", pid)
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                break
+            time.sleep(self.poll_interval / 10)
+        self.pids.discard(pid)
+
+    def _rolling_restart(self) -> None:
+        for pid in list(self.pids):
+            if self.closed:
+                return
+            self.pids.add(self._spawn())
+            self._stop(pid)
+
+    def restart(self) -> None:
+        """Restart the workers one after the other."""
+        self._restart = True
+
+    def close(self) -> None:
+        self.closed = True
@@ -5,6 +5,7 @@
     Thrift simplified.
 """
 
+import contextvars
 import functools
 import linecache
 import types
@@ -76,14 +77,26 @@ def init_func_generator(cls: type,
     init += "\n".join(map('    self.{0} = {0}'.format, varnames))
 
     name = '<generated {}.__init__>'.format(cls.__name__)
-    code = compile(init, name, 'exec')
+    return compile_function(name, init, argdefs=defaults)
+
+
+def compile_function(name: str, source: str,
+                     func_globals: Optional[Dict[str, Any]] = None,
+                     argdefs: Optional[Tuple[Any, ...]] = None
+                     ) -> Callable[..., Any]:
+    """Compile the source of a single generated function.
+
+    `name` is used as the filename of the generated code, `func_globals`
+    are the globals the function body can refer to.
+    """
+    code = compile(source, name, 'exec')
     func = next(c for c in code.co_consts if isinstance(c, types.CodeType))
 
     # Add a fake linecache entry so debuggers and the traceback module can
     # better understand our generated code.
-    linecache.cache[name] = (len(init), None, init.splitlines(True), name)
+    linecache.cache[name] = (len(source), None, source.splitlines(True), name)
 
-    return types.FunctionType(func, {}, argdefs=defaults)
+    return types.FunctionType(func, func_globals or {}, argdefs=argdefs)
 
 
 class TType(object):
@@ -287,12 +300,51 @@ class TClient(object):
         if hasattr(result, "success"):
             raise TApplicationException(TApplicationException.MISSING_RESULT)
 
+    def set_request_header(self, key: str, value: str) -> None:
+        """Set a header of the next request, the protocol must carry
+        headers (see THeaderProtocol).
+        """
+        self._oprot.set_header(key, value)
+
+    def get_response_headers(self) -> Dict[str, str]:
+        """Return the headers of the last reply, the protocol must carry
+        headers (see THeaderProtocol).
+        """
+        return self._iprot.get_headers()
+
     def close(self) -> None:
         self._iprot.trans.close()
         if self._iprot != self._oprot:
             self._oprot.trans.close()
 
 
+# the protocols of the request being processed by the handler
+_processed_protocols = contextvars.ContextVar(
+    'processed_protocols', default=None
+)  # type: contextvars.ContextVar[Optional[Tuple[Any, Any]]]
+
+
+def get_request_headers() -> Dict[str, str]:
+    """Return the headers of the request being processed, to be called by
+    the handler. Empty if the protocol doesn't carry headers (see
+    THeaderProtocol).
+    """
+    protocols = _processed_protocols.get()
+    get_headers = getattr(protocols and protocols[0], 'get_headers', None)
+    return get_headers() if get_headers is not None else {}
+
+
+def set_response_header(key: str, value: str) -> None:
+    """Set a header of the reply to the request being processed, to be
+    called by the handler. Ignored if the protocol doesn't carry headers
+    (see THeaderProtocol).
+    """
+    protocols = _processed_protocols.get()
+    set_header = getattr(protocols and protocols[1], 'set_header', None)
+    if set_header is not None:
+        set_header(key, value)
+
+
 class TProcessor(object):
     """Base class for processor, which works on two streams."""
 
@@ -355,6 +407,7 @@ class TProcessor(object):
             return self.send_exception(oprot, api, result, seqid)
 
         assert call is not None
+        token = _processed_protocols.set((iprot, oprot))
         try:
             result.success = call()
         except TApplicationException as e:
@@ -363,6 +416,8 @@ class TProcessor(object):
             # raise if api don't have throws
             if not self.handle_exception(e, result):
                 raise
+        finally:
+            _processed_protocols.reset(token)
 
         if not result.oneway:
             self.send_result(oprot, api, result, seqid)
@@ -472,6 +527,9 @@ class TApplicationException(TException):
     MISSING_RESULT = 5
     INTERNAL_ERROR = 6
     PROTOCOL_ERROR = 7
+    INVALID_TRANSFORM = 8
+    INVALID_PROTOCOL = 9
+    UNSUPPORTED_CLIENT_TYPE = 10
 
     def __init__(self, type: int = UNKNOWN,
                  message: Optional[str] = None) -> None:
@@ -493,5 +551,11 @@ class TApplicationException(TException):
             return 'Bad sequence ID'
         elif self.type == self.MISSING_RESULT:
             return 'Missing result'
+        elif self.type == self.INVALID_TRANSFORM:
+            return 'Invalid transform'
+        elif self.type == self.INVALID_PROTOCOL:
+            return 'Invalid protocol'
+        elif self.type == self.UNSUPPORTED_CLIENT_TYPE:
+            return 'Unsupported client type'
         else:
             return 'Default (unknown) TApplicationException'
@@ -8,12 +8,24 @@ from .buffered import TBufferedTransport, TBufferedTransportFactory
 from .framed import TFramedTransport, TFramedTransportFactory
 from .memory import TMemoryBuffer
 from .sasl import TSaslClientTransport, TSaslClientTransportFactory
+from .compressed import (
+    TCompressedTransport,
+    TCompressedTransportFactory,
+    TZlibTransport,
+    TZlibTransportFactory,
+)
 
 if CYTHON:
     from .buffered import TCyBufferedTransport, TCyBufferedTransportFactory
     from .framed import TCyFramedTransport, TCyFramedTransportFactory
     from .memory import TCyMemoryBuffer
     from .sasl import TCySaslClientTransport, TCySaslClientTransportFactory
+    from .compressed import (
+        TCyCompressedTransport,
+        TCyCompressedTransportFactory,
+        TCyZlibTransport,
+        TCyZlibTransportFactory,
+    )
 
     # enable cython binary by default for CPython.
     TMemoryBuffer = TCyMemoryBuffer  # noqa
@@ -23,6 +35,10 @@ if CYTHON:
     TFramedTransportFactory = TCyFramedTransportFactory  # noqa
     TSaslClientTransport = TCySaslClientTransport  # noqa
     TSaslClientTransportFactory = TCySaslClientTransportFactory  # noqa
+    TCompressedTransport = TCyCompressedTransport  # noqa
+    TCompressedTransportFactory = TCyCompressedTransportFactory  # noqa
+    TZlibTransport = TCyZlibTransport  # noqa
+    TZlibTransportFactory = TCyZlibTransportFactory  # noqa
 else:
     # disable cython binary protocol for PYPY since it's slower.
     TCyMemoryBuffer = TMemoryBuffer
@@ -32,6 +48,10 @@ else:
     TCyFramedTransportFactory = TFramedTransportFactory
     TCySaslClientTransport = TSaslClientTransport
     TCySaslClientTransportFactory = TSaslClientTransportFactory
+    TCyCompressedTransport = TCompressedTransport
+    TCyCompressedTransportFactory = TCompressedTransportFactory
+    TCyZlibTransport = TZlibTransport
+    TCyZlibTransportFactory = TZlibTransportFactory
 
 __all__ = [
     "TSocket", "TServerSocket",
@@ -43,4 +63,8 @@ __all__ = [
     "TCyFramedTransport", "TCyFramedTransportFactory",
     "TSaslClientTransport", "TCySaslClientTransport",
     "TSaslClientTransportFactory", "TCySaslClientTransportFactory",
+    "TCompressedTransport", "TCompressedTransportFactory",
+    "TZlibTransport", "TZlibTransportFactory",
+    "TCyCompressedTransport", "TCyCompressedTransportFactory",
+    "TCyZlibTransport", "TCyZlibTransportFactory",
 ]
@@ -98,6 +98,9 @@ class TTransportException(TException):
     ALREADY_OPEN = 2
     TIMED_OUT = 3
     END_OF_FILE = 4
+    NEGATIVE_SIZE = 5
+    SIZE_LIMIT = 6
+    INVALID_CLIENT_TYPE = 7
 
     def __init__(self, type: int = UNKNOWN,
                  message: Optional[str] = None) -> None:
@@ -41,6 +41,17 @@ class TBufferedTransport(TTransportBase):
         self._rbuf = BytesIO(buf)
         return ret
 
+    def read_some(self, sz):
+        """Read at most `sz` bytes, only reading from the underlying
+        transport when the buffer is empty."""
+        ret = self._rbuf.read(sz)
+        if ret:
+            return ret
+
+        buf = self._trans.read(self._buf_size)
+        self._rbuf = BytesIO(buf[sz:])
+        return buf[:sz]
+
     def write(self, buf):
         self._wbuf.write(buf)
 
@@ -1,9 +1,13 @@
 # cython: freethreading_compatible = True
 
+from cpython.buffer cimport PyBUF_READ
+from cpython.memoryview cimport PyMemoryView_FromMemory
+
 from thriftpy2.transport.cybase cimport (
     TCyBuffer,
     CyTransportBase,
-    DEFAULT_BUFFER
+    DEFAULT_BUFFER,
+    MIN_SEGMENT_SIZE,
 )
 
 from .. import TTransportException
@@ -16,6 +20,9 @@ cdef class TCyBufferedTransport(CyTransportBase):
 
     cdef:
         TCyBuffer rbuf, wbuf
+        # large buffers written before the content of wbuf, sent with
+        # `writev` without being copied.
+        list wsegments
 
     def __init__(self, trans, int buf_size=DEFAULT_BUFFER):
         if buf_size < MIN_BUFFER_SIZE:
@@ -24,10 +31,12 @@ cdef class TCyBufferedTransport(CyTransportBase):
         self.trans = trans
         self.rbuf = TCyBuffer(buf_size)
         self.wbuf = TCyBuffer(buf_size)
+        self.wsegments = []
 
     def clean(self):
         self.rbuf.clean()
         self.wbuf.clean()
+        self.wsegments = []
 
     def is_open(self):
         return self.trans.is_open()
@@ -40,11 +49,33 @@ cdef class TCyBufferedTransport(CyTransportBase):
 
     def write(self, bytes data):
         cdef int sz = len(data)
-        return self.c_write(data, sz)
+        return self.c_write_object(data, data, sz)
 
     def read(self, int sz):
         return self.get_string(sz)
 
+    def read_some(self, int sz):
+        """Read at most `sz` bytes, only reading from the underlying
+        transport when the buffer is empty."""
+        if sz <= 0:
+            return b''
+
+        if self.rbuf.data_size == 0:
+            data = self.trans.read(self.rbuf.buf_size)
+            if not data:
+                raise TTransportException(TTransportException.END_OF_FILE,
+                                          "End of file reading from transport")
+            self.rbuf.clean()
+            if self.rbuf.write(len(data), data) == -1:
+                raise MemoryError("Write to buffer error")
+
+        if sz > self.rbuf.data_size:
+            sz = self.rbuf.data_size
+        data = self.rbuf.buf[self.rbuf.cur:self.rbuf.cur + sz]
+        self.rbuf.cur += sz
+        self.rbuf.data_size -= sz
+        return data
+
     def flush(self):
         return self.c_flush()
 
@@ -60,6 +91,16 @@ cdef class TCyBufferedTransport(CyTransportBase):
         if r == -1:
             raise MemoryError("Write to buffer error")
 
+    cdef c_write_object(self, object data, const char *ptr, int sz):
+        if sz < MIN_SEGMENT_SIZE or getattr(self.trans, 'writev', None) is None:
+            self.c_write(ptr, sz)
+            return
+
+        if self.wbuf.data_size > 0:
+            self.wsegments.append(self.wbuf.buf[:self.wbuf.data_size])
+            self.wbuf.clean()
+        self.wsegments.append(memoryview(data))
+
     cdef c_read(self, int sz, char* out):
         if sz <= 0:
             return 0
@@ -81,7 +122,22 @@ cdef class TCyBufferedTransport(CyTransportBase):
 
     cdef c_dump_wbuf(self):
         cdef bytes data
-        if self.wbuf.data_size > 0:
+
+        writev = getattr(self.trans, 'writev', None)
+        if writev is not None:
+            if self.wbuf.data_size <= 0 and not self.wsegments:
+                return
+
+            view = PyMemoryView_FromMemory(self.wbuf.buf, self.wbuf.data_size,
+                                           PyBUF_READ)
+            try:
+                writev(self.wsegments + [view])
+            finally:
+                view.release()
+            self.wsegments = []
+            self.wbuf.clean()
+
+        elif self.wbuf.data_size > 0:
             data = self.wbuf.buf[:self.wbuf.data_size]
             self.trans.write(data)
             self.wbuf.clean()
@@ -0,0 +1,110 @@
+import struct
+from io import BytesIO
+
+from thriftpy2._compat import CYTHON
+from ..base import TTransportException, readall
+from ..buffered import TBufferedTransport
+from ..framed import TFramedTransport
+from .codec import (  # noqa
+    DEFAULT_THRESHOLD,
+    MAX_FRAME_SIZE,
+    NO_CODEC,
+    CODECS,
+    LZ4Codec,
+    TCodec,
+    TCompressionCounters,
+    ZlibCodec,
+    ZstdCodec,
+    compress_frame,
+    counters,
+    decompress_frame,
+    pack_frame_header,
+    register_codec,
+)
+
+
+class TCompressedTransport(TFramedTransport):
+    """Framed transport compressing the frames of at least `threshold`
+    bytes with `codec` (zlib by default). Frames compressed with any
+    registered codec can be read.
+
+    The sizes and CPU times are added to `counters`, the counters shared by
+    all the compressed transports if not given. A frame decompressing to
+    more than `max_frame_size` bytes raises a TTransportException.
+    """
+    def __init__(self, trans, codec=None, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        super(TCompressedTransport, self).__init__(trans)
+        self._codec = ZlibCodec() if codec is None else codec
+        self._codecs = {self._codec.codec_id: self._codec}
+        self._threshold = threshold
+        self._counters = _default_counters if counters is None else counters
+        self._max_frame_size = max_frame_size
+
+    def read_frame(self):
+        buff = readall(self._trans.read, 4)
+        sz, = struct.unpack('!i', buff)
+        if sz <= 0:
+            raise TTransportException("No frame.", TTransportException.UNKNOWN)
+
+        frame = readall(self._trans.read, sz)
+        if frame[0] == NO_CODEC:
+            self._counters.add_read(sz - 1, sz - 1, 0.0, False)
+            self._rbuf = BytesIO(frame)
+            self._rbuf.seek(1)
+        else:
+            self._rbuf = BytesIO(decompress_frame(
+                self._codecs, frame, self._counters, self._max_frame_size))
+
+    def flush(self):
+        # reset wbuf before write/flush to preserve state on underlying failure
+        out = self._wbuf.getvalue()
+        self._wbuf = BytesIO()
+
+        codec_id, payload = compress_frame(self._codec, out, self._threshold,
+                                           self._counters)
+        header = pack_frame_header(len(payload) + 1, codec_id)
+        self._trans.write(header + payload)
+        self._trans.flush()
+
+
+class TZlibTransport(TCompressedTransport):
+    """Compressed transport using zlib at compression `level`."""
+    def __init__(self, trans, level=6, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        super(TZlibTransport, self).__init__(trans, ZlibCodec(level),
+                                             threshold, counters,
+                                             max_frame_size)
+
+
+class TCompressedTransportFactory(object):
+    def __init__(self, codec=None, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        self.codec = codec
+        self.threshold = threshold
+        self.counters = counters
+        self.max_frame_size = max_frame_size
+
+    def get_transport(self, trans):
+        return TBufferedTransport(TCompressedTransport(
+            trans, self.codec, self.threshold, self.counters,
+            self.max_frame_size))
+
+
+class TZlibTransportFactory(TCompressedTransportFactory):
+    def __init__(self, level=6, threshold=DEFAULT_THRESHOLD, counters=None,
+                 max_frame_size=MAX_FRAME_SIZE):
+        super(TZlibTransportFactory, self).__init__(ZlibCodec(level),
+                                                    threshold, counters,
+                                                    max_frame_size)
+
+
+_default_counters = counters
+
+if CYTHON:
+    from .cycompressed import (  # noqa
+        TCyCompressedTransport,
+        TCyCompressedTransportFactory,
+        TCyZlibTransport,
+        TCyZlibTransportFactory,
+    )
@@ -0,0 +1,294 @@
+"""
+    thriftpy2.transport.compressed.codec
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Compression codecs of the compressed transports, and the counters they
+    report to.
+
+    A compressed frame is a framed transport frame whose first byte is the
+    id of the codec of the rest of the frame, 0 if it isn't compressed.
+"""
+
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple, Type
+
+from ..base import TTransportException
+
+NO_CODEC = 0
+DEFAULT_THRESHOLD = 1024
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+# frame size (including the codec id) and codec id
+_frame_header = struct.Struct('!iB')
+pack_frame_header = _frame_header.pack
+
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+class TCodec(object):
+    """Base class of the codecs. `codec_id` identifies the codec on the
+    wire, subclasses must be registered with `register_codec` so that
+    receivers can decode their frames.
+    """
+    codec_id = None  # type: int
+    name = None  # type: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes, max_size: int) -> bytes:
+        """Decompress `data`, raising TTransportException(SIZE_LIMIT)
+        rather than returning more than `max_size` bytes.
+        """
+        raise NotImplementedError
+
+
+def check_decompressed_size(data: bytes, max_size: int) -> bytes:
+    """Check the output of a decompression stopped after `max_size` + 1
+    bytes.
+    """
+    if len(data) > max_size:
+        raise TTransportException(
+            TTransportException.SIZE_LIMIT,
+            "Frame decompresses to more than {} bytes".format(max_size))
+    return data
+
+
+def zlib_decompress(data: bytes, max_size: int) -> bytes:
+    """zlib.decompress, never decompressing more than `max_size` + 1
+    bytes.
+    """
+    decompressor = zlib.decompressobj()
+    data = check_decompressed_size(
+        decompressor.decompress(data, max_size + 1), max_size)
+    if not decompressor.eof:
+        raise zlib.error("incomplete or truncated stream")
+    return data
+
+
+class ZlibCodec(TCodec):
+    codec_id = 1
+    name = 'zlib'
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data, max_size):
+        return zlib_decompress(data, max_size)
+
+
+class ZstdCodec(TCodec):
+    """Zstandard, needs Python 3.14 or the `zstandard` package."""
+    codec_id = 2
+    name = 'zstd'
+
+    def __init__(self, level: int = 3):
+        try:
+            from compression import zstd
+        except ImportError:
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression needs the zstandard "
+                                  "package")
+            zstd = None
+            # zstandard (de)compressors can't be used by several threads
+            self._local = threading.local()
+            self._zstandard = zstandard
+        self._zstd = zstd
+        self.level = level
+
+    def compress(self, data):
+        if self._zstd is not None:
+            return self._zstd.compress(data, self.level)
+        compressor = getattr(self._local, 'compressor', None)
+        if compressor is None:
+            compressor = self._local.compressor = \
+                self._zstandard.ZstdCompressor(level=self.level)
+        return compressor.compress(data)
+
+    def decompress(self, data, max_size):
+        if self._zstd is not None:
+            data = self._zstd.ZstdDecompressor().decompress(
+                data, max_size + 1)
+            return check_decompressed_size(data, max_size)
+        decompressor = getattr(self._local, 'decompressor', None)
+        if decompressor is None:
+            decompressor = self._local.decompressor = \
+                self._zstandard.ZstdDecompressor()
+        # decompress() allocates the content size declared by the frame
+        with decompressor.stream_reader(data) as reader:
+            return check_decompressed_size(reader.read(max_size + 1),
+                                           max_size)
+
+
+class LZ4Codec(TCodec):
+    """LZ4 frames, needs the `lz4` package."""
+    codec_id = 3
+    name = 'lz4'
+
+    def __init__(self, level: int = 0):
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError("lz4 compression needs the lz4 package")
+        self._lz4 = lz4.frame
+        self.level = level
+
+    def compress(self, data):
+        return self._lz4.compress(data, compression_level=self.level)
+
+    def decompress(self, data, max_size):
+        data = self._lz4.LZ4FrameDecompressor().decompress(
+            data, max_length=max_size + 1)
+        return check_decompressed_size(data, max_size)
+
+
+CODECS = {}  # type: Dict[int, Type[TCodec]]
+
+
+def register_codec(codec_cls: Type[TCodec]) -> Type[TCodec]:
+    """Register a codec class, so that frames compressed with it can be
+    read. Can be used as a class decorator.
+    """
+    if not 0 < codec_cls.codec_id < 256:
+        raise ValueError("codec_id must be in [1, 255]")
+    registered = CODECS.get(codec_cls.codec_id)
+    if registered is not None and registered is not codec_cls:
+        raise ValueError("codec_id {} is already used by {}".format(
+            codec_cls.codec_id, registered.__name__))
+    CODECS[codec_cls.codec_id] = codec_cls
+    return codec_cls
+
+
+for _codec_cls in (ZlibCodec, ZstdCodec, LZ4Codec):
+    register_codec(_codec_cls)
+
+
+class TCompressionCounters(object):
+    """Counters of the compressed transports, shared by all of them unless
+    they are given their own. Times are CPU times in seconds, including
+    the time spent compressing frames that were sent uncompressed because
+    they didn't get smaller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.frames_written = 0
+            self.frames_compressed = 0
+            self.raw_bytes_written = 0
+            self.wire_bytes_written = 0
+            self.compress_time = 0.0
+            self.frames_read = 0
+            self.frames_decompressed = 0
+            self.raw_bytes_read = 0
+            self.wire_bytes_read = 0
+            self.decompress_time = 0.0
+
+    def add_written(self, raw: int, wire: int, cpu_time: float,
+                    compressed: bool) -> None:
+        with self._lock:
+            self.frames_written += 1
+            if compressed:
+                self.frames_compressed += 1
+            self.compress_time += cpu_time
+            self.raw_bytes_written += raw
+            self.wire_bytes_written += wire
+
+    def add_read(self, raw: int, wire: int, cpu_time: float,
+                 compressed: bool) -> None:
+        with self._lock:
+            self.frames_read += 1
+            if compressed:
+                self.frames_decompressed += 1
+            self.decompress_time += cpu_time
+            self.raw_bytes_read += raw
+            self.wire_bytes_read += wire
+
+    @property
+    def write_ratio(self) -> float:
+        """Raw to wire size ratio of the written frames."""
+        return self.raw_bytes_written / (self.wire_bytes_written or 1)
+
+    @property
+    def read_ratio(self) -> float:
+        """Raw to wire size ratio of the read frames."""
+        return self.raw_bytes_read / (self.wire_bytes_read or 1)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            stats = {k: v for k, v in self.__dict__.items()
+                     if not k.startswith('_')}
+        stats['write_ratio'] = self.write_ratio
+        stats['read_ratio'] = self.read_ratio
+        return stats
+
+
+counters = TCompressionCounters()
+
+
+def compress_frame(codec: Optional[TCodec], data: bytes, threshold: int,
+                   counters: TCompressionCounters) -> Tuple[int, bytes]:
+    """Compress the content of a frame with `codec` if it is at least
+    `threshold` bytes long, returns the codec id and the payload. `data`
+    itself is the payload if it isn't compressed, or if compressing it
+    doesn't make it smaller.
+    """
+    size = len(data)
+    if codec is None or size < threshold:
+        counters.add_written(size, size, 0.0, False)
+        return NO_CODEC, data
+
+    start = _thread_time()
+    payload = codec.compress(data)
+    cpu_time = _thread_time() - start
+    if len(payload) >= size:
+        counters.add_written(size, size, cpu_time, False)
+        return NO_CODEC, data
+
+    counters.add_written(size, len(payload), cpu_time, True)
+    return codec.codec_id, payload
+
+
+def decompress_frame(codecs: Dict[int, TCodec], frame: bytes,
+                     counters: TCompressionCounters,
+                     max_size: int = MAX_FRAME_SIZE) -> bytes:
+    """Decompress the payload of a compressed frame, which must not be an
+    uncompressed one, to `max_size` bytes at most. Codecs missing from
+    `codecs` are instantiated with their default arguments.
+    """
+    codec_id = frame[0]
+    codec = codecs.get(codec_id)
+    if codec is None:
+        codec_cls = CODECS.get(codec_id)
+        if codec_cls is None:
+            raise TTransportException(
+                TTransportException.UNKNOWN,
+                "Unknown compression codec {}".format(codec_id))
+        try:
+            codec = codecs[codec_id] = codec_cls()
+        except ImportError as e:
+            raise TTransportException(TTransportException.UNKNOWN, str(e))
+
+    start = _thread_time()
+    try:
+        data = codec.decompress(memoryview(frame)[1:], max_size)
+    except TTransportException:
+        raise
+    except Exception as e:
+        raise TTransportException(
+            TTransportException.UNKNOWN,
+            "Failed to decompress {} frame: {}".format(codec.name, e))
+    counters.add_read(len(data), len(frame) - 1, _thread_time() - start,
+                      True)
+    return data
@@ -0,0 +1,111 @@
+# cython: freethreading_compatible = True
+
+from cpython.buffer cimport PyBUF_READ
+from cpython.memoryview cimport PyMemoryView_FromMemory
+
+from thriftpy2.transport.cybase cimport DEFAULT_BUFFER
+from thriftpy2.transport.framed.cyframed cimport TCyFramedTransport
+
+from .codec import (
+    DEFAULT_THRESHOLD,
+    MAX_FRAME_SIZE,
+    NO_CODEC,
+    ZlibCodec,
+    compress_frame,
+    counters as default_counters,
+    decompress_frame,
+    pack_frame_header,
+)
+
+
+cdef class TCyCompressedTransport(TCyFramedTransport):
+    """See `TCompressedTransport`."""
+    cdef:
+        object codec, counters
+        dict codecs
+        int threshold
+        Py_ssize_t max_frame_size
+
+    def __init__(self, trans, codec=None, int threshold=DEFAULT_THRESHOLD,
+                 counters=None, int buf_size=DEFAULT_BUFFER,
+                 Py_ssize_t max_frame_size=MAX_FRAME_SIZE):
+        TCyFramedTransport.__init__(self, trans, buf_size)
+        self.codec = ZlibCodec() if codec is None else codec
+        self.codecs = {self.codec.codec_id: self.codec}
+        self.threshold = threshold
+        self.counters = default_counters if counters is None else counters
+        self.max_frame_size = max_frame_size
+
+    cdef read_frame(self):
+        TCyFramedTransport.read_frame(self)
+
+        cdef int size = len(self.rframe) - 1
+        if self.rframe[0] == NO_CODEC:
+            # read in place, after the codec id
+            self.counters.add_read(size, size, 0.0, False)
+            self.rframe_pos = 1
+        else:
+            self.rframe = decompress_frame(self.codecs, self.rframe,
+                                           self.counters, self.max_frame_size)
+
+    cdef c_flush(self):
+        cdef int size = self.wsegments_size + self.wframe_buf.data_size
+
+        if size <= 0:
+            return
+
+        view = PyMemoryView_FromMemory(self.wframe_buf.buf,
+                                       self.wframe_buf.data_size, PyBUF_READ)
+        try:
+            if self.wsegments:
+                data = b''.join(self.wsegments + [view])
+            else:
+                data = view
+            codec_id, payload = compress_frame(self.codec, data,
+                                               self.threshold, self.counters)
+            header = pack_frame_header(len(payload) + 1, codec_id)
+
+            writev = getattr(self.trans, 'writev', None)
+            if writev is None:
+                self.trans.write(header + bytes(payload))
+            else:
+                writev([header, payload])
+        finally:
+            view.release()
+        self.wsegments = []
+        self.wsegments_size = 0
+
+        self.trans.flush()
+        self.wframe_buf.clean()
+
+
+class TCyZlibTransport(TCyCompressedTransport):
+    """See `TZlibTransport`."""
+    def __init__(self, trans, level=6, threshold=DEFAULT_THRESHOLD,
+                 counters=None, buf_size=DEFAULT_BUFFER,
+                 max_frame_size=MAX_FRAME_SIZE):
+        TCyCompressedTransport.__init__(self, trans, ZlibCodec(level),
+                                        threshold, counters, buf_size,
+                                        max_frame_size)
+
+
+class TCyCompressedTransportFactory(object):
+    def __init__(self, codec=None, threshold=DEFAULT_THRESHOLD,
+                 counters=None, max_frame_size=MAX_FRAME_SIZE):
+        self.codec = codec
+        self.threshold = threshold
+        self.counters = counters
+        self.max_frame_size = max_frame_size
+
+    def get_transport(self, trans):
+        return TCyCompressedTransport(trans, self.codec, self.threshold,
+                                      self.counters,
+                                      max_frame_size=self.max_frame_size)
+
+
+class TCyZlibTransportFactory(TCyCompressedTransportFactory):
+    def __init__(self, level=6, threshold=DEFAULT_THRESHOLD, counters=None,
+                 max_frame_size=MAX_FRAME_SIZE):
+        TCyCompressedTransportFactory.__init__(self, ZlibCodec(level),
+                                               threshold, counters,
+                                               max_frame_size)
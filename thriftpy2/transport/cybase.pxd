@@ -3,17 +3,26 @@
 cdef enum:
     DEFAULT_BUFFER = 4096
     STACK_STRING_LEN = 4096
+    # buffers written with `c_write_object` at least this large may be kept
+    # as segments instead of being copied, see `writev`.
+    MIN_SEGMENT_SIZE = 65536
 
 cdef class TCyBuffer(object):
     cdef:
         char *buf
         int cur, buf_size, data_size
+        # `buf_size` the buffer shrinks back to, the peak size of the data
+        # and the number of times it was emptied during the decay window.
+        int init_size, high_water, empties
 
         void move_to_start(self)
         void clean(self)
+        void decay(self)
         int write(self, int sz, const char *value)
         int grow(self, int min_size)
+        int resize(self, int size)
         read_trans(self, trans, int sz, char *out)
+        read_trans_into(self, read_into, int sz, char *out)
 
 
 cdef class CyTransportBase(object):
@@ -21,6 +30,8 @@ cdef class CyTransportBase(object):
 
     cdef c_read(self, int sz, char* out)
     cdef c_write(self, const char* data, int sz)
+    cdef c_write_object(self, object data, const char* ptr, int sz)
     cdef c_flush(self)
+    cdef c_read_view(self, int sz)
 
     cdef get_string(self, int sz)
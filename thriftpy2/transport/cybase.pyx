@@ -2,18 +2,212 @@
 
 from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy, memmove
+from cpython.buffer cimport PyBUF_WRITE
+from cpython.memoryview cimport PyMemoryView_FromMemory
+from cpython.pythread cimport (
+    PyThread_type_lock,
+    PyThread_allocate_lock,
+    PyThread_acquire_lock,
+    PyThread_release_lock,
+    WAIT_LOCK,
+)
+
+
+# The buffers of the transports are allocated from a per process pool, so
+# the buffers of closed connections are reused by the next ones. Pooled
+# blocks are powers of two from 4KB to 16MB, larger buffers are allocated
+# and freed as they are.
+cdef enum:
+    MIN_BLOCK_SHIFT = 12
+    MAX_BLOCK_SHIFT = 24
+    NUM_CLASSES = MAX_BLOCK_SHIFT - MIN_BLOCK_SHIFT + 1
+    MAX_BLOCK = 1 << MAX_BLOCK_SHIFT
+
+cdef:
+    PyThread_type_lock pool_lock = PyThread_allocate_lock()
+    # free blocks of each size class, linked through their first bytes.
+    void *free_blocks[NUM_CLASSES]
+    Py_ssize_t free_counts[NUM_CLASSES]
+    Py_ssize_t max_pooled_bytes = 64 * 1024 * 1024
+    # a buffer grown past its initial size is shrunk when it was emptied
+    # `decay_window` times without holding more than a quarter of its size.
+    int decay_window = 64
+
+    Py_ssize_t pooled_bytes = 0
+    Py_ssize_t in_use_bytes = 0
+    Py_ssize_t in_use_blocks = 0
+    Py_ssize_t hits = 0
+    Py_ssize_t misses = 0
+    Py_ssize_t discards = 0
+    Py_ssize_t shrinks = 0
+
+
+cdef int size_class(Py_ssize_t size):
+    """Index of the smallest size class holding `size` bytes, -1 if `size`
+    is too large to be pooled.
+    """
+    cdef int i = 0
+
+    if size > MAX_BLOCK:
+        return -1
+    while (<Py_ssize_t>1 << (MIN_BLOCK_SHIFT + i)) < size:
+        i += 1
+    return i
+
+
+cdef char *pool_alloc(Py_ssize_t size, int *block_size):
+    """Allocate a block of at least `size` bytes, its actual size is stored
+    in `block_size`. Returns NULL if out of memory.
+    """
+    global pooled_bytes, in_use_bytes, in_use_blocks, hits, misses
+    cdef:
+        int i = size_class(size)
+        char *block = NULL
+
+    if i >= 0:
+        size = <Py_ssize_t>1 << (MIN_BLOCK_SHIFT + i)
+
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    if i >= 0 and free_blocks[i] != NULL:
+        block = <char*>free_blocks[i]
+        free_blocks[i] = (<void**>block)[0]
+        free_counts[i] -= 1
+        pooled_bytes -= size
+        hits += 1
+    else:
+        misses += 1
+    PyThread_release_lock(pool_lock)
+
+    if block == NULL:
+        block = <char*>malloc(size)
+        if block == NULL:
+            return NULL
+
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    in_use_bytes += size
+    in_use_blocks += 1
+    PyThread_release_lock(pool_lock)
+
+    block_size[0] = <int>size
+    return block
+
+
+cdef void pool_free(char *block, int block_size):
+    """Give back a block allocated by `pool_alloc`."""
+    global pooled_bytes, in_use_bytes, in_use_blocks, discards
+    cdef int i = size_class(block_size)
+
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    in_use_bytes -= block_size
+    in_use_blocks -= 1
+    if i >= 0 and pooled_bytes + block_size <= max_pooled_bytes:
+        (<void**>block)[0] = free_blocks[i]
+        free_blocks[i] = block
+        free_counts[i] += 1
+        pooled_bytes += block_size
+        block = NULL
+    else:
+        discards += 1
+    PyThread_release_lock(pool_lock)
+
+    if block != NULL:
+        free(block)
+
+
+cdef Py_ssize_t trim_pool(Py_ssize_t max_bytes):
+    """Free pooled blocks, largest first, until at most `max_bytes` are
+    pooled. Returns the number of bytes freed.
+    """
+    global pooled_bytes
+    cdef:
+        int i = NUM_CLASSES - 1
+        Py_ssize_t freed = 0
+        char *block
+
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    while pooled_bytes > max_bytes and i >= 0:
+        block = <char*>free_blocks[i]
+        if block == NULL:
+            i -= 1
+            continue
+        free_blocks[i] = (<void**>block)[0]
+        free_counts[i] -= 1
+        pooled_bytes -= <Py_ssize_t>1 << (MIN_BLOCK_SHIFT + i)
+        freed += <Py_ssize_t>1 << (MIN_BLOCK_SHIFT + i)
+        free(block)
+    PyThread_release_lock(pool_lock)
+    return freed
+
+
+def buffer_pool_stats():
+    """Return the statistics of the buffer pool of the Cython transports:
+
+    * in_use_bytes, in_use_blocks: buffers held by live transports
+    * pooled_bytes, pooled_blocks: free buffers kept for reuse, and
+      `pooled_by_size` the number of them by block size
+    * max_pooled_bytes, decay_window: see `configure_buffer_pool`
+    * hits, misses: allocations served from the pool or not
+    * discards: buffers freed instead of being pooled
+    * shrinks: buffers shrunk after the decay window
+    """
+    PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+    try:
+        return {
+            'in_use_bytes': in_use_bytes,
+            'in_use_blocks': in_use_blocks,
+            'pooled_bytes': pooled_bytes,
+            'pooled_blocks': sum(free_counts[i] for i in range(NUM_CLASSES)),
+            'pooled_by_size': {
+                1 << (MIN_BLOCK_SHIFT + i): free_counts[i]
+                for i in range(NUM_CLASSES) if free_counts[i]},
+            'max_pooled_bytes': max_pooled_bytes,
+            'decay_window': decay_window,
+            'hits': hits,
+            'misses': misses,
+            'discards': discards,
+            'shrinks': shrinks,
+        }
+    finally:
+        PyThread_release_lock(pool_lock)
+
+
+def configure_buffer_pool(max_bytes=None, window=None):
+    """Set the maximum bytes of free buffers kept in the pool, trimming it
+    if needed, and the number of times a grown buffer must be emptied
+    without being used past a quarter of its size to be shrunk.
+    """
+    global max_pooled_bytes, decay_window
+
+    if window is not None:
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        decay_window = window
+    if max_bytes is not None:
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        max_pooled_bytes = max_bytes
+        trim_pool(max_bytes)
+
+
+def trim_buffer_pool():
+    """Free all the pooled buffers, returns the number of bytes freed."""
+    return trim_pool(0)
 
 
 cdef class TCyBuffer(object):
     def __cinit__(self, buf_size):
-        self.buf = <char*>malloc(buf_size)
-        self.buf_size = buf_size
+        self.buf = pool_alloc(buf_size, &self.buf_size)
+        if self.buf == NULL:
+            raise MemoryError()
+        self.init_size = self.buf_size
         self.cur = 0
         self.data_size = 0
+        self.high_water = 0
+        self.empties = 0
 
     def __dealloc__(self):
         if self.buf != NULL:
-            free(self.buf)
+            pool_free(self.buf, self.buf_size)
             self.buf = NULL
 
     cdef void move_to_start(self):
@@ -23,6 +217,49 @@ cdef class TCyBuffer(object):
     cdef void clean(self):
         self.cur = 0
         self.data_size = 0
+        self.decay()
+
+    cdef void decay(self):
+        """Called when the buffer is emptied, shrink it back if it was
+        grown for a large message that is gone.
+        """
+        global shrinks
+
+        if self.buf_size == self.init_size:
+            return
+
+        if self.buf_size > MAX_BLOCK:
+            # too large to be pooled, don't keep it until the window ends.
+            self.resize(self.init_size)
+            return
+
+        self.empties += 1
+        if self.empties < decay_window:
+            return
+
+        if self.high_water * 4 <= self.buf_size:
+            if self.resize(max(self.high_water, self.init_size)) == 0:
+                PyThread_acquire_lock(pool_lock, WAIT_LOCK)
+                shrinks += 1
+                PyThread_release_lock(pool_lock)
+        self.empties = 0
+        self.high_water = 0
+
+    cdef int resize(self, int size):
+        """Replace the buffer, which must be empty, by one of `size` bytes."""
+        cdef:
+            int new_size
+            char *new_buf = pool_alloc(size, &new_size)
+
+        if new_buf == NULL:
+            return -1
+        pool_free(self.buf, self.buf_size)
+        self.buf = new_buf
+        self.buf_size = new_size
+        self.cur = 0
+        self.empties = 0
+        self.high_water = 0
+        return 0
 
     cdef int write(self, int sz, const char *value):
         cdef:
@@ -44,6 +281,8 @@ cdef class TCyBuffer(object):
 
         memcpy(self.buf + self.cur + self.data_size, value, sz)
         self.data_size += sz
+        if self.data_size > self.high_water:
+            self.high_water = self.data_size
 
         return sz
 
@@ -54,6 +293,10 @@ cdef class TCyBuffer(object):
             return 0
 
         if self.data_size < sz:
+            read_into = getattr(trans, 'read_into', None)
+            if read_into is not None:
+                return self.read_trans_into(read_into, sz, out)
+
             if self.buf_size < sz:
                 if self.grow(sz) != 0:
                     return -2  # grow buffer error
@@ -78,29 +321,86 @@ cdef class TCyBuffer(object):
             memcpy(self.buf + self.cur + self.data_size, <char*>new_data,
                    new_data_len)
             self.data_size += new_data_len
+            if self.data_size > self.high_water:
+                self.high_water = self.data_size
 
         memcpy(out, self.buf + self.cur, sz)
         self.cur += sz
         self.data_size -= sz
+        if self.data_size == 0:
+            self.decay()
 
         return sz
 
+    cdef read_trans_into(self, read_into, int sz, char *out):
+        """Same as `read_trans`, with the `read_into(buffer, offset, size)`
+        method of the transport filling the buffer directly, or `out` if
+        `sz` is larger than the buffer.
+        """
+        cdef:
+            int n, target
+            char *dest
+            int dest_size
+
+        if sz > self.buf_size:
+            memcpy(out, self.buf + self.cur, self.data_size)
+            n = self.data_size
+            target = sz
+            self.clean()
+            dest = out
+            dest_size = sz
+        else:
+            if self.buf_size - self.cur < sz:
+                self.move_to_start()
+            n = self.cur + self.data_size
+            target = self.cur + sz
+            dest = self.buf
+            dest_size = self.buf_size
+
+        # the view is only used while filling, `grow` can't happen meanwhile.
+        view = PyMemoryView_FromMemory(dest, dest_size, PyBUF_WRITE)
+        try:
+            while n < target:
+                r = read_into(view, n, dest_size - n)
+                if r <= 0:
+                    return -1  # end of file error
+                n += r
+        finally:
+            view.release()
+
+        if dest == out:
+            return sz
+
+        self.data_size = n - self.cur
+        if self.data_size > self.high_water:
+            self.high_water = self.data_size
+        memcpy(out, self.buf + self.cur, sz)
+        self.cur += sz
+        self.data_size -= sz
+        if self.data_size == 0:
+            self.decay()
+        return sz
+
     cdef int grow(self, int min_size):
         if min_size <= self.buf_size:
             return 0
 
-        cdef int multiples = min_size // self.buf_size
-        if min_size % self.buf_size != 0:
-            multiples += 1
+        cdef int multiples, new_size
+        if min_size > MAX_BLOCK:
+            # not pooled, round up to keep growing amortized.
+            multiples = min_size // self.buf_size
+            if min_size % self.buf_size != 0:
+                multiples += 1
+            min_size = self.buf_size * multiples
 
-        cdef int new_size = self.buf_size * multiples
-        cdef char *new_buf = <char*>malloc(new_size)
+        cdef char *new_buf = pool_alloc(min_size, &new_size)
         if new_buf == NULL:
             return -1
         memcpy(new_buf + self.cur, self.buf + self.cur, self.data_size)
-        free(self.buf)
+        pool_free(self.buf, self.buf_size)
         self.buf_size = new_size
         self.buf = new_buf
+        self.empties = 0
         return 0
 
 
@@ -111,9 +411,24 @@ cdef class CyTransportBase(object):
     cdef c_write(self, const char* data, int sz):
         pass
 
+    cdef c_write_object(self, object data, const char* ptr, int sz):
+        """Write the `sz` bytes at `ptr`, which belong to the buffer object
+        `data`. Transports that can send it later without copying may keep
+        a reference to `data` instead, so it must not be modified until the
+        transport is flushed.
+        """
+        self.c_write(ptr, sz)
+
     cdef c_flush(self):
         pass
 
+    cdef c_read_view(self, int sz):
+        """Read `sz` bytes as a memoryview over a buffer retained by the
+        transport, without copying. Returns None (and reads nothing) if the
+        transport can't do so, the caller should fall back to `c_read`.
+        """
+        return None
+
     def clean(self):
         pass
 
@@ -35,6 +35,10 @@ class TFramedTransport(TTransportBase):
         self.read_frame()
         return self._rbuf.read(sz)
 
+    def read_some(self, sz):
+        """Read at most `sz` bytes of the current frame."""
+        return self.read(sz)
+
     def read_frame(self):
         buff = readall(self._trans.read, 4)
         sz, = struct.unpack('!i', buff)
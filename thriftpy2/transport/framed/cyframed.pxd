@@ -0,0 +1,17 @@
+from thriftpy2.transport.cybase cimport TCyBuffer, CyTransportBase
+
+
+cdef class TCyFramedTransport(CyTransportBase):
+    cdef:
+        TCyBuffer rbuf, wframe_buf
+        # the frame being read is kept as a bytes object, so that
+        # `c_read_view` can hand out memoryviews over it.
+        bytes rframe
+        int rframe_pos
+        # large buffers of the frame written before the content of
+        # wframe_buf, sent with `writev` without being copied.
+        list wsegments
+        int wsegments_size
+
+    cdef read_trans(self, int sz, char *out)
+    cdef read_frame(self)
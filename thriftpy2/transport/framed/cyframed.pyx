@@ -1,14 +1,16 @@
 # cython: freethreading_compatible = True
 
-from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy
 from libc.stdint cimport int32_t
+from cpython.buffer cimport PyBUF_READ
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from cpython.memoryview cimport PyMemoryView_FromMemory
 
 from thriftpy2.transport.cybase cimport (
     TCyBuffer,
     CyTransportBase,
     DEFAULT_BUFFER,
-    STACK_STRING_LEN
+    MIN_SEGMENT_SIZE,
 )
 
 from .. import TTransportException
@@ -20,14 +22,14 @@ cdef extern from "../../protocol/cybin/endian_port.h":
 
 
 cdef class TCyFramedTransport(CyTransportBase):
-    cdef:
-        TCyBuffer rbuf, rframe_buf, wframe_buf
-
     def __init__(self, trans, int buf_size=DEFAULT_BUFFER):
         self.trans = trans
         self.rbuf = TCyBuffer(buf_size)
-        self.rframe_buf = TCyBuffer(buf_size)
         self.wframe_buf = TCyBuffer(buf_size)
+        self.rframe = b''
+        self.rframe_pos = 0
+        self.wsegments = []
+        self.wsegments_size = 0
 
     cdef read_trans(self, int sz, char *out):
         cdef int i = self.rbuf.read_trans(self.trans, sz, out)
@@ -37,35 +39,64 @@ cdef class TCyFramedTransport(CyTransportBase):
         elif i == -2:
             raise MemoryError("grow buffer fail")
 
-    cdef write_rframe_buffer(self, const char *data, int sz):
-        cdef int r = self.rframe_buf.write(sz, data)
-        if r == -1:
-            raise MemoryError("Write to buffer error")
-
     cdef c_read(self, int sz, char *out):
+        cdef int n, done = 0
+
         if sz <= 0:
             return 0
 
-        while self.rframe_buf.data_size < sz:
-            self.read_frame()
+        while done < sz:
+            n = len(self.rframe) - self.rframe_pos
+            if n <= 0:
+                self.read_frame()
+                continue
 
-        memcpy(out, self.rframe_buf.buf + self.rframe_buf.cur, sz)
-        self.rframe_buf.cur += sz
-        self.rframe_buf.data_size -= sz
+            if n > sz - done:
+                n = sz - done
+            memcpy(out + done, PyBytes_AS_STRING(self.rframe) + self.rframe_pos,
+                   n)
+            self.rframe_pos += n
+            done += n
 
         return sz
 
+    cdef c_read_view(self, int sz):
+        if sz <= 0:
+            return None
+
+        if self.rframe_pos >= len(self.rframe):
+            self.read_frame()
+
+        if len(self.rframe) - self.rframe_pos < sz:
+            return None
+
+        view = memoryview(self.rframe)[self.rframe_pos:self.rframe_pos + sz]
+        self.rframe_pos += sz
+        return view
+
     cdef c_write(self, const char *data, int sz):
         cdef int r = self.wframe_buf.write(sz, data)
         if r == -1:
             raise MemoryError("Write to buffer error")
 
+    cdef c_write_object(self, object data, const char *ptr, int sz):
+        if sz < MIN_SEGMENT_SIZE or getattr(self.trans, 'writev', None) is None:
+            self.c_write(ptr, sz)
+            return
+
+        if self.wframe_buf.data_size > 0:
+            self.wsegments.append(
+                self.wframe_buf.buf[:self.wframe_buf.data_size])
+            self.wsegments_size += self.wframe_buf.data_size
+            self.wframe_buf.clean()
+        self.wsegments.append(memoryview(data))
+        self.wsegments_size += sz
+
     cdef read_frame(self):
         cdef:
             char frame_len[4]
-            char stack_frame[STACK_STRING_LEN]
-            char *dy_frame
             int32_t frame_size
+            bytes frame
 
         self.read_trans(4, frame_len)
         frame_size = be32toh((<int32_t*>frame_len)[0])
@@ -73,37 +104,62 @@ cdef class TCyFramedTransport(CyTransportBase):
         if frame_size <= 0:
             raise TTransportException("No frame.", TTransportException.UNKNOWN)
 
-        if frame_size <= STACK_STRING_LEN:
-            self.read_trans(frame_size, stack_frame)
-            self.write_rframe_buffer(stack_frame, frame_size)
-        else:
-            dy_frame = <char*>malloc(frame_size)
-            try:
-                self.read_trans(frame_size, dy_frame)
-                self.write_rframe_buffer(dy_frame, frame_size)
-            finally:
-                free(dy_frame)
+        # the new bytes object isn't shared yet, so it's fine to fill it.
+        frame = PyBytes_FromStringAndSize(NULL, frame_size)
+        self.read_trans(frame_size, PyBytes_AS_STRING(frame))
+        self.rframe = frame
+        self.rframe_pos = 0
 
     cdef c_flush(self):
         cdef:
             bytes data
             char *size_str
+            int32_t size = self.wsegments_size + self.wframe_buf.data_size
 
-        if self.wframe_buf.data_size > 0:
-            data = self.wframe_buf.buf[:self.wframe_buf.data_size]
-            size = htobe32(self.wframe_buf.data_size)
-            size_str = <char*>(&size)
+        if size <= 0:
+            return
+
+        size = htobe32(size)
+        size_str = <char*>(&size)
 
+        writev = getattr(self.trans, 'writev', None)
+        if writev is None:
+            data = self.wframe_buf.buf[:self.wframe_buf.data_size]
             self.trans.write(size_str[:4] + data)
-            self.trans.flush()
-            self.wframe_buf.clean()
+        else:
+            view = PyMemoryView_FromMemory(self.wframe_buf.buf,
+                                           self.wframe_buf.data_size,
+                                           PyBUF_READ)
+            try:
+                writev([size_str[:4]] + self.wsegments + [view])
+            finally:
+                view.release()
+            self.wsegments = []
+            self.wsegments_size = 0
+
+        self.trans.flush()
+        self.wframe_buf.clean()
 
     def read(self, int sz):
         return self.get_string(sz)
 
+    def read_some(self, int sz):
+        """Read at most `sz` bytes of the current frame."""
+        if sz <= 0:
+            return b''
+
+        if self.rframe_pos >= len(self.rframe):
+            self.read_frame()
+
+        if sz > len(self.rframe) - self.rframe_pos:
+            sz = len(self.rframe) - self.rframe_pos
+        data = self.rframe[self.rframe_pos:self.rframe_pos + sz]
+        self.rframe_pos += sz
+        return data
+
     def write(self, bytes data):
         cdef int sz = len(data)
-        self.c_write(data, sz)
+        self.c_write_object(data, data, sz)
 
     def flush(self):
         self.c_flush()
@@ -119,8 +175,11 @@ cdef class TCyFramedTransport(CyTransportBase):
 
     def clean(self):
         self.rbuf.clean()
-        self.rframe_buf.clean()
+        self.rframe = b''
+        self.rframe_pos = 0
         self.wframe_buf.clean()
+        self.wsegments = []
+        self.wsegments_size = 0
 
 
 class TCyFramedTransportFactory(object):
@@ -0,0 +1,308 @@
+"""
+    thriftpy2.transport.header
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    THeader transport, the framing of Apache Thrift and fbthrift which
+    carries key/value headers and transforms (compression) of the payload
+    along with each message.
+
+    The transport detects the framing of every message it reads (header,
+    framed or unframed, binary or compact) and writes with the framing of
+    the last message read, so that a server speaks to each client the way
+    the client speaks to it.
+"""
+
+import struct
+import zlib
+from io import BytesIO
+from typing import Dict, Iterable, Optional
+
+from .base import TTransportBase, TTransportException, readall
+from .compressed.codec import zlib_decompress
+from ..protocol.binary import VERSION_1, VERSION_MASK
+from ..protocol.compact import TCompactProtocol
+
+HEADER_MAGIC = 0x0FFF
+MAX_FRAME_SIZE = 0x3FFFFFFF
+
+# key/value headers, the only info headers read, others are skipped.
+INFO_KEYVALUE = 0x01
+
+
+class THeaderClientType(object):
+    HEADERS = 0x00
+    FRAMED_BINARY = 0x01
+    UNFRAMED_BINARY = 0x02
+    FRAMED_COMPACT = 0x03
+    UNFRAMED_COMPACT = 0x04
+
+    ALL = frozenset([HEADERS, FRAMED_BINARY, UNFRAMED_BINARY,
+                     FRAMED_COMPACT, UNFRAMED_COMPACT])
+
+
+class THeaderSubprotocolID(object):
+    BINARY = 0x00
+    COMPACT = 0x02
+
+
+class THeaderTransformID(object):
+    ZLIB = 0x01
+
+
+WRITE_TRANSFORMS = {
+    THeaderTransformID.ZLIB: zlib.compress,
+}
+# transform(data, max_size), raising TTransportException(SIZE_LIMIT)
+# rather than returning more than max_size bytes.
+READ_TRANSFORMS = {
+    THeaderTransformID.ZLIB: zlib_decompress,
+}
+
+_i32 = struct.Struct('!i')
+_u16 = struct.Struct('!H')
+# magic, flags, seqid and header size in 4 bytes words
+_header_start = struct.Struct('!HHiH')
+
+
+def _write_varint(buf, n):
+    while n > 0x7f:
+        buf.write(bytes(((n & 0x7f) | 0x80, )))
+        n >>= 7
+    buf.write(bytes((n, )))
+
+
+def _read_varint(buf):
+    result = shift = 0
+    while True:
+        byte = buf.read(1)
+        if not byte:
+            raise TTransportException(TTransportException.SIZE_LIMIT,
+                                      "Header ends in a varint.")
+        result |= (byte[0] & 0x7f) << shift
+        if byte[0] >> 7 == 0:
+            return result
+        shift += 7
+
+
+def _write_string(buf, s):
+    data = s.encode('utf-8', 'surrogateescape')
+    _write_varint(buf, len(data))
+    buf.write(data)
+
+
+def _read_string(buf):
+    size = _read_varint(buf)
+    data = buf.read(size)
+    if len(data) != size:
+        raise TTransportException(TTransportException.SIZE_LIMIT,
+                                  "Header string is larger than the header.")
+    return data.decode('utf-8', 'surrogateescape')
+
+
+def _is_compact(first_word):
+    return first_word[0] == TCompactProtocol.PROTOCOL_ID and \
+        first_word[1] & TCompactProtocol.VERSION_MASK == \
+        TCompactProtocol.VERSION
+
+
+class THeaderTransport(TTransportBase):
+    """Transport of the messages of THeaderProtocol.
+
+    `client_types` are the framings accepted when reading, all of them by
+    default. Messages are written with the headers set with `set_header`
+    and the transforms added with `add_transform`, or with the framing of
+    the last message read if it isn't a header one.
+    """
+
+    def __init__(self, trans, client_types: Optional[Iterable[int]] = None,
+                 default_protocol: int = THeaderSubprotocolID.BINARY,
+                 max_frame_size: int = MAX_FRAME_SIZE):
+        self._trans = trans
+        self._client_types = THeaderClientType.ALL if client_types is None \
+            else frozenset(client_types)
+        self._max_frame_size = max_frame_size
+
+        self.client_type = THeaderClientType.HEADERS
+        self.protocol_id = default_protocol
+        self.flags = 0
+        self.seqid = 0
+
+        self._rbuf = BytesIO()
+        self._wbuf = BytesIO()
+        self._read_headers = {}  # type: Dict[str, str]
+        self._write_headers = {}  # type: Dict[str, str]
+        self._write_transforms = []
+
+    def is_open(self):
+        return self._trans.is_open()
+
+    def open(self):
+        return self._trans.open()
+
+    def close(self):
+        return self._trans.close()
+
+    def get_headers(self) -> Dict[str, str]:
+        """Headers of the last message read."""
+        return self._read_headers
+
+    def set_header(self, key: str, value: str) -> None:
+        """Set a header of the next message written."""
+        self._write_headers[key] = value
+
+    def clear_headers(self) -> None:
+        self._write_headers.clear()
+
+    def add_transform(self, transform_id: int) -> None:
+        """Apply a transform to the messages written from now on."""
+        if transform_id not in WRITE_TRANSFORMS:
+            raise ValueError("Unknown transform {}".format(transform_id))
+        if transform_id not in self._write_transforms:
+            self._write_transforms.append(transform_id)
+
+    def _set_client_type(self, client_type):
+        if client_type not in self._client_types:
+            raise TTransportException(
+                TTransportException.INVALID_CLIENT_TYPE,
+                "Client type {} not allowed.".format(client_type))
+        self.client_type = client_type
+
+    def read_frame(self):
+        """Read the start of the next message, detecting its framing."""
+        first_word = readall(self._trans.read, 4)
+        frame_size, = _i32.unpack(first_word)
+
+        if frame_size & VERSION_MASK == VERSION_1:
+            # the rest of the message is read from the transport as it goes
+            self._set_client_type(THeaderClientType.UNFRAMED_BINARY)
+            self.protocol_id = THeaderSubprotocolID.BINARY
+            self._rbuf = BytesIO(first_word)
+            self._read_headers = {}
+            return
+        if _is_compact(first_word):
+            self._set_client_type(THeaderClientType.UNFRAMED_COMPACT)
+            self.protocol_id = THeaderSubprotocolID.COMPACT
+            self._rbuf = BytesIO(first_word)
+            self._read_headers = {}
+            return
+
+        if frame_size < 4 or frame_size > self._max_frame_size:
+            raise TTransportException(TTransportException.SIZE_LIMIT,
+                                      "Bad frame size {}.".format(frame_size))
+        frame = readall(self._trans.read, frame_size)
+
+        if frame_size >= _header_start.size and \
+                _u16.unpack_from(frame)[0] == HEADER_MAGIC:
+            self._set_client_type(THeaderClientType.HEADERS)
+            self._rbuf = self._parse_header(frame)
+            return
+
+        if _i32.unpack_from(frame)[0] & VERSION_MASK == VERSION_1:
+            self._set_client_type(THeaderClientType.FRAMED_BINARY)
+            self.protocol_id = THeaderSubprotocolID.BINARY
+        elif _is_compact(frame):
+            self._set_client_type(THeaderClientType.FRAMED_COMPACT)
+            self.protocol_id = THeaderSubprotocolID.COMPACT
+        else:
+            raise TTransportException(
+                TTransportException.INVALID_CLIENT_TYPE,
+                "Could not detect client transport type.")
+        self._rbuf = BytesIO(frame)
+        self._read_headers = {}
+
+    def _parse_header(self, frame):
+        _, self.flags, self.seqid, header_words = \
+            _header_start.unpack_from(frame)
+        end_of_headers = _header_start.size + header_words * 4
+        if end_of_headers > len(frame):
+            raise TTransportException(
+                TTransportException.SIZE_LIMIT,
+                "Header size is larger than the frame.")
+
+        header = frame[_header_start.size:end_of_headers]
+        buf = BytesIO(header)
+        self.protocol_id = _read_varint(buf)
+        transforms = []
+        for _ in range(_read_varint(buf)):
+            transform_id = _read_varint(buf)
+            if transform_id not in READ_TRANSFORMS:
+                raise TTransportException(
+                    TTransportException.UNKNOWN,
+                    "Unknown transform {}.".format(transform_id))
+            transforms.append(transform_id)
+
+        headers = {}
+        while buf.tell() < len(header):
+            info_type = _read_varint(buf)
+            if info_type != INFO_KEYVALUE:
+                # padding, or info headers this transport doesn't know.
+                break
+            for _ in range(_read_varint(buf)):
+                key = _read_string(buf)
+                headers[key] = _read_string(buf)
+        self._read_headers = headers
+
+        payload = frame[end_of_headers:]
+        for transform_id in reversed(transforms):
+            payload = READ_TRANSFORMS[transform_id](payload,
+                                                    self._max_frame_size)
+        return BytesIO(payload)
+
+    def read(self, sz):
+        ret = self._rbuf.read(sz)
+        if len(ret) == sz:
+            return ret
+
+        if self.client_type in (THeaderClientType.UNFRAMED_BINARY,
+                                THeaderClientType.UNFRAMED_COMPACT):
+            return ret + readall(self._trans.read, sz - len(ret))
+        raise TTransportException(TTransportException.END_OF_FILE,
+                                  "Read past the end of the frame.")
+
+    def write(self, buf):
+        self._wbuf.write(buf)
+
+    def flush(self):
+        # reset wbuf before write/flush to preserve state on underlying failure
+        payload = self._wbuf.getvalue()
+        self._wbuf = BytesIO()
+
+        if self.client_type == THeaderClientType.HEADERS:
+            out = self._header_frame(payload)
+        elif self.client_type in (THeaderClientType.FRAMED_BINARY,
+                                  THeaderClientType.FRAMED_COMPACT):
+            out = _i32.pack(len(payload)) + payload
+        else:
+            out = payload
+        # the headers are for a single message, even when they can't be sent
+        self._write_headers = {}
+
+        self._trans.write(out)
+        self._trans.flush()
+
+    def _header_frame(self, payload):
+        for transform_id in self._write_transforms:
+            payload = WRITE_TRANSFORMS[transform_id](payload)
+
+        buf = BytesIO()
+        _write_varint(buf, self.protocol_id)
+        _write_varint(buf, len(self._write_transforms))
+        for transform_id in self._write_transforms:
+            _write_varint(buf, transform_id)
+        if self._write_headers:
+            _write_varint(buf, INFO_KEYVALUE)
+            _write_varint(buf, len(self._write_headers))
+            for key, value in self._write_headers.items():
+                _write_string(buf, key)
+                _write_string(buf, value)
+        buf.write(b'\x00' * (-buf.tell() % 4))
+        header = buf.getvalue()
+
+        frame_size = _header_start.size + len(header) + len(payload)
+        return b''.join([
+            _i32.pack(frame_size),
+            _header_start.pack(HEADER_MAGIC, self.flags, self.seqid,
+                               len(header) // 4),
+            header,
+            payload,
+        ])
@@ -35,6 +35,9 @@ class TMemoryBuffer(TTransportBase):
         self._pos += len(res)
         return res
 
+    def read_some(self, sz):
+        return self._read(sz)
+
     def write(self, buf):
         self._buffer.write(buf)
 
@@ -0,0 +1,10 @@
+from thriftpy2.transport.cybase cimport TCyBuffer, CyTransportBase
+
+
+cdef class TCyMemoryBuffer(CyTransportBase):
+    cdef TCyBuffer buf
+    # the bytes the buffer was set to, retained for `c_read_view`
+    cdef object value
+
+    cdef _getvalue(self)
+    cdef _setvalue(self, int sz, const char *value)
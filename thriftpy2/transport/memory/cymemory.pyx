@@ -11,11 +11,10 @@ from cpython cimport bool, PyObject_GetBuffer, PyBuffer_Release, PyBUF_ANY_CONTI
 
 
 cdef class TCyMemoryBuffer(CyTransportBase):
-    cdef TCyBuffer buf
-
     def __init__(self, value=b'', int buf_size=DEFAULT_BUFFER):
         self.trans = None
         self.buf = TCyBuffer(buf_size)
+        self.value = None
 
         if value:
             self.setvalue(value)
@@ -33,8 +32,20 @@ cdef class TCyMemoryBuffer(CyTransportBase):
 
         return sz
 
+    cdef c_read_view(self, int sz):
+        # `self.value` mirrors the buffer until it is written to.
+        if self.value is None or sz < 0 or self.buf.data_size < sz:
+            return None
+
+        view = memoryview(self.value)[self.buf.cur:self.buf.cur + sz]
+        self.buf.cur += sz
+        self.buf.data_size -= sz
+        return view
+
     cdef c_write(self, const char* data, int sz):
-        cdef int r = self.buf.write(sz, data)
+        cdef int r
+        self.value = None
+        r = self.buf.write(sz, data)
         if r == -1:
             raise MemoryError("Write to memory error")
 
@@ -61,12 +72,16 @@ cdef class TCyMemoryBuffer(CyTransportBase):
             free(out)
 
     cdef _setvalue(self, int sz, const char *value):
+        self.value = None
         self.buf.clean()
         self.buf.write(sz, value)
 
     def read(self, sz):
         return self.get_string(sz)
 
+    def read_some(self, sz):
+        return self.get_string(sz)
+
     def write(self, data):
         if isinstance(data, unicode):
             data = (<unicode>data).encode('utf-8')
@@ -86,12 +101,27 @@ cdef class TCyMemoryBuffer(CyTransportBase):
         pass
 
     def clean(self):
+        self.value = None
         self.buf.clean()
 
     def getvalue(self):
         return self._getvalue()
 
     def setvalue(self, value):
+        cdef Py_buffer in_buffer
+
         if isinstance(value, unicode):
             value = (<unicode>value).encode('utf-8')
-        self._setvalue(len(value), value)
+
+        if type(value) is bytes:
+            self._setvalue(len(value), value)
+            self.value = value
+            return
+
+        # any other contiguous buffer (bytearray, memoryview over a mmap...)
+        # is copied straight into the buffer, without a bytes copy first.
+        PyObject_GetBuffer(value, &in_buffer, PyBUF_SIMPLE | PyBUF_ANY_CONTIGUOUS)
+        try:
+            self._setvalue(in_buffer.len, <char *>in_buffer.buf)
+        finally:
+            PyBuffer_Release(&in_buffer)
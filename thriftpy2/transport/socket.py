@@ -1,6 +1,7 @@
 import errno
 import os
 import socket
+import ssl
 import struct
 import sys
 
@@ -8,6 +9,11 @@ from .base import TTransportBase, TTransportException
 
 MAC_OR_BSD = sys.platform == 'darwin' or sys.platform.startswith('freebsd')
 
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16
+
 
 class TSocket(TTransportBase):
     """Socket implementation for client side."""
@@ -104,12 +110,10 @@ class TSocket(TTransportBase):
                 type=TTransportException.NOT_OPEN,
                 message="Could not connect to %s" % str(addr))
 
-    def read(self, sz):
-        sock = self.sock
-        assert sock is not None
+    def _recv(self, recv, *args):
         while True:
             try:
-                buff = sock.recv(sz)
+                return recv(*args)
             except socket.error as e:
                 if e.errno == errno.EINTR:
                     continue
@@ -120,23 +124,71 @@ class TSocket(TTransportBase):
                     # in lib/cpp/src/transport/TSocket.cpp.
                     self.close()
                     # Trigger the check to raise the END_OF_FILE exception.
-                    buff = b''
-                    break
-                else:
-                    raise
-            else:
-                break
+                    return None
+                raise
 
-        if len(buff) == 0:
+    def read(self, sz):
+        sock = self.sock
+        assert sock is not None
+        buff = self._recv(sock.recv, sz)
+        if not buff:
             raise TTransportException(type=TTransportException.END_OF_FILE,
                                       message='TSocket read 0 bytes')
         return buff
 
+    def read_into(self, buffer, offset, size):
+        """Read at most `size` bytes into `buffer` at `offset`, without an
+        intermediate bytes object. Returns the number of bytes read.
+        """
+        sock = self.sock
+        assert sock is not None
+        with memoryview(buffer) as view:
+            n = self._recv(sock.recv_into, view[offset:offset + size], size)
+        if not n:
+            raise TTransportException(type=TTransportException.END_OF_FILE,
+                                      message='TSocket read 0 bytes')
+        return n
+
+    def read_some(self, sz):
+        """Read at most `sz` bytes, `read` already returns whatever the
+        socket received."""
+        return self.read(sz)
+
     def write(self, buf):
         sock = self.sock
         assert sock is not None
         sock.sendall(buf)
 
+    def writev(self, buffers):
+        """Write the `buffers` as if they were concatenated, with
+        `socket.sendmsg` so that they are not copied first.
+        """
+        sock = self.sock
+        assert sock is not None
+        if not hasattr(sock, 'sendmsg') or isinstance(sock, ssl.SSLSocket):
+            # no sendmsg on Windows, nor on SSL sockets
+            sock.sendall(b''.join(buffers))
+            return
+
+        views = [memoryview(b).cast('B') for b in buffers if len(b)]
+        i = 0
+        while i < len(views):
+            try:
+                sent = sock.sendmsg(views[i:i + IOV_MAX])
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+
+            # skip what was sent, the last view may be partially sent
+            while sent:
+                if sent >= len(views[i]):
+                    sent -= len(views[i])
+                    i += 1
+                else:
+                    views[i] = views[i][sent:]
+                    sent = 0
+
     def flush(self):
         pass
 
@@ -218,6 +270,10 @@ class TServerSocket(object):
         self.sock = _sock
 
     def listen(self):
+        if self.sock is not None:
+            # listening already, e.g. shared by the workers of a
+            # TProcessPoolServer.
+            return
         self._init_sock()
         sock = self.sock
         assert sock is not None
@@ -1,9 +1,12 @@
 import binascii
-from typing import Any
+import struct
+from typing import (Any, Callable, Iterable, Iterator, List, Optional, Tuple,
+                    Union)
 
-from .transport import TMemoryBuffer
-from .protocol.base import TProtocolFactory
+from .transport import TMemoryBuffer, TTransportException
+from .protocol.base import FieldsProjection, TProtocolFactory
 from .protocol.binary import TBinaryProtocolFactory
+from .protocol.lazy import BINARY_FACTORIES, read_lazy_struct
 
 
 def serialize(thrift_object: Any,
@@ -16,13 +19,135 @@ def serialize(thrift_object: Any,
 
 
 def deserialize(thrift_object: Any, buf: bytes,
-                proto_factory: TProtocolFactory = TBinaryProtocolFactory()) -> Any:
+                proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                fields: Optional[FieldsProjection] = None,
+                lazy: bool = False) -> Any:
+    """Deserialize `buf` into `thrift_object`.
+
+    If `fields` is given, only the projected fields are decoded, all the
+    others are skipped and left as their defaults, e.g.
+    ``fields={1: None, 4: {2}}`` decodes field 1 and field 2 of the struct
+    in field 4. Only supported by the binary and compact protocols.
+
+    If `lazy` is True, a lazy payload of the same class is returned instead
+    of filling `thrift_object`: its fields are only decoded when accessed,
+    and it is written back as the original bytes if left untouched. Only
+    supported by the binary protocol.
+    """
+    if lazy:
+        if not isinstance(proto_factory, BINARY_FACTORIES):
+            raise TypeError('lazy decoding is only supported by the '
+                            'binary protocol')
+        return read_lazy_struct(
+            thrift_object, buf, proto_factory.decode_response,
+            proto_factory.strict_decode)
+
     transport = TMemoryBuffer(buf)
     protocol = proto_factory.get_protocol(transport)
-    thrift_object.read(protocol)
+    if fields is None:
+        thrift_object.read(protocol)
+    else:
+        protocol.read_struct(thrift_object, fields)
     return thrift_object
 
 
+def iter_serialize(thrift_objects: Iterable[Any],
+                   proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                   length_prefixed: bool = False) -> Iterator[bytes]:
+    """Serialize each of `thrift_objects`, reusing one buffer and protocol.
+
+    If `length_prefixed` is True, each record is prefixed with its length
+    as a 4 bytes big endian integer (the framing of TFramedTransport), so
+    that the records can be concatenated into a stream.
+    """
+    transport = TMemoryBuffer()
+    protocol = proto_factory.get_protocol(transport)
+    for thrift_object in thrift_objects:
+        thrift_object.write(protocol)
+        protocol.write_message_end()
+        data = transport.getvalue()
+        transport.setvalue(b'')
+        if length_prefixed:
+            data = _pack_length(len(data)) + data
+        yield data
+
+
+def serialize_many(thrift_objects: Iterable[Any],
+                   proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                   length_prefixed: bool = False
+                   ) -> Union[List[bytes], bytes]:
+    """Serialize `thrift_objects` into a list of records, or into a single
+    length prefixed stream if `length_prefixed` is True.
+    """
+    records = list(iter_serialize(thrift_objects, proto_factory,
+                                  length_prefixed))
+    if length_prefixed:
+        return b''.join(records)
+    return records
+
+
+def iter_records(stream: bytes) -> Iterator[bytes]:
+    """Split a length prefixed stream, see `iter_serialize`."""
+    view = memoryview(stream).cast('B')
+    for start, end in _iter_spans(view):
+        yield view[start:end].tobytes()
+
+
+def _iter_spans(view: memoryview, pos: int = 0) -> Iterator[Tuple[int, int]]:
+    """Yield the `(start, end)` offsets of the records of a length prefixed
+    stream, starting at the record length at `pos`.
+    """
+    end = len(view)
+    while pos < end:
+        if end - pos < 4:
+            raise TTransportException(TTransportException.END_OF_FILE,
+                                      'Truncated record length at %d' % pos)
+        size = _unpack_length(view, pos)[0]
+        pos += 4
+        if size < 0 or end - pos < size:
+            raise TTransportException(TTransportException.END_OF_FILE,
+                                      'Truncated record at %d' % pos)
+        yield pos, pos + size
+        pos += size
+
+
+def iter_deserialize(thrift_class: Callable[[], Any],
+                     bufs: Union[Iterable[bytes], bytes],
+                     proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                     length_prefixed: bool = False) -> Iterator[Any]:
+    """Deserialize each of `bufs` into a new `thrift_class` instance,
+    reusing one buffer and protocol.
+
+    If `length_prefixed` is True, `bufs` is a single length prefixed stream
+    as produced by `serialize_many`.
+    """
+    if length_prefixed:
+        bufs = iter_records(bufs)
+
+    transport = TMemoryBuffer()
+    protocol = proto_factory.get_protocol(transport)
+    for buf in bufs:
+        transport.setvalue(buf)
+        thrift_object = thrift_class()
+        thrift_object.read(protocol)
+        yield thrift_object
+
+
+def deserialize_many(thrift_class: Callable[[], Any],
+                     bufs: Union[Iterable[bytes], bytes],
+                     proto_factory: TProtocolFactory = TBinaryProtocolFactory(),
+                     length_prefixed: bool = False) -> List[Any]:
+    """Deserialize a list of records, or a length prefixed stream if
+    `length_prefixed` is True, into `thrift_class` instances.
+    """
+    return list(iter_deserialize(thrift_class, bufs, proto_factory,
+                                 length_prefixed))
+
+
+_pack_length = struct.Struct('!i').pack
+_unpack_length = struct.Struct('!i').unpack_from
+
+
 def hexlify(byte_array: bytes, delimeter: str = ' ') -> str:
     s = binascii.hexlify(byte_array).decode('utf-8')
     return delimeter.join(a + b for a, b in zip(s[::2], s[1::2]))